@@ -1,13 +1,20 @@
+from models import Section, outline_leaves
 from states import ArticleState
 
 
+def article_sections(outline: list[Section], texts: list[str]) -> list[str]:
+    # Тексты листьев оглавления с заголовками разделов всех уровней перед ними
+    leaves = outline_leaves([Section.model_validate(section) for section in outline])
+    if len(leaves) != len(texts):
+        # Чекпоинт до появления иерархического оглавления - тексты без заголовков, как раньше
+        return texts
+    return [f"{leaf.heading}\n\n{text}" for leaf, text in zip(leaves, texts)]
+
+
 async def assemble_article(state: ArticleState):
     topic = state["topic"]
     sections: list[str] = state["sections"]
 
-    article = f"# {topic}\n" + "\n".join(str(section) for section in sections)
+    article = f"# {topic}\n" + "\n".join(article_sections(state.get("outline") or [], sections))
 
-    return {
-        **state,
-        "article": article
-    }
+    return {"article": article}
@@ -0,0 +1,90 @@
+import os
+import sys
+import time
+from collections import defaultdict
+from typing import TextIO
+
+
+class ArticleStream:
+    # Постепенный вывод статьи: токены текущей секции сразу печатаются в консоль,
+    # готовые секции по порядку дописываются в файл {path}.part, который в конце
+    # атомарно переименовывается в итоговый файл. Секции, написанные параллельно
+    # раньше предыдущих, ждут своей очереди в памяти. headings - заголовки разделов
+    # перед каждой секцией (листом оглавления), как их расставит assemble_article.
+    def __init__(
+        self, topic: str, path: str, console: TextIO = sys.stdout, headings: list[str] | None = None
+    ) -> None:
+        self.path = path
+        self.part_path = f"{path}.part"
+        self.console = console
+        self.headings = headings or []
+
+        self.started = time.perf_counter()
+        self.first_token: float | None = None
+        self.first_section: float | None = None
+
+        self.printed: dict[int, str] = defaultdict(str)
+        self.finished: dict[int, str] = {}
+        self.head = 0
+
+        # Формат совпадает с assemble_article: заголовок и секции через перевод строки
+        with open(self.part_path, "w") as file:
+            file.write(f"# {topic}\n")
+        self.console.write(f"# {topic}\n")
+
+    def on_token(self, index: int, text: str) -> None:
+        if not text:
+            return
+        if self.first_token is None:
+            self.first_token = time.perf_counter() - self.started
+
+        if index == self.head and not self.printed[index]:
+            self.console.write(self.heading(index))
+        self.printed[index] += text
+        if index == self.head:
+            self.console.write(text)
+            self.console.flush()
+
+    def on_section(self, index: int, text: str) -> None:
+        if self.first_section is None:
+            self.first_section = time.perf_counter() - self.started
+        self.finished[index] = text
+
+        while self.head in self.finished:
+            section = self.finished.pop(self.head)
+            # Допечатываем то, что не пришло токенами (ответ из кеша, буфер параллельной секции)
+            shown = self.printed.pop(self.head, "")
+            if not shown:
+                self.console.write(self.heading(self.head))
+            self.console.write(section[len(shown):] if section.startswith(shown) else section)
+            self.console.write("\n")
+
+            with open(self.part_path, "a") as file:
+                section = f"{self.heading(self.head)}{section}"
+                file.write(section if self.head == 0 else f"\n{section}")
+                file.flush()
+                os.fsync(file.fileno())
+
+            self.head += 1
+            # Следующая секция могла уже частично прийти токенами - показываем накопленное
+            if self.printed.get(self.head):
+                self.console.write(self.heading(self.head) + self.printed[self.head])
+            self.console.flush()
+
+    def heading(self, index: int) -> str:
+        return f"{self.headings[index]}\n\n" if index < len(self.headings) else ""
+
+    def finish(self, article: str) -> None:
+        # Итоговый текст собран assemble_article; записываем его целиком и атомарно заменяем файл
+        with open(self.part_path, "w") as file:
+            file.write(article)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(self.part_path, self.path)
+
+    def metrics(self) -> dict:
+        return {
+            "time_to_first_token": self.first_token,
+            "time_to_first_section": self.first_section,
+            "total": time.perf_counter() - self.started,
+        }
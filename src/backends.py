@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import os
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+
+import openai
+from langchain_core.runnables.config import var_child_runnable_config
+from langchain_openai import ChatOpenAI
+from pydantic import SecretStr
+
+from scheduler import TRANSIENT_ERRORS, retry_after
+from settings import LLM_BACKEND_COOLDOWN, LLM_BACKENDS, LLM_HEALTH_CHECK_INTERVAL, LLM_NODE_MODELS
+
+logger = logging.getLogger(__name__)
+
+
+def node_model(default: str) -> str:
+    # Модель, закреплённая за текущим узлом графа в llm_node_models, иначе модель клиента
+    config = var_child_runnable_config.get() or {}
+    return LLM_NODE_MODELS.get(config.get("metadata", {}).get("langgraph_node"), default)
+
+
+class Backend:
+    # Один OpenAI-совместимый сервер: на каждую модель создаётся свой ChatOpenAI
+    # с параметрами вызывающего клиента и без собственных повторов
+    def __init__(
+        self,
+        name: str,
+        base_url: str | None = None,
+        api_key: str = "",
+        models: dict[str, str] | list[str] | None = None,
+        max_concurrency: int = 0,
+    ) -> None:
+        self.name = name
+        # Без base_url - адрес OpenAI (или OPENAI_API_BASE, как у ChatOpenAI)
+        self.base_url = base_url or os.getenv("OPENAI_API_BASE")
+        self.api_key = SecretStr(api_key)
+        self.models = {model: model for model in models} if isinstance(models, list) else models
+        self.max_concurrency = max_concurrency
+
+        self.outstanding = 0
+        self.down_until = 0.0
+        # До какого момента бэкенд сам попросил не слать запросы (retry-after в ответе 429)
+        self.paused_until = 0.0
+        self.stats: Counter[str] = Counter()
+        self._clients: dict[tuple[int, str], ChatOpenAI] = {}
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.down_until
+
+    @property
+    def load(self) -> float:
+        # Доля занятых слотов: бэкенды разной мощности сравниваются по загрузке, а не по числу запросов
+        return self.outstanding / (self.max_concurrency or 1)
+
+    def serves(self, model: str) -> str | None:
+        if self.models is None:
+            return model
+        return self.models.get(model)
+
+    def client(self, prototype: ChatOpenAI, model: str) -> ChatOpenAI:
+        key = (id(prototype), model)
+        if key not in self._clients:
+            self._clients[key] = ChatOpenAI(
+                base_url=self.base_url,
+                api_key=self.api_key,
+                model=self.serves(model),
+                temperature=prototype.temperature,
+                max_tokens=prototype.max_tokens,
+                reasoning_effort=prototype.reasoning_effort,
+                timeout=prototype.request_timeout,
+                stream_usage=prototype.stream_usage,
+                max_retries=0,
+            )
+        return self._clients[key]
+
+    def mark_down(self, seconds: float) -> None:
+        self.down_until = max(self.down_until, time.monotonic() + seconds)
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.mark_down(seconds)
+
+    async def check(self) -> bool:
+        # Проверка здоровья - список моделей (/v1/models есть у OpenAI, Ollama и vLLM)
+        client = openai.AsyncOpenAI(
+            base_url=self.base_url, api_key=self.api_key.get_secret_value() or "none", max_retries=0, timeout=5
+        )
+        try:
+            await client.models.list()
+        except Exception as error:
+            self.stats["failed_checks"] += 1
+            self.mark_down(LLM_BACKEND_COOLDOWN)
+            logger.warning("LLM backend %s failed health check: %s", self.name, error)
+            return False
+        finally:
+            await client.close()
+        # Живой сервер возвращается в ротацию, но не раньше, чем он сам просил в retry-after
+        self.down_until = self.paused_until
+        return True
+
+
+class BackendPool:
+    # Маршрутизация запросов к моделям по пулу бэкендов: из исправных бэкендов, обслуживающих
+    # модель, выбирается наименее загруженный; упавший по сети, таймауту, 5xx или 429 бэкенд
+    # выводится из ротации на cooldown секунд, а запрос сразу уходит на другой.
+    # Фоновая проверка здоровья возвращает бэкенды в ротацию раньше и выводит зависшие.
+    def __init__(
+        self,
+        backends: list[Backend],
+        cooldown: float = LLM_BACKEND_COOLDOWN,
+        health_check_interval: float = LLM_HEALTH_CHECK_INTERVAL,
+    ) -> None:
+        self.backends = backends
+        self.cooldown = cooldown
+        self.health_check_interval = health_check_interval
+        self._monitor: asyncio.Task | None = None
+
+    @classmethod
+    def from_settings(cls) -> "BackendPool":
+        if not LLM_BACKENDS:
+            return cls([Backend("openai", api_key=os.getenv("openai_key", ""))])
+        return cls([Backend(**spec) for spec in LLM_BACKENDS])
+
+    def candidates(self, model: str) -> list[Backend]:
+        backends = [backend for backend in self.backends if backend.serves(model)]
+        if not backends:
+            raise ValueError(f"No LLM backend serves model {model!r}")
+        return backends
+
+    def choose(self, model: str, tried: set[str] = frozenset()) -> Backend:
+        backends = self.candidates(model)
+        fresh = [backend for backend in backends if backend.name not in tried] or backends
+        # Если исправных нет, запрос всё равно уходит туда, где пауза закончится раньше всего
+        healthy = [backend for backend in fresh if backend.healthy]
+        if not healthy:
+            return min(fresh, key=lambda backend: backend.down_until)
+        return min(healthy, key=lambda backend: backend.load)
+
+    def can_fail_over(self, model: str, error: Exception, tried: set[str]) -> bool:
+        return isinstance(error, TRANSIENT_ERRORS) and any(
+            backend.healthy and backend.name not in tried for backend in self.candidates(model)
+        )
+
+    @asynccontextmanager
+    async def using(self, model: str, tried: set[str]):
+        # Бэкенд выбирается в момент отправки (уже после ожидания слота в планировщике),
+        # сбойный добавляется в tried, чтобы повтор ушёл на другой
+        self.ensure_monitor()
+        backend = self.choose(model, tried)
+        backend.outstanding += 1
+        backend.stats["requests"] += 1
+        try:
+            yield backend
+        except TRANSIENT_ERRORS as error:
+            tried.add(backend.name)
+            backend.stats["errors"] += 1
+            pause = retry_after(error)
+            if pause:
+                backend.pause(pause)
+            else:
+                backend.mark_down(self.cooldown)
+            logger.warning("LLM backend %s is out of rotation: %s", backend.name, error)
+            raise
+        finally:
+            backend.outstanding -= 1
+
+    def ensure_monitor(self) -> None:
+        # Проверка здоровья нужна, только когда есть из чего выбирать
+        if len(self.backends) < 2 or not self.health_check_interval:
+            return
+        loop = asyncio.get_running_loop()
+        if self._monitor is None or self._monitor.done() or self._monitor.get_loop() is not loop:
+            self._monitor = loop.create_task(self._health_checks())
+
+    async def _health_checks(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            await asyncio.gather(*(backend.check() for backend in self.backends))
+
+    def metrics(self) -> dict:
+        return {
+            backend.name: {"outstanding": backend.outstanding, "healthy": backend.healthy, **backend.stats}
+            for backend in self.backends
+        }
+
+
+llm_pool = BackendPool.from_settings()
@@ -0,0 +1,147 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+
+import click
+
+from embeddings import embedding_service
+from main import graph
+from metrics import RunMetrics, prometheus_text
+from tool_cache import tool_cache
+
+
+def load_jobs(path: str) -> list[dict]:
+    jobs = []
+    with open(path) as file:
+        for line in file:
+            if line.strip():
+                job = json.loads(line)
+                jobs.append({"topic": job["topic"], "wishes": job.get("wishes", "")})
+    return jobs
+
+
+def job_key(job: dict) -> str:
+    return f"{job['topic']}\x00{job['wishes']}"
+
+
+def job_thread_id(job: dict) -> str:
+    # Поток чекпоинтов определяется темой и пожеланиями: повторный запуск продолжает упавшую статью
+    return hashlib.sha256(job_key(job).encode()).hexdigest()[:32]
+
+
+def finished_keys(results_path: str) -> set[str]:
+    # Повторный запуск пропускает темы, для которых уже есть успешная запись
+    if not os.path.exists(results_path):
+        return set()
+
+    finished = set()
+    with open(results_path) as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Оборванная последняя строка после аварийного завершения
+                continue
+            if record.get("status") == "ok":
+                finished.add(job_key(record))
+    return finished
+
+
+def article_path(output_dir: str, topic: str) -> str:
+    return os.path.join(output_dir, f"{topic.replace(os.sep, '_')}.md")
+
+
+async def generate(job: dict, output_dir: str) -> dict:
+    started = time.perf_counter()
+    record = {"topic": job["topic"], "wishes": job["wishes"]}
+
+    run_metrics = RunMetrics(graph)
+    config = {
+        "configurable": {"thread_id": job_thread_id(job), "interactive": False},
+        "callbacks": [run_metrics],
+    }
+    try:
+        snapshot = await graph.aget_state(config)
+        if snapshot.values and not snapshot.next:
+            result = snapshot.values
+        else:
+            graph_input = None if snapshot.next else {"topic": job["topic"], "wishes": job["wishes"]}
+            result = await graph.ainvoke(graph_input, config)
+    except Exception as error:
+        return {
+            **record,
+            "status": "error",
+            "error": repr(error),
+            "seconds": time.perf_counter() - started,
+            "metrics": run_metrics.summary(),
+        }
+
+    path = article_path(output_dir, job["topic"])
+    with open(f"{path}.part", "w") as file:
+        file.write(result["article"])
+    os.replace(f"{path}.part", path)
+
+    return {
+        **record,
+        "status": "ok",
+        "path": path,
+        "sections": len(result["sections"]),
+        "seconds": time.perf_counter() - started,
+        "metrics": run_metrics.summary(),
+    }
+
+
+def write_prometheus(path: str, records: list[dict]) -> None:
+    summaries = [{**record["metrics"], "status": record["status"]} for record in records]
+    with open(f"{path}.part", "w") as file:
+        file.write(prometheus_text(summaries, tool_cache.metrics(), embedding_service.metrics()))
+    os.replace(f"{path}.part", path)
+
+
+async def run_batch(
+    jobs: list[dict], results_path: str, output_dir: str, workers: int, prometheus: str | None = None
+) -> None:
+    os.makedirs(output_dir, exist_ok=True)
+    os.makedirs(os.path.dirname(results_path) or ".", exist_ok=True)
+    records: list[dict] = []
+    queue: asyncio.Queue[dict] = asyncio.Queue()
+    for job in jobs:
+        queue.put_nowait(job)
+
+    async def worker():
+        while not queue.empty():
+            job = queue.get_nowait()
+            record = await generate(job, output_dir)
+            # Запись дописывается сразу, чтобы прерванный запуск можно было продолжить
+            with open(results_path, "a") as file:
+                file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            print(f"[{record['status']}] {record['topic']} ({record['seconds']:.1f} c)")
+
+            records.append(record)
+            if prometheus:
+                # Файл перезаписывается после каждой статьи - его можно отдавать textfile collector'у
+                write_prometheus(prometheus, records)
+
+    await asyncio.gather(*(worker() for _ in range(workers)))
+
+
+@click.command()
+@click.argument("topics", type=click.Path(exists=True, dir_okay=False))
+@click.option("--results", default="outputs/results.jsonl", show_default=True, help="Файл с записями результатов")
+@click.option("--output-dir", default="outputs", show_default=True, help="Каталог для статей")
+@click.option("--workers", default=4, show_default=True, help="Сколько статей генерировать одновременно")
+@click.option("--prometheus", default=None, help="Файл для метрик в текстовом формате Prometheus")
+def main(topics: str, results: str, output_dir: str, workers: int, prometheus: str | None):
+    """Пакетная генерация статей по JSONL-файлу с полями topic и wishes."""
+    jobs = load_jobs(topics)
+    finished = finished_keys(results)
+    pending = [job for job in jobs if job_key(job) not in finished]
+
+    print(f"Тем в файле: {len(jobs)}, уже готово: {len(jobs) - len(pending)}, к генерации: {len(pending)}")
+    asyncio.run(run_batch(pending, results, output_dir, workers, prometheus))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import asyncio
+import json
+import os
+import time
+
+import click
+
+from benchmarks.scheduler import fake_endpoint
+
+FIRST_PORT = 8771
+
+
+@click.command()
+@click.option("--requests", "total", default=200, show_default=True, help="Сколько запросов отправить")
+@click.option("--latencies", default="0.1,0.2,0.4", show_default=True, help="Задержки бэкендов через запятую, с")
+@click.option("--concurrency", default=16, show_default=True, help="llm_concurrency планировщика")
+@click.option(
+    "--outage",
+    default="1:4",
+    show_default=True,
+    help="Когда первый бэкенд недоступен, с от старта (пусто - всегда доступен)",
+)
+@click.option("--health-check-interval", default=1.0, show_default=True)
+@click.option("--cooldown", default=10.0, show_default=True, help="llm_backend_cooldown")
+def main(total: int, latencies: str, concurrency: int, outage: str, health_check_interval: float, cooldown: float):
+    """Пул бэкендов против нескольких локальных OpenAI-совместимых серверов с отказом одного из них."""
+    delays = [float(latency) for latency in latencies.split(",")]
+    backends = [
+        {"name": f"local{index}", "base_url": f"http://127.0.0.1:{FIRST_PORT + index}/v1", "api_key": "local"}
+        for index in range(len(delays))
+    ]
+    # Настройки читаются при импорте settings, поэтому задаются до импорта llms
+    os.environ.setdefault("openai_key", "offline-benchmark")
+    os.environ["llm_backends"] = json.dumps(backends)
+    os.environ["llm_concurrency"] = str(concurrency)
+    os.environ["llm_health_check_interval"] = str(health_check_interval)
+    os.environ["llm_backend_cooldown"] = str(cooldown)
+    os.environ["llm_backoff_base"] = "0.2"
+    os.environ["llm_cache_path"] = ""
+
+    from aiohttp import web
+
+    from backends import llm_pool
+    from llms import llm
+    from scheduler import llm_scheduler
+
+    servers = [fake_endpoint(10**6, delay) for delay in delays]
+
+    async def start(index: int) -> web.AppRunner:
+        runner = web.AppRunner(servers[index][0])
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", FIRST_PORT + index).start()
+        return runner
+
+    async def run() -> tuple[float, int]:
+        runners = [await start(index) for index in range(len(servers))]
+
+        async def breakdown(down: float, up: float) -> None:
+            # Первый бэкенд пропадает из сети и через некоторое время возвращается
+            await asyncio.sleep(down)
+            await runners[0].cleanup()
+            await asyncio.sleep(up - down)
+            runners[0] = await start(0)
+
+        failures = 0
+
+        async def request(number: int) -> None:
+            nonlocal failures
+            try:
+                await llm.ainvoke(f"request {number}")
+            except Exception:
+                failures += 1
+
+        outage_task = None
+        if outage:
+            down, up = (float(value) for value in outage.split(":"))
+            outage_task = asyncio.create_task(breakdown(down, up))
+
+        started = time.monotonic()
+        try:
+            await asyncio.gather(*(request(number) for number in range(total)))
+            elapsed = time.monotonic() - started
+            if outage_task is not None:
+                await outage_task
+        finally:
+            for runner in runners:
+                await runner.cleanup()
+        return elapsed, failures
+
+    elapsed, failures = asyncio.run(run())
+
+    click.echo(f"запросов: {total} за {elapsed:.1f} c ({total / elapsed:.1f} в секунду), неудачных: {failures}")
+    pool_metrics = llm_pool.metrics()
+    for (name, stats), (_, server_stats), delay in zip(pool_metrics.items(), servers, delays):
+        click.echo(
+            f"{name} ({delay} c): обработано {server_stats['requests']}, отправлено {stats.get('requests', 0)}, "
+            f"ошибок {stats.get('errors', 0)}, неудачных проверок {stats.get('failed_checks', 0)}"
+        )
+    click.echo(json.dumps(llm_scheduler.metrics(), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
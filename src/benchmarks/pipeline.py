@@ -0,0 +1,356 @@
+import asyncio
+import contextlib
+import hashlib
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import uuid
+
+import click
+
+VOCABULARY = [f"термин{i}" for i in range(500)] + [f"term{i}" for i in range(500)]
+
+
+def configure_environment(mode: str) -> None:
+    # Настройки читаются при импорте settings, поэтому задаются до импорта модулей приложения:
+    # всё в памяти, без сети, модели, кеша ответов и мемоизации секций
+    os.environ.setdefault("openai_key", "offline-benchmark")
+    os.environ["section_mode"] = mode
+    os.environ["checkpoint_path"] = ":memory:"
+    os.environ["tool_cache_path"] = ""
+    os.environ["llm_cache_path"] = ""
+    os.environ["section_cache_path"] = ""
+    os.environ["retriever_backend"] = "numpy"
+    os.environ["embedding_warmup"] = "false"
+
+
+def deterministic_text(seed: str, chars: int) -> str:
+    rng = random.Random(hashlib.sha256(seed.encode()).digest())
+    words: list[str] = []
+    length = 0
+    while length < chars:
+        word = rng.choice(VOCABULARY)
+        words.append(word)
+        length += len(word) + 1
+    # Абзацы, чтобы разбиение на фрагменты работало как на настоящих выгрузках
+    return "\n\n".join(" ".join(words[i:i + 80]) for i in range(0, len(words), 80))
+
+
+def fake_outline(sections: int, subsections: int) -> list:
+    # sections листьев; при subsections > 0 листья сгруппированы в разделы по subsections подсекций
+    from models import Section
+
+    leaves = [
+        Section(section_title=f"Раздел {index}", content=deterministic_text(f"outline {index}", 300))
+        for index in range(sections)
+    ]
+    if not subsections:
+        return leaves
+    return [
+        Section(
+            section_title=f"Часть {number}",
+            content=deterministic_text(f"part {number}", 300),
+            subsections=leaves[start:start + subsections],
+        )
+        for number, start in enumerate(range(0, sections, subsections))
+    ]
+
+
+def make_fakes(latency: float, response_chars: int, tool_latency: float, tool_chars: int, sections: int):
+    from langchain_core.language_models import BaseChatModel
+    from langchain_core.messages import AIMessage, ToolMessage
+    from langchain_core.outputs import ChatGeneration, ChatResult
+    from langchain_core.runnables import RunnableLambda
+    from langchain_core.tools import Tool, tool
+    from langchain_core.utils.function_calling import convert_to_openai_tool
+
+    from limits import tool_slots
+    from models import GeneratedOutline, OutlineEdits, SectionsList
+    from scheduler import llm_scheduler
+
+    class FakeChatModel(BaseChatModel):
+        # Детерминированная модель: с привязанными инструментами сначала вызывает каждый из них,
+        # после ответов инструментов пишет текст; структурированный вывод - оглавление из sections листьев
+        model_name: str = "fake-model"
+        latency: float = 0.05
+        response_chars: int = 2000
+        sections: int = 5
+        subsections: int = 0
+
+        @property
+        def _llm_type(self) -> str:
+            return "fake-chat"
+
+        def bind_tools(self, tools, **kwargs):
+            return self.bind(tools=[convert_to_openai_tool(item) for item in tools], **kwargs)
+
+        def with_structured_output(self, schema, **kwargs):
+            async def outline(prompt) -> GeneratedOutline | OutlineEdits:
+                async with llm_scheduler.slot():
+                    await asyncio.sleep(self.latency)
+                if schema is OutlineEdits:
+                    # Правка оглавления: фейк оставляет его как есть
+                    return OutlineEdits(edits=[])
+                sections = SectionsList(sections=fake_outline(self.sections, self.subsections))
+                return GeneratedOutline.model_validate(sections.model_dump())
+
+            return RunnableLambda(outline)
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            raise NotImplementedError("FakeChatModel поддерживает только асинхронные вызовы")
+
+        async def _agenerate(self, messages, stop=None, run_manager=None, tools=None, **kwargs):
+            async with llm_scheduler.slot():
+                await asyncio.sleep(self.latency)
+
+            prompt = "".join(str(message.content) for message in messages)
+            if tools and not isinstance(messages[-1], ToolMessage):
+                calls = []
+                for number, spec in enumerate(tools):
+                    argument = next(iter(spec["function"]["parameters"].get("properties", {})), "__arg1")
+                    calls.append(
+                        {"name": spec["function"]["name"], "args": {argument: prompt[-200:]}, "id": f"call_{number}"}
+                    )
+                message = AIMessage(content="", tool_calls=calls)
+            else:
+                message = AIMessage(content=deterministic_text(prompt, self.response_chars))
+
+            prompt_tokens = len(prompt) // 3
+            completion_tokens = len(message.content) // 3
+            message.usage_metadata = {
+                "input_tokens": prompt_tokens,
+                "output_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            }
+            return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def fake_search(query: str) -> str:
+        async with tool_slots:
+            await asyncio.sleep(tool_latency)
+        return deterministic_text(f"search {query}", tool_chars)
+
+    @tool
+    async def search_engine(query: str):
+        """Search engine to the internet"""
+        return await fake_search(query)
+
+    async def wikipedia_search(query: str) -> str:
+        return await fake_search(f"wikipedia {query}")
+
+    wikipedia_tool = Tool(name="Wikipedia", func=None, coroutine=wikipedia_search, description="Поиск по Wikipedia")
+
+    llm = FakeChatModel(latency=latency, response_chars=response_chars, sections=sections)
+    think_llm = FakeChatModel(model_name="fake-think-model", latency=latency, response_chars=response_chars, sections=sections)
+    return llm, think_llm, search_engine, wikipedia_tool
+
+
+def install_fakes(latency: float, response_chars: int, tool_latency: float, tool_chars: int, sections: int):
+    # Фейки подменяют модели, инструменты и эмбеддинги до импорта графов, которые берут их при импорте
+    import llms
+    import tools
+
+    llms.llm, llms.think_llm, tools.search_engine, tools.wikipedia_tool = make_fakes(
+        latency, response_chars, tool_latency, tool_chars, sections
+    )
+
+    from benchmarks.retrieval import HashingEmbeddings
+    from embeddings import embedding_service
+
+    embedding_service._model = HashingEmbeddings()
+
+
+class PeakRSS:
+    # Пиковый RSS процесса за время замера: опрос в фоновом потоке
+    def __init__(self, interval: float = 0.01) -> None:
+        import psutil
+
+        self.process = psutil.Process()
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self) -> None:
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.process.memory_info().rss)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = self.process.memory_info().rss
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.process.memory_info().rss)
+
+
+def article_input(target: str, sections: int, subsections: int) -> dict:
+    if target == "main":
+        return {"topic": "Оффлайн-бенчмарк", "wishes": ""}
+    return {"topic": "Оффлайн-бенчмарк", "wishes": "", "sections": fake_outline(sections, subsections)}
+
+
+async def run_scenario(graph, target: str, sections: int, subsections: int, concurrency: int) -> dict:
+    from checkpoints import checkpointer
+    from context_packer import context_packer
+    from metrics import RunMetrics
+    from topic_structure import outline_thread_id
+
+    async def one() -> dict:
+        run_metrics = RunMetrics(graph)
+        thread_id = str(uuid.uuid4())
+        config = {
+            "configurable": {"thread_id": thread_id, "interactive": False},
+            "callbacks": [run_metrics],
+        }
+        await graph.ainvoke(article_input(target, sections, subsections), config)
+        # Поток оглавления хранится под своим thread_id
+        checkpoint_bytes = sum(checkpointer.stored_bytes(id_) for id_ in (thread_id, outline_thread_id(thread_id)))
+        return {**run_metrics.summary(), "checkpoint_bytes": checkpoint_bytes}
+
+    # Средний промпт написания секции за замер: он не должен расти с числом секций
+    before = dict(context_packer.metrics().get("write_section", {}))
+    started = time.perf_counter()
+    # Узлы оглавления печатают его в консоль - в отчёте бенчмарка это лишнее
+    with PeakRSS() as rss, contextlib.redirect_stdout(io.StringIO()):
+        summaries = await asyncio.gather(*(one() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    after = context_packer.metrics().get("write_section", {})
+    write_calls = after.get("prompts", 0) - before.get("prompts", 0)
+
+    return {
+        "seconds": elapsed,
+        "peak_rss_mb": rss.peak / 2**20,
+        "articles_per_minute": concurrency / elapsed * 60,
+        "sections_per_second": concurrency * sections / elapsed,
+        "checkpoint_kb": statistics.mean(summary["checkpoint_bytes"] for summary in summaries) / 1024,
+        "write_prompt_tokens": (after.get("prompt_tokens", 0) - before.get("prompt_tokens", 0)) / max(write_calls, 1),
+        "nodes": summaries[0]["nodes"],
+        "llm_calls": summaries[0]["llm_total"].get("calls", 0),
+    }
+
+
+@click.command()
+@click.option("--sections", default="3,10,50", show_default=True, help="Размеры оглавления (число листьев) через запятую")
+@click.option("--subsections", default=0, show_default=True, help="Листьев в разделе иерархического оглавления, 0 - плоское")
+@click.option("--targets", default="main,content", show_default=True, help="main - main.graph, content - content_generator.graph")
+@click.option("--mode", type=click.Choice(["parallel", "sequential"]), default="parallel", show_default=True)
+@click.option("--repeats", default=3, show_default=True)
+@click.option("--concurrency", default=1, show_default=True, help="Статей одновременно в одном замере")
+@click.option("--latency", default=0.05, show_default=True, help="Задержка ответа модели, с")
+@click.option("--response-chars", default=2000, show_default=True, help="Длина ответа модели")
+@click.option("--tool-latency", default=0.05, show_default=True, help="Задержка инструмента поиска, с")
+@click.option("--tool-chars", default=3000, show_default=True, help="Длина результата поиска")
+@click.option("--top-nodes", default=6, show_default=True, help="Сколько самых долгих узлов показать")
+@click.option("--json", "json_path", default=None, help="Сохранить результаты в JSON")
+@click.option("--baseline", default=None, help="JSON прошлого запуска для сравнения")
+@click.option("--tolerance", default=0.2, show_default=True, help="Допустимое замедление относительно baseline")
+def main(
+    sections: str,
+    subsections: int,
+    targets: str,
+    mode: str,
+    repeats: int,
+    concurrency: int,
+    latency: float,
+    response_chars: int,
+    tool_latency: float,
+    tool_chars: int,
+    top_nodes: int,
+    json_path: str | None,
+    baseline: str | None,
+    tolerance: float,
+):
+    """Оффлайн-бенчмарк оркестрации: main.graph и граф контента на фейковых моделях и инструментах."""
+    configure_environment(mode)
+    sizes = [int(size) for size in sections.split(",")]
+
+    install_fakes(latency, response_chars, tool_latency, tool_chars, max(sizes))
+
+    import content_generator
+    import llms
+    import main as article
+
+    graphs = {"main": article.get_graph(), "content": content_generator.graph}
+
+    click.echo(
+        f"mode={mode} subsections={subsections} repeats={repeats} concurrency={concurrency} latency={latency}s "
+        f"response_chars={response_chars} tool_latency={tool_latency}s tool_chars={tool_chars}"
+    )
+    click.echo(
+        f"{'target':<9}{'sections':>9}{'median, s':>11}{'max, s':>9}{'peak RSS, MB':>14}"
+        f"{'articles/min':>14}{'sections/s':>12}{'llm calls':>11}{'checkpoint, KB':>16}{'write prompt':>14}"
+    )
+
+    results = []
+    loop = asyncio.new_event_loop()
+    for target in targets.split(","):
+        for size in sizes:
+            llms.llm.sections = llms.think_llm.sections = size
+            llms.llm.subsections = llms.think_llm.subsections = subsections
+            # Один цикл событий на все замеры: семафоры limits привязываются к циклу при первом ожидании
+            runs = [
+                loop.run_until_complete(run_scenario(graphs[target], target, size, subsections, concurrency))
+                for _ in range(repeats)
+            ]
+            median = statistics.median(run["seconds"] for run in runs)
+            result = {
+                "target": target,
+                "sections": size,
+                "median_seconds": median,
+                "max_seconds": max(run["seconds"] for run in runs),
+                "peak_rss_mb": max(run["peak_rss_mb"] for run in runs),
+                "articles_per_minute": statistics.median(run["articles_per_minute"] for run in runs),
+                "sections_per_second": statistics.median(run["sections_per_second"] for run in runs),
+                "llm_calls": runs[-1]["llm_calls"],
+                "checkpoint_kb": runs[-1]["checkpoint_kb"],
+                "write_prompt_tokens": runs[-1]["write_prompt_tokens"],
+                "nodes": runs[-1]["nodes"],
+            }
+            results.append(result)
+            click.echo(
+                f"{target:<9}{size:>9}{median:>11.2f}{result['max_seconds']:>9.2f}{result['peak_rss_mb']:>14.1f}"
+                f"{result['articles_per_minute']:>14.1f}{result['sections_per_second']:>12.1f}{result['llm_calls']:>11}"
+                f"{result['checkpoint_kb']:>16.1f}{result['write_prompt_tokens']:>14.0f}"
+            )
+            slowest = sorted(result["nodes"].items(), key=lambda item: item[1]["seconds"], reverse=True)
+            for node, stats in slowest[:top_nodes]:
+                click.echo(f"{'':<18}{node:<44}{stats['seconds']:>8.2f} s {stats['runs']:>5} runs")
+
+    loop.close()
+
+    if json_path:
+        with open(json_path, "w") as file:
+            json.dump(
+                {"mode": mode, "subsections": subsections, "concurrency": concurrency, "results": results},
+                file,
+                ensure_ascii=False,
+                indent=2,
+            )
+
+    if baseline:
+        # Для CI: ненулевой код выхода, если сценарий замедлился больше чем на tolerance
+        with open(baseline) as file:
+            previous = {(item["target"], item["sections"]): item for item in json.load(file)["results"]}
+        regressions = []
+        for result in results:
+            before = previous.get((result["target"], result["sections"]))
+            if before and result["median_seconds"] > before["median_seconds"] * (1 + tolerance):
+                regressions.append(
+                    f"{result['target']}/{result['sections']}: "
+                    f"{before['median_seconds']:.2f} s -> {result['median_seconds']:.2f} s"
+                )
+        if regressions:
+            click.echo("Замедление относительно baseline:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
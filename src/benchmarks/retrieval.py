@@ -0,0 +1,87 @@
+import hashlib
+import random
+import statistics
+import time
+
+import click
+import numpy as np
+
+from embeddings import embedding_service
+from retrievers import NumpyRetriever
+
+
+class HashingEmbeddings:
+    # Детерминированные эмбеддинги без модели: сравниваются накладные расходы
+    # самих бэкендов, а не время работы SentenceTransformer
+    def __init__(self, dimensions: int = 384) -> None:
+        self.dimensions = dimensions
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                column = int(hashlib.md5(word.encode()).hexdigest(), 16) % self.dimensions
+                vectors[row, column] += 1.0
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+
+def make_corpus(passages: int, sections: int, seed: int = 0) -> tuple[list[str], list[dict], list[str]]:
+    rng = random.Random(seed)
+    vocabulary = [f"term{i}" for i in range(2000)]
+    texts = [" ".join(rng.choices(vocabulary, k=150)) + f" passage{i}" for i in range(passages)]
+    metadatas = [{"section": f"section {i % sections}", "topic": "benchmark"} for i in range(passages)]
+    queries = [" ".join(rng.choices(vocabulary, k=8)) for _ in range(sections)]
+    return texts, metadatas, queries
+
+
+def run_backend(factory, texts, metadatas, queries, k: int) -> tuple[float, float]:
+    started = time.perf_counter()
+    retriever = factory()
+    ids = retriever.add(texts, metadatas)
+    indexed = time.perf_counter()
+
+    exclude = [set(ids[section::len(queries)]) for section in range(len(queries))]
+    retriever.search_many(queries, k=k, exclude=exclude)
+    searched = time.perf_counter()
+
+    retriever.close()
+    return indexed - started, searched - indexed
+
+
+@click.command()
+@click.option("--passages", default=300, show_default=True, help="Фрагментов в корпусе статьи")
+@click.option("--sections", default=8, show_default=True, help="Секций (поисковых запросов)")
+@click.option("--k", default=3, show_default=True)
+@click.option("--repeats", default=5, show_default=True)
+@click.option("--hybrid-weight", default=0.3, show_default=True, help="Вес BM25 для гибридного numpy")
+def main(passages: int, sections: int, k: int, repeats: int, hybrid_weight: float):
+    """Сравнение numpy- и Chroma-бэкендов поиска на корпусе одной статьи."""
+    embedding_service._model = HashingEmbeddings()
+    texts, metadatas, queries = make_corpus(passages, sections)
+
+    started = time.perf_counter()
+    from corpus import ResearchCorpus
+
+    chroma_import = time.perf_counter() - started
+
+    backends = {
+        "numpy": NumpyRetriever,
+        "numpy+bm25": lambda: NumpyRetriever(hybrid_weight=hybrid_weight),
+        "chroma": ResearchCorpus,
+    }
+
+    click.echo(f"passages={passages} sections={sections} k={k} repeats={repeats}")
+    click.echo(f"chroma import: {chroma_import * 1000:.1f} ms")
+    click.echo(f"{'backend':<12}{'index, ms':>12}{'search, ms':>12}{'total, ms':>12}")
+    for name, factory in backends.items():
+        runs = [run_backend(factory, texts, metadatas, queries, k) for _ in range(repeats)]
+        index = statistics.median(run[0] for run in runs) * 1000
+        search = statistics.median(run[1] for run in runs) * 1000
+        click.echo(f"{name:<12}{index:>12.1f}{search:>12.1f}{index + search:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
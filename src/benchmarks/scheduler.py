@@ -0,0 +1,121 @@
+import asyncio
+import json
+import os
+import statistics
+import time
+from collections import deque
+
+import click
+
+PORT = 8765
+
+
+def fake_endpoint(rpm: int, latency: float, window: float = 60):
+    # OpenAI-совместимый /v1/chat/completions с лимитом rpm запросов в скользящем окне
+    # (минута, в тестах - доли секунды): сверх лимита отвечает 429 с retry-after, как настоящий API
+    from aiohttp import web
+
+    recent: deque[float] = deque()
+    stats = {"requests": 0, "rate_limited": 0}
+
+    async def chat(request):
+        body = await request.json()
+        stats["requests"] += 1
+
+        now = time.monotonic()
+        while recent and now - recent[0] > window:
+            recent.popleft()
+        if len(recent) >= rpm:
+            stats["rate_limited"] += 1
+            return web.json_response(
+                {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                status=429,
+                headers={"retry-after": f"{window - (now - recent[0]):.2f}"},
+            )
+        recent.append(now)
+
+        await asyncio.sleep(latency)
+        return web.json_response(
+            {
+                "id": "chatcmpl-benchmark",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body["model"],
+                "choices": [
+                    {"index": 0, "message": {"role": "assistant", "content": "ok"}, "finish_reason": "stop"}
+                ],
+                "usage": {"prompt_tokens": 10, "completion_tokens": 1, "total_tokens": 11},
+            }
+        )
+
+    async def models(request):
+        # Список моделей - по нему пул бэкендов проверяет здоровье сервера
+        return web.json_response({"object": "list", "data": []})
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", chat)
+    app.router.add_get("/v1/models", models)
+    return app, stats
+
+
+@click.command()
+@click.option("--requests", "total", default=120, show_default=True, help="Сколько запросов отправить")
+@click.option("--server-rpm", default=60, show_default=True, help="Лимит запросов в минуту на фейковом сервере")
+@click.option("--client-rpm", default=0.0, show_default=True, help="llm_rpm планировщика (0 - не ограничивать)")
+@click.option("--latency", default=0.2, show_default=True, help="Задержка ответа сервера, с")
+@click.option("--interactive-share", default=0.1, show_default=True, help="Доля запросов с интерактивным приоритетом")
+def main(total: int, server_rpm: int, client_rpm: float, latency: float, interactive_share: float):
+    """Планировщик запросов к моделям против локального сервера с лимитом RPM."""
+    os.environ.setdefault("openai_key", "offline-benchmark")
+    os.environ["OPENAI_API_BASE"] = f"http://127.0.0.1:{PORT}/v1"
+    os.environ["llm_rpm"] = str(client_rpm)
+    os.environ["llm_backoff_base"] = "0.2"
+    os.environ["llm_cache_path"] = ""
+
+    from aiohttp import web
+    from langchain_core.runnables.config import var_child_runnable_config
+
+    from llms import llm
+    from scheduler import PRIORITY_BATCH, PRIORITY_INTERACTIVE, llm_scheduler
+
+    app, server_stats = fake_endpoint(server_rpm, latency)
+
+    async def run() -> dict[int, list[float]]:
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", PORT).start()
+
+        latencies: dict[int, list[float]] = {PRIORITY_INTERACTIVE: [], PRIORITY_BATCH: []}
+        every = max(1, round(1 / interactive_share)) if interactive_share else 0
+
+        async def request(number: int) -> None:
+            priority = PRIORITY_INTERACTIVE if every and number % every == 0 else PRIORITY_BATCH
+            # Приоритет планировщик берёт из конфига текущего узла графа; здесь графа нет
+            var_child_runnable_config.set({"configurable": {"priority": priority}})
+            started = time.monotonic()
+            await llm.ainvoke(f"request {number}")
+            latencies[priority].append(time.monotonic() - started)
+
+        try:
+            await asyncio.gather(*(request(number) for number in range(total)))
+        finally:
+            await runner.cleanup()
+        return latencies
+
+    started = time.monotonic()
+    latencies = asyncio.run(run())
+    elapsed = time.monotonic() - started
+
+    click.echo(f"запросов: {total} за {elapsed:.1f} c ({total / elapsed * 60:.0f} в минуту)")
+    click.echo(f"сервер: {server_stats['requests']} обращений, из них 429: {server_stats['rate_limited']}")
+    for priority, name in ((PRIORITY_INTERACTIVE, "интерактивные"), (PRIORITY_BATCH, "пакетные")):
+        if latencies[priority]:
+            click.echo(
+                f"{name}: {len(latencies[priority])}, медиана {statistics.median(latencies[priority]):.1f} c, "
+                f"максимум {max(latencies[priority]):.1f} c"
+            )
+    click.echo(json.dumps(llm_scheduler.metrics(), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
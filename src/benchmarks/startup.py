@@ -0,0 +1,81 @@
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+import click
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MODULES = (
+    "main",
+    "settings",
+    "checkpoints",
+    "llms",
+    "tools",
+    "retrievers",
+    "embeddings",
+    "topic_structure",
+    "content_generator",
+)
+
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$")
+
+
+def import_times(module: str) -> tuple[int, dict[str, int]]:
+    # Каждый модуль импортируется в чистом интерпретаторе, иначе зависимости
+    # окажутся уже загруженными предыдущим замером
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SRC_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        raise click.ClickException(f"import {module}:\n{completed.stderr[-2000:]}")
+
+    cumulative = 0
+    packages: dict[str, int] = defaultdict(int)
+    for line in completed.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        # Собственное время модулей суммируется по пакетам верхнего уровня
+        packages[name.split(".")[0]] += int(self_us)
+        if not indent and name == module:
+            cumulative = int(cumulative_us)
+    return cumulative, packages
+
+
+@click.command()
+@click.argument("modules", nargs=-1)
+@click.option("--repeats", default=5, show_default=True)
+@click.option("--top", default=10, show_default=True, help="Сколько самых тяжёлых пакетов показать для первого модуля")
+def main(modules: tuple[str, ...], repeats: int, top: int):
+    """Время импорта модулей приложения (python -X importtime, медиана по повторам)."""
+    modules = modules or DEFAULT_MODULES
+
+    click.echo(f"python {sys.version.split()[0]}, repeats={repeats}")
+    click.echo(f"{'module':<20}{'import, ms':>12}{'min, ms':>12}")
+    breakdown: dict[str, list[int]] = defaultdict(list)
+    for module in modules:
+        runs = []
+        for _ in range(repeats):
+            cumulative, packages = import_times(module)
+            runs.append(cumulative / 1000)
+            if module == modules[0]:
+                for package, self_us in packages.items():
+                    breakdown[package].append(self_us)
+        click.echo(f"{module:<20}{statistics.median(runs):>12.1f}{min(runs):>12.1f}")
+
+    click.echo(f"\nСамые тяжёлые пакеты при импорте {modules[0]}:")
+    heaviest = sorted(breakdown.items(), key=lambda item: statistics.median(item[1]), reverse=True)
+    for package, samples in heaviest[:top]:
+        click.echo(f"  {package:<28}{statistics.median(samples) / 1000:>10.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
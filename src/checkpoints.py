@@ -0,0 +1,426 @@
+import asyncio
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections.abc import AsyncIterator, Iterator, Sequence
+from typing import Any, Optional
+
+import click
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    SerializerProtocol,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.serde.types import TASKS, ChannelProtocol
+
+from settings import CHECKPOINT_MAX_AGE_DAYS, CHECKPOINT_PATH
+
+TABLES = ("checkpoints", "blobs", "writes", "threads")
+
+
+class SqliteCheckpointSaver(BaseCheckpointSaver[str]):
+    # Чекпоинты графов в SQLite: та же модель хранения, что и у MemorySaver
+    # (чекпоинты, значения каналов по версиям и промежуточные записи задач),
+    # но переживающая перезапуск процесса. По thread_id прерванный запуск
+    # продолжается с последнего завершённого узла. Потоки, в которые не писали
+    # дольше max_age_days, удаляются при открытии базы и командой compact.
+    def __init__(
+        self,
+        path: str,
+        *,
+        serde: Optional[SerializerProtocol] = None,
+        max_age_days: float = CHECKPOINT_MAX_AGE_DAYS,
+    ) -> None:
+        super().__init__(serde=serde)
+        self.path = path
+        self.max_age_days = max_age_days
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+    @property
+    def _connection(self) -> sqlite3.Connection:
+        # База открывается при первом обращении графа, а не при импорте: импорт графов
+        # (и бенчмарк запуска) не должен оставлять файл чекпоинтов в текущем каталоге.
+        # Вызывается под self._lock
+        if self._db is None:
+            if self.path != ":memory:" and os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS checkpoints (
+                    thread_id TEXT NOT NULL,
+                    checkpoint_ns TEXT NOT NULL,
+                    checkpoint_id TEXT NOT NULL,
+                    parent_checkpoint_id TEXT,
+                    type TEXT NOT NULL,
+                    checkpoint BLOB NOT NULL,
+                    metadata_type TEXT NOT NULL,
+                    metadata BLOB NOT NULL,
+                    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+                );
+                CREATE TABLE IF NOT EXISTS blobs (
+                    thread_id TEXT NOT NULL,
+                    checkpoint_ns TEXT NOT NULL,
+                    channel TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    type TEXT NOT NULL,
+                    blob BLOB NOT NULL,
+                    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+                );
+                CREATE TABLE IF NOT EXISTS writes (
+                    thread_id TEXT NOT NULL,
+                    checkpoint_ns TEXT NOT NULL,
+                    checkpoint_id TEXT NOT NULL,
+                    task_id TEXT NOT NULL,
+                    idx INTEGER NOT NULL,
+                    channel TEXT NOT NULL,
+                    type TEXT NOT NULL,
+                    blob BLOB NOT NULL,
+                    task_path TEXT NOT NULL,
+                    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+                );
+                CREATE TABLE IF NOT EXISTS threads (
+                    thread_id TEXT PRIMARY KEY,
+                    updated_at REAL NOT NULL
+                );
+                """
+            )
+            # Потокам из баз, созданных до учёта времени записи, срок хранения отсчитывается с этого открытия
+            connection.execute(
+                "INSERT OR IGNORE INTO threads SELECT DISTINCT thread_id, ? FROM checkpoints", (time.time(),)
+            )
+            connection.commit()
+            self._db = connection
+            if self.max_age_days:
+                self._prune(time.time() - self.max_age_days * 24 * 60 * 60)
+        return self._db
+
+    def _delete(self, thread_ids: list[str]) -> None:
+        # Вызывается под self._lock
+        for table in TABLES:
+            self._connection.executemany(f"DELETE FROM {table} WHERE thread_id = ?", [(id_,) for id_ in thread_ids])
+        self._connection.commit()
+
+    def _prune(self, cutoff: float) -> list[str]:
+        # Вызывается под self._lock
+        expired = [
+            thread_id
+            for (thread_id,) in self._connection.execute(
+                "SELECT thread_id FROM threads WHERE updated_at < ?", (cutoff,)
+            ).fetchall()
+        ]
+        self._delete(expired)
+        return expired
+
+    def delete_thread(self, thread_id: str) -> None:
+        # Завершённый запуск, который не нужно продолжать, удаляется сразу
+        with self._lock:
+            self._delete([thread_id])
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    def prune(self, max_age_days: Optional[float] = None) -> int:
+        # Удаляет потоки, в которые не писали дольше max_age_days, и возвращает их число
+        max_age_days = self.max_age_days if max_age_days is None else max_age_days
+        if not max_age_days:
+            return 0
+        with self._lock:
+            return len(self._prune(time.time() - max_age_days * 24 * 60 * 60))
+
+    def compact(self, max_age_days: Optional[float] = None) -> dict:
+        pruned = self.prune(max_age_days)
+        with self._lock:
+            # VACUUM возвращает место после удалений; для базы в памяти не нужен
+            if self.path != ":memory:":
+                self._connection.execute("VACUUM")
+            (threads,) = self._connection.execute("SELECT COUNT(*) FROM threads").fetchone()
+        return {"pruned": pruned, "threads": threads}
+
+    def _fetch(self, query: str, params: tuple) -> list[tuple]:
+        with self._lock:
+            return self._connection.execute(query, params).fetchall()
+
+    def _load_blobs(self, thread_id: str, checkpoint_ns: str, versions: ChannelVersions) -> dict[str, Any]:
+        channel_values: dict[str, Any] = {}
+        for channel, version in versions.items():
+            rows = self._fetch(
+                "SELECT type, blob FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                (thread_id, checkpoint_ns, channel, str(version)),
+            )
+            if rows and rows[0][0] != "empty":
+                channel_values[channel] = self.serde.loads_typed(rows[0])
+        return channel_values
+
+    def _tuple(self, thread_id: str, checkpoint_ns: str, row: tuple) -> CheckpointTuple:
+        checkpoint_id, parent_checkpoint_id, type_, checkpoint_blob, metadata_type, metadata_blob = row
+
+        writes = self._fetch(
+            "SELECT task_id, channel, type, blob FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        )
+        sends = (
+            self._fetch(
+                "SELECT type, blob FROM writes "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? AND channel = ? "
+                "ORDER BY task_path, task_id, idx",
+                (thread_id, checkpoint_ns, parent_checkpoint_id, TASKS),
+            )
+            if parent_checkpoint_id
+            else []
+        )
+
+        checkpoint: Checkpoint = self.serde.loads_typed((type_, checkpoint_blob))
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint={
+                **checkpoint,
+                "channel_values": self._load_blobs(thread_id, checkpoint_ns, checkpoint["channel_versions"]),
+                "pending_sends": [self.serde.loads_typed(send) for send in sends],
+            },
+            metadata=self.serde.loads_typed((metadata_type, metadata_blob)),
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((type_, blob))) for task_id, channel, type_, blob in writes
+            ],
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_checkpoint_id,
+                    }
+                }
+                if parent_checkpoint_id
+                else None
+            ),
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        columns = "checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata"
+
+        if checkpoint_id := get_checkpoint_id(config):
+            rows = self._fetch(
+                f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                (thread_id, checkpoint_ns, checkpoint_id),
+            )
+        else:
+            rows = self._fetch(
+                f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                "ORDER BY checkpoint_id DESC LIMIT 1",
+                (thread_id, checkpoint_ns),
+            )
+
+        return self._tuple(thread_id, checkpoint_ns, rows[0]) if rows else None
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        conditions, params = [], []
+        if config:
+            conditions.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if (checkpoint_ns := config["configurable"].get("checkpoint_ns")) is not None:
+                conditions.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                conditions.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            conditions.append("checkpoint_id < ?")
+            params.append(before_id)
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self._fetch(
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, "
+            f"metadata_type, metadata FROM checkpoints {where} ORDER BY checkpoint_id DESC",
+            tuple(params),
+        )
+
+        for thread_id, checkpoint_ns, *row in rows:
+            if filter:
+                metadata = self.serde.loads_typed((row[4], row[5]))
+                if not all(metadata.get(key) == value for key, value in filter.items()):
+                    continue
+            if limit is not None:
+                if limit <= 0:
+                    break
+                limit -= 1
+            yield self._tuple(thread_id, checkpoint_ns, tuple(row))
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        stored = checkpoint.copy()
+        stored.pop("pending_sends")  # type: ignore[misc]
+        values: dict[str, Any] = stored.pop("channel_values")  # type: ignore[misc]
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+
+        blobs = [
+            (
+                thread_id,
+                checkpoint_ns,
+                channel,
+                str(version),
+                *(self.serde.dumps_typed(values[channel]) if channel in values else ("empty", b"")),
+            )
+            for channel, version in new_versions.items()
+        ]
+        with self._lock:
+            self._connection.executemany("INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?)", blobs)
+            self._connection.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    thread_id,
+                    checkpoint_ns,
+                    checkpoint["id"],
+                    config["configurable"].get("checkpoint_id"),
+                    *self.serde.dumps_typed(stored),
+                    *self.serde.dumps_typed(get_checkpoint_metadata(config, metadata)),
+                ),
+            )
+            self._connection.execute("INSERT OR REPLACE INTO threads VALUES (?, ?)", (thread_id, time.time()))
+            self._connection.commit()
+
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+
+        with self._lock:
+            for idx, (channel, value) in enumerate(writes):
+                idx = WRITES_IDX_MAP.get(channel, idx)
+                # Обычные записи задачи не перезаписываются, служебные (ошибка, interrupt) - заменяются
+                verb = "INSERT OR IGNORE" if idx >= 0 else "INSERT OR REPLACE"
+                self._connection.execute(
+                    f"{verb} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        thread_id,
+                        checkpoint_ns,
+                        checkpoint_id,
+                        task_id,
+                        idx,
+                        channel,
+                        *self.serde.dumps_typed(value),
+                        task_path,
+                    ),
+                )
+            self._connection.commit()
+
+    def stored_bytes(self, thread_id: Optional[str] = None) -> int:
+        # Объём сериализованных чекпоинтов, значений каналов и записей задач (всех или одного потока)
+        condition, params = ("WHERE thread_id = ?", (thread_id,)) if thread_id is not None else ("", ())
+        total = 0
+        for query in (
+            f"SELECT COALESCE(SUM(LENGTH(checkpoint) + LENGTH(metadata)), 0) FROM checkpoints {condition}",
+            f"SELECT COALESCE(SUM(LENGTH(blob)), 0) FROM blobs {condition}",
+            f"SELECT COALESCE(SUM(LENGTH(blob)), 0) FROM writes {condition}",
+        ):
+            total += self._fetch(query, params)[0][0]
+        return total
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(lambda: [*self.list(config, filter=filter, before=before, limit=limit)])
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    def get_next_version(self, current: Optional[str], channel: ChannelProtocol) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+
+checkpointer = SqliteCheckpointSaver(CHECKPOINT_PATH)
+
+
+@click.group()
+def cli():
+    pass
+
+
+@cli.command()
+@click.option("--path", default=CHECKPOINT_PATH, show_default=True, help="Файл базы чекпоинтов")
+@click.option("--max-age-days", default=CHECKPOINT_MAX_AGE_DAYS, show_default=True)
+def compact(path: str, max_age_days: float):
+    """Удалить потоки без записей дольше max-age-days и сжать файл базы."""
+    result = SqliteCheckpointSaver(path, max_age_days=0).compact(max_age_days)
+    click.echo(f"Удалено потоков: {result['pruned']}, осталось: {result['threads']}")
+
+
+if __name__ == "__main__":
+    cli()
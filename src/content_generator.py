@@ -1,309 +1,682 @@
+import asyncio
+import dataclasses
+import json
+import logging
+import uuid
+
 from langchain.prompts import ChatPromptTemplate
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import Chroma
-from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.messages import ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.config import get_stream_writer
 from langgraph.graph import END, START, StateGraph
-from langgraph.prebuilt import ToolNode, create_react_agent, tools_condition
-
+from langgraph.prebuilt import create_react_agent
+from langgraph.types import Send
+
+from backends import node_model
+from checkpoints import checkpointer
+from context_packer import context_packer, mmr, trim_tokens
+from embeddings import embedding_service
+from limits import research_slots
 from llms import llm
-from models import Section
-from states import ContentGenerationState
+from metrics import RunMetrics
+from models import TOP_HEADING_LEVEL, OutlineLeaf, Section, heading, outline_leaves
+from retrievers import NumpyRetriever, open_retriever, passage_id, split_passages
+from section_cache import SectionCache, section_cache
+from settings import (
+    PLANNING_CONTEXT_TOKENS,
+    PREVIOUS_CONTEXT_TOKENS,
+    RELATED_PASSAGES,
+    ROLLING_SUMMARY_TOKENS,
+    SECTION_MODE,
+    WRITING_CONTEXT_TOKENS,
+)
+from speculation import research_speculator
+from states import ContentGenerationState, ResearchRecord, SectionTask
 from tools import search_engine, wikipedia_tool
 
+logger = logging.getLogger(__name__)
+
+
+research_prompt = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            "Вы - исследователь, собирающий информацию по заданной теме. "
+            "Используйте доступные инструменты для поиска информации. "
+            "Соберите максимально полные данные, включая определения, ключевые концепции, "
+            "примеры, сравнения и актуальные сведения. "
+            "Структурируйте найденную информацию в виде списка фактов и ключевых моментов.",
+        ),
+        (
+            "user",
+            """
+        Тема статьи: {topic}
+        Подтема для исследования: {title}
+        Описание подтемы: {description}
+
+        Соберите всю необходимую информацию по этой подтеме.
+        """,
+        ),
+    ]
+)
+
+# Агент исследования не сохраняет свои шаги в чекпоинты графа статьи: при возобновлении
+# research_phase выполняется заново (поиск берётся из кеша инструментов), а история сообщений
+# каждого шага ReAct-цикла занимала бо́льшую часть объёма чекпоинтов
+research_agent = create_react_agent(model=llm, tools=[wikipedia_tool, search_engine], checkpointer=False)
+research_chain = research_prompt | research_agent
+
+
+async def research_section(
+    topic: str, section: Section, semaphore: asyncio.Semaphore, config: RunnableConfig | None = None
+) -> dict:
+    async with semaphore:
+        return await research_chain.ainvoke(
+            {
+                "topic": topic,
+                "title": section.section_title,
+                "description": section.content,
+            },
+            config,
+        )
 
-async def research_phase(state: ContentGenerationState):
-    research_prompt = ChatPromptTemplate.from_messages(
-        [
-            (
-                "system",
-                "Вы - исследователь, собирающий информацию по заданной теме. "
-                "Используйте доступные инструменты для поиска информации. "
-                "Соберите максимально полные данные, включая определения, ключевые концепции, "
-                "примеры, сравнения и актуальные сведения. "
-                "Структурируйте найденную информацию в виде списка фактов и ключевых моментов.",
-            ),
-            (
-                "user",
-                """
-            Тема статьи: {topic}
-            Подтема для исследования: {title}
-            Описание подтемы: {description}
-
-            Соберите всю необходимую информацию по этой подтеме.
-            """,
-            ),
-        ]
-    )
 
-    research_agent = create_react_agent(
-        model=llm, tools=[wikipedia_tool, search_engine]
+def recall(stage: str, *parts: str) -> tuple[str, str | None]:
+    # Ключ мемоизации секции по её входным данным и сохранённый результат, если он есть
+    key = SectionCache.key(*parts)
+    return key, section_cache.get(stage, key) if section_cache is not None else None
+
+
+def remember(stage: str, key: str, value: str) -> None:
+    if section_cache is not None:
+        section_cache.put(stage, key, value)
+
+
+async def researched_section(
+    scope: str, topic: str, section: Section, semaphore: asyncio.Semaphore
+) -> dict:
+    # Исследование, начатое ещё во время согласования оглавления, не повторяется
+    result = await research_speculator.take(scope, section)
+    if result is not None:
+        return result
+    return await research_section(topic, section, semaphore)
+
+
+def outline_context(leaf: OutlineLeaf) -> str:
+    # Описания разделов, в которые вложен лист: общий контекст подсекций одного раздела
+    return "\n".join(
+        f"Раздел «{parent.section_title}»: {parent.content}" for parent in leaf.parents
     )
-    research_chain = research_prompt | research_agent
 
+
+async def research_phase(state: ContentGenerationState, config: RunnableConfig):
     topic = state["topic"]
-    sections = [Section.model_validate(section) for section in state["sections"]]
+    # Исследуются, планируются и пишутся только листья оглавления
+    leaves = outline_leaves([Section.model_validate(section) for section in state["sections"]])
+    sections = [leaf.section for leaf in leaves]
+    scope = config["configurable"].get("thread_id", "")
     research_results = []
-    results: list[AIMessage] = []
 
-    for section in sections:
-        result = await research_chain.ainvoke(
-            {
-                "topic": topic,
-                "title": section.section_title,
-                "description": section.content,
-            }
+    # Секции исследуются параллельно, но не более RESEARCH_CONCURRENCY одновременно вместе
+    # с фоновым исследованием той же статьи, ещё не законченным к этому моменту.
+    # gather сохраняет порядок секций, а ошибка одной секции не прерывает остальные.
+    # Секции, исследованные в прошлых запусках с теми же заголовком и описанием, не исследуются
+    memos = [
+        recall("research", topic, section.section_title, section.content, node_model(llm.model_name))
+        for section in sections
+    ]
+    semaphore = research_slots(scope)
+    outcomes = iter(
+        await asyncio.gather(
+            *(
+                researched_section(scope, topic, section, semaphore)
+                for section, (_, research_data) in zip(sections, memos)
+                if research_data is None
+            ),
+            return_exceptions=True,
+        )
+    )
+    research_speculator.discard(scope)
+
+    def record(leaf: OutlineLeaf, research_data: str) -> ResearchRecord:
+        return ResearchRecord(
+            leaf.section.section_title,
+            leaf.section.content,
+            research_data,
+            outline_context=outline_context(leaf),
+            depth=len(leaf.parents),
         )
 
-        # Извлекаем только ответы модели
-        tool_messages = [
-            msg for msg in result["messages"] if isinstance(msg, ToolMessage)
-        ]
-        research_results.append(
-            {
-                "section_title": section.section_title,
-                "description": section.content,
-                "research_data": tool_messages[-1].content if tool_messages else "",
-            }
+    for leaf, section, (key, research_data) in zip(leaves, sections, memos):
+        if research_data is not None:
+            research_results.append(record(leaf, research_data))
+            continue
+
+        outcome = next(outcomes)
+        if isinstance(outcome, BaseException):
+            if not isinstance(outcome, Exception):
+                raise outcome
+            logger.warning(
+                "Research failed for section %r: %s", section.section_title, outcome
+            )
+            messages = []
+        else:
+            messages = outcome["messages"]
+
+        # Из переписки агента нужен только последний ответ инструмента; сами сообщения
+        # дальше никто не читает, и в состояние (и чекпоинты) они не попадают
+        tool_messages = [msg for msg in messages if isinstance(msg, ToolMessage)]
+        research_data = tool_messages[-1].content if tool_messages else ""
+        research_results.append(record(leaf, research_data))
+        if tool_messages:
+            remember("research", key, research_data)
+
+    return {"research_results": research_results}
+
+
+def enhance_research(topic: str, research_results: list[ResearchRecord]) -> list[ResearchRecord]:
+    # Индекс статьи в памяти или постоянный корпус, в зависимости от retriever_backend
+    corpus = open_retriever()
+
+    try:
+        # Все фрагменты всех секций индексируются одним батчем эмбеддингов,
+        # уже известные фрагменты повторно не эмбеддятся
+        passages = [split_passages(research.research_data) for research in research_results]
+        all_passages = [passage for section_passages in passages for passage in section_passages]
+        passage_ids = corpus.add(
+            texts=all_passages,
+            metadatas=[
+                {"section": research.section_title, "topic": topic}
+                for research, section_passages in zip(research_results, passages)
+                for _ in section_passages
+            ],
         )
-        results.extend(
-            message for message in result["messages"] if isinstance(message, AIMessage)
+
+        own_ids = []
+        offset = 0
+        for section_passages in passages:
+            own_ids.append(passage_ids[offset:offset + len(section_passages)])
+            offset += len(section_passages)
+
+        # Поиск релевантной информации для всех секций одним батчем,
+        # собственные фрагменты секции в выдачу не попадают
+        # Запросы эмбеддятся один раз: те же векторы нужны и для поиска, и для MMR
+        queries = [
+            f"{topic} {research.section_title} {research.description}" for research in research_results
+        ]
+        query_embeddings = embedding_service.embed_documents(queries)
+        related = corpus.search_many(
+            queries,
+            k=RELATED_PASSAGES,
+            exclude=[set(ids) for ids in own_ids],
+            query_embeddings=query_embeddings,
         )
+        query_vectors = NumpyRetriever.normalize(query_embeddings) if queries else []
+        texts = dict(zip(passage_ids, all_passages))
+
+        enhanced_results = []
+        for research, ids, similar_passages, query_vector in zip(research_results, own_ids, related, query_vectors):
+            # Свои и связанные фрагменты без повторов, упорядоченные по MMR относительно
+            # подтемы; в промпт узла они попадают в пределах его бюджета токенов
+            texts.update((passage_id(passage), passage) for passage in similar_passages)
+            candidate_ids = list(dict.fromkeys(ids + [passage_id(passage) for passage in similar_passages]))
+            vectors = corpus.vectors(candidate_ids, [texts[candidate_id] for candidate_id in candidate_ids])
+            order = mmr(query_vector, vectors)
+
+            enhanced_results.append(
+                dataclasses.replace(
+                    research,
+                    research_data="",
+                    passages=[texts[candidate_ids[position]] for position in order],
+                )
+            )
 
-    return {**state, "research_results": research_results, "messages": results}
+        return enhanced_results
+    finally:
+        corpus.close()
 
 
 async def vector_store_node(state: ContentGenerationState):
-    # Инициализация векторного хранилища с локальной моделью эмбеддингов
-    embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-    vectorstore = Chroma(embedding_function=embeddings)
-
-    # Индексация собранных данных
-    for research in state["research_results"]:
-        if research["research_data"]:  # Проверка на пустые данные
-            vectorstore.add_texts(
-                texts=[research["research_data"]],
-                metadatas=[
-                    {"section": research["section_title"], "topic": state["topic"]}
-                ],
-            )
+    # Индексация и поиск синхронные, поэтому уходят в поток и не блокируют
+    # параллельные запуски графа; их эмбеддинги склеиваются в общие батчи
+    enhanced_results = await asyncio.to_thread(
+        enhance_research, state["topic"], state["research_results"]
+    )
 
-    # Поиск релевантной информации для каждой секции
-    enhanced_results = []
-    for research in state["research_results"]:
-        query = f"{state['topic']} {research['section_title']}"
-        similar_docs = vectorstore.similarity_search(query, k=3)
+    return {"research_results": enhanced_results}
+
+
+planning_prompt = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            "Вы - технический редактор, структурирующий информацию для статьи. "
+            "На основе собранных исследовательских данных создайте детальный план "
+            "для написания подраздела. Выделите ключевые моменты, определите "
+            "логическую последовательность изложения. Учитывайте приложенное описание "
+            "для подтемы. Нужно только ответить на поставленный вопрос, поэтому составьте план,"
+            "который будет содержать только ответ на поставленный вопрос. "
+            "Не нужно добавлять введение и заключение, здесь нужен только ответ"
+            "на тему подтемы.",
+        ),
+        (
+            "user",
+            """
+        Тема статьи: {topic}
+        Подтема: {title}
+        Описание подтемы: {description}
+        Собранные данные: {research_data}
+
+        Создайте структурированный план для написания этой подтемы.
+        """,
+        ),
+    ]
+)
+
+writing_prompt = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            """
+            Вы - {role}.
+            Ваша задача - написать раздел статьи, посвященную теме и подразделу предоставленную пользователем.
+            Редактором был составлен план для написания статьи, поэтому четко следуйте инструкциям:
+            - Четко следуйте этому плану, учитывайте описание для подтем. Они согласованы с пользователем.
+            - Объясните понятно, последовательно, с примерами и пояснениями.
+            - Учитывайте предыдущий контекст, если он добавлен, чтобы избежать повторов
+                и сделать плавные переходы между темами.
+            - Используйте подготовленные исследовательские данные.
+            - Используйте Markdown для форматирования текста
+            - Испльзуйте Mermaid для Markdown для построения схем
+            - Не нужно добавлять "Введение" и "Заключение" к подсекции - нужны только ответы на описываемые темы
+            для секций статьи.
+            - Заголовок раздела добавляется при сборке статьи - не повторяйте его. Подзаголовки внутри
+            раздела оформляйте не крупнее уровня {subheading}.
+            - Обязательно нужно добавить секцию с рекомендациями для чтения/просмотру с различными полезными рессурсами,
+            которые могут помочь расширить знания по указанной теме секции:
+                - книги
+                - сслылки на рессурсы в интернете
+                - документация
+                - качественные запросы в поисковые системы по теме
+                - и т.д.
+
+            Цель: сделать сложную тему понятной и практичной.
+            """,
+        ),
+        (
+            "user",
+            """
+                Тема статьи: {topic}
+                Подтема: {title}
+                Описание: {description}
+                Предыдущий контекст: {context}
+                План раздела: {plan}
+                Исследовательские данные: {research_data}
+
+                Напишите полный текст для этого раздела статьи.
+            """,
+        ),
+    ]
+)
 
-        # Объединение найденной информации с исходными данными
-        enhanced_data = research["research_data"]
-        if similar_docs:
-            additional_content = "\n\n".join([doc.page_content for doc in similar_docs])
-            enhanced_data += f"\n\n### Связанная информация:\n\n{additional_content}"
+role_prompt = ChatPromptTemplate.from_template(
+    """
+    На основе темы и пожеланий пользователя (если они есть) определите, кто должен быть автором текста.
 
-        enhanced_results.append(
-            {
-                "section_title": research["section_title"],
-                "description": research["description"],
-                "research_data": enhanced_data,
-            }
-        )
+    Формат ответа:
+    Должность
 
-    return {**state, "research_results": enhanced_results}
+    Пример:
+        Тема: Алгоритм быстрой сортировки
+        Пожелания: подробные объснения как работает алогоритм и примеры кода на Python.
 
+        Ответ: Python-программист, преподаватель университета.
+        ---
 
-async def planning_phase(state: ContentGenerationState):
-    planning_prompt = ChatPromptTemplate.from_messages(
-        [
-            (
-                "system",
-                "Вы - технический редактор, структурирующий информацию для статьи. "
-                "На основе собранных исследовательских данных создайте детальный план "
-                "для написания подраздела. Выделите ключевые моменты, определите "
-                "логическую последовательность изложения. Учитывайте приложенное описание "
-                "для подтемы. Нужно только ответить на поставленный вопрос, поэтому составьте план,"
-                "который будет содержать только ответ на поставленный вопрос. "
-                "Не нужно добавлять введение и заключение, здесь нужен только ответ"
-                "на тему подтемы.",
-            ),
-            (
-                "user",
-                """
-            Тема статьи: {topic}
-            Подтема: {title}
-            Описание подтемы: {description}
-            Собранные данные: {research_data}
-
-            Создайте структурированный план для написания этой подтемы.
-            """,
-            ),
+        Тема: Развитие сюрреализма в цифровом искусстве
+        Пожелания: рассказать об истории и влиянии
+
+        Ответ: Историк современного искусства.
+        ---
+
+        Тема: История США конца XVIII века
+        Пожелания: развитие сельского хозяйства в США в этот период
+
+        Ответ: Историк, преподаватель истории США
+
+    Теперь, пожалуйста, сформулируйте должность для следующей темы:
+    - Тема: {topic}
+    - Пожелания: {wishes}
+
+    нужно вернуть только должность, без дополнений и посторонних слов.
+    """
+)
+
+summary_prompt = ChatPromptTemplate.from_template(
+    """
+    Вы ведёте краткое содержание статьи «{topic}», которое пишется раздел за разделом.
+    Оно служит контекстом автору следующих разделов: что уже объяснено, какие термины
+    и примеры введены, чтобы не повторяться.
+
+    Краткое содержание написанных разделов:
+    {summary}
+
+    Новый раздел «{title}»:
+    {text}
+
+    Обновите краткое содержание с учётом нового раздела. Не более {words} слов,
+    только содержание, без вступлений.
+    """
+)
+
+writer_llm = llm.bind(temperature=0.3)
+
+
+async def plan_section(task: SectionTask):
+    # Исследовательские данные укладываются в бюджет токенов планирования и входят в ключ:
+    # план, построенный по другим (или пустым после сбоя) данным, не переиспользуется
+    research_data = context_packer.pack(
+        "plan_section", task["passages"], PLANNING_CONTEXT_TOKENS, llm.model_name
+    )
+    key, plan = recall(
+        "plan",
+        task["topic"],
+        task["section_title"],
+        task["description"],
+        node_model(llm.model_name),
+        research_data,
+    )
+    if plan is None:
+        plan = await generate_plan(task, research_data)
+        # План без исследования не запоминается: следующий запуск построит его по данным
+        if research_data:
+            remember("plan", key, plan)
+
+    return {
+        "plans": [
+            {
+                "index": task["index"],
+                "section_title": task["section_title"],
+                "plan": plan,
+            }
         ]
+    }
+
+
+async def generate_plan(task: SectionTask, research_data: str) -> str:
+    prompt = planning_prompt.format(
+        topic=task["topic"],
+        title=task["section_title"],
+        description=task["description"],
+        research_data=research_data,
     )
+    context_packer.record_prompt("plan_section", prompt, llm.model_name)
+
+    result = await llm.ainvoke(prompt)
+    return result.content
 
+
+async def planning_phase(state: ContentGenerationState):
     topic = state["topic"]
     research_results = state["research_results"]
     plans = []
 
-    for research in research_results:
-        result = await llm.ainvoke(
-            planning_prompt.format(
-                topic=topic,
-                # main_plan=sections_text,
-                title=research["section_title"],
-                description=research["description"],
-                research_data=research["research_data"],
-            ),
+    for index, research in enumerate(research_results):
+        result = await plan_section(
+            {
+                "topic": topic,
+                "index": index,
+                "section_title": research.section_title,
+                "description": research.description,
+                "passages": research.passages,
+            }
         )
+        plans.extend(result["plans"])
 
-        plans.append(
-            {"section_title": research["section_title"], "plan": result.content}
-        )
+    return {"plans": plans}
 
-    return {
-        **state,
-        "plans": plans,
-    }
+
+def dispatch_planning(state: ContentGenerationState):
+    # Map-шаг: отдельная ветка графа на планирование каждой секции
+    return [
+        Send(
+            "plan_section",
+            {
+                "topic": state["topic"],
+                "index": index,
+                "section_title": research.section_title,
+                "description": research.description,
+                "passages": research.passages,
+            },
+        )
+        for index, research in enumerate(state["research_results"])
+    ] or ["collect_plans"]
 
 
 async def role_selector_phase(state: ContentGenerationState):
     topic = state["topic"]
     wishes = state["wishes"]
 
-    prompt = ChatPromptTemplate.from_template(
-        """
-        На основе темы и пожеланий пользователя (если они есть) определите, кто должен быть автором текста.
+    # Роль входит в ключ мемоизации текста секций, поэтому тоже запоминается:
+    # иначе новая формулировка роли при повторном запуске переписала бы все секции
+    key, role = recall("role", topic, str(wishes), node_model(llm.model_name))
+    if role is None:
+        result = await llm.ainvoke(role_prompt.format(topic=topic, wishes=wishes))
+        role = result.content
+        remember("role", key, role)
+
+    return {"writer_role": role}
+
+
+async def write_section(task: SectionTask):
+    # Текст зависит и от контекста соседей: правка соседней секции меняет её план
+    # (или текст в последовательном режиме), и эта секция тоже переписывается
+    key, text = recall(
+        "write",
+        task["topic"],
+        task["section_title"],
+        task["description"],
+        task["role"],
+        node_model(llm.model_name),
+        task["context"],
+        task["plan"],
+    )
+    if text is None:
+        text = await generate_text(task)
+        remember("write", key, text)
 
-        Формат ответа:
-        Должность
+    # Готовая секция сразу уходит в поток custom, не дожидаясь остальных
+    get_stream_writer()({"section_index": task["index"], "text": text})
 
-        Пример:
-            Тема: Алгоритм быстрой сортировки
-            Пожелания: подробные объснения как работает алогоритм и примеры кода на Python.
+    return {"drafts": [{"index": task["index"], "text": text}]}
 
-            Ответ: Python-программист, преподаватель университета.
-            ---
 
-            Тема: Развитие сюрреализма в цифровом искусстве
-            Пожелания: рассказать об истории и влиянии
+async def generate_text(task: SectionTask) -> str:
+    # Номер секции в metadata позволяет потребителю потока токенов разложить их по секциям
+    section_llm = writer_llm.with_config(metadata={"section_index": task["index"]})
+    research_data = context_packer.pack(
+        "write_section", task["passages"], WRITING_CONTEXT_TOKENS, llm.model_name
+    )
+    prompt = writing_prompt.format(
+        topic=task["topic"],
+        title=task["section_title"],
+        description=task["description"],
+        context=task["context"],
+        plan=task["plan"],
+        role=task["role"],
+        research_data=research_data,
+        subheading=heading(TOP_HEADING_LEVEL + task["depth"] + 1),
+    )
+    context_packer.record_prompt("write_section", prompt, llm.model_name)
+
+    result = await section_llm.ainvoke(prompt)
+    return result.content
+
+
+async def summarize_section(topic: str, summary: str, title: str, text: str) -> str:
+    # Скользящее краткое содержание: вместо растущего текста статьи следующему разделу
+    # передаётся сводка ограниченного размера, обновляемая после каждого листа
+    key, result = recall("summary", topic, summary, title, text, node_model(llm.model_name))
+    if result is None:
+        prompt = summary_prompt.format(
+            topic=topic,
+            summary=summary or "пока ничего не написано",
+            title=title,
+            text=text,
+            # Около полутора токенов на слово русского текста
+            words=ROLLING_SUMMARY_TOKENS * 2 // 3,
+        )
+        context_packer.record_prompt("summarize_section", prompt, llm.model_name)
+        result = (await llm.ainvoke(prompt)).content
+        remember("summary", key, result)
+
+    # Модель может не уложиться в просьбу, поэтому бюджет соблюдается и здесь
+    return trim_tokens(result, ROLLING_SUMMARY_TOKENS, llm.model_name)
 
-            Ответ: Историк современного искусства.
-            ---
 
-            Тема: История США конца XVIII века
-            Пожелания: развитие сельского хозяйства в США в этот период
+async def writing_phase(state: ContentGenerationState):
+    topic = state["topic"]
+    plans = state["plans"]
+    research_results = state["research_results"]
+    role = state["writer_role"]
+    final_sections: list[str] = []
+    summary = ""
 
-            Ответ: Историк, преподаватель истории США
+    for i, plan in enumerate(plans):
+        research = research_results[i]
+        # Контекст листа ограничен при любой длине статьи: описания родительских разделов,
+        # краткое содержание написанного и конец предыдущего листа в пределах бюджетов
+        context = [research.outline_context]
+        if summary:
+            context.append(f"Краткое содержание предыдущих разделов:\n{summary}")
+        if i > 0:
+            previous = trim_tokens(final_sections[i - 1], PREVIOUS_CONTEXT_TOKENS, llm.model_name)
+            context.append(f"Конец предыдущего раздела:\n{previous}")
+
+        result = await write_section(
+            {
+                "topic": topic,
+                "index": i,
+                "section_title": plan["section_title"],
+                "description": research.description,
+                "context": "\n\n".join(part for part in context if part),
+                "plan": plan["plan"],
+                "role": role,
+                "passages": research.passages,
+                "depth": research.depth,
+            }
+        )
 
-        Теперь, пожалуйста, сформулируйте должность для следующей темы:
-        - Тема: {topic}
-        - Пожелания: {wishes}
+        text = result["drafts"][0]["text"]
+        final_sections.append(text)
+        if i + 1 < len(plans):
+            summary = await summarize_section(topic, summary, plan["section_title"], text)
 
-        нужно вернуть только должность, без дополнений и посторонних слов.
-        """
-    )
+    return {"sections": final_sections}
 
-    result = await llm.ainvoke(prompt.format(topic=topic, wishes=wishes))
 
-    return {**state, "writer_role": result.content}
+def neighbour_context(plans: list[dict], index: int) -> str:
+    # В параллельном режиме текст соседних секций ещё не написан,
+    # поэтому контекстом служат их планы
+    context = []
+    if index > 0:
+        previous = plans[index - 1]
+        context.append(
+            f"Предыдущий раздел «{previous['section_title']}», план:\n{previous['plan']}"
+        )
+    if index + 1 < len(plans):
+        following = plans[index + 1]
+        context.append(
+            f"Следующий раздел «{following['section_title']}», план:\n{following['plan']}"
+        )
 
+    return "\n\n".join(context)
 
-async def writing_phase(state: ContentGenerationState):
-    writing_prompt = ChatPromptTemplate.from_messages(
-        [
-            (
-                "system",
-                """
-                Вы - {role}.
-                Ваша задача - написать раздел статьи, посвященную теме и подразделу предоставленную пользователем.
-                Редактором был составлен план для написания статьи, поэтому четко следуйте инструкциям:
-                - Четко следуйте этому плану, учитывайте описание для подтем. Они согласованы с пользователем.
-                - Объясните понятно, последовательно, с примерами и пояснениями.
-                - Учитывайте предыдущий контекст, если он добавлен, чтобы избежать повторов
-                    и сделать плавные переходы между темами.
-                - Используйте подготовленные исследовательские данные.
-                - Используйте Markdown для форматирования текста
-                - Испльзуйте Mermaid для Markdown для построения схем
-                - Не нужно добавлять "Введение" и "Заключение" к подсекции - нужны только ответы на описываемые темы
-                для секций статьи.
-                - Обязательно нужно добавить секцию с рекомендациями для чтения/просмотру с различными полезными рессурсами,
-                которые могут помочь расширить знания по указанной теме секции:
-                    - книги
-                    - сслылки на рессурсы в интернете
-                    - документация
-                    - качественные запросы в поисковые системы по теме
-                    - и т.д.
-
-                Цель: сделать сложную тему понятной и практичной.
-                """,
-            ),
-            (
-                "user",
-                """
-                    Тема статьи: {topic}
-                    Подтема: {title}
-                    Описание: {description}
-                    Предыдущий контекст: {context}
-                    План раздела: {plan}
-                    Исследовательские данные: {research_data}
-
-                    Напишите полный текст для этого раздела статьи.
-                """,
-            ),
-        ]
-    )
 
-    topic = state["topic"]
+def dispatch_writing(state: ContentGenerationState):
+    # Map-шаг: отдельная ветка графа на написание каждого листа оглавления;
+    # контекст ветки - описания родительских разделов и планы соседей, он не растёт с длиной статьи
     plans = state["plans"]
     research_results = state["research_results"]
-    role = state["writer_role"]
-    final_sections: list[str] = []
-    llm.temperature = 0.3
 
-    for i, plan in enumerate(plans):
-        research_data = research_results[i]["research_data"]
-
-        result = await llm.ainvoke(
-            writing_prompt.format(
-                topic=topic,
-                title=plan["section_title"],
-                description=research_results[i]["description"],
-                context=final_sections[i - 1] if i > 0 else "",
-                plan=plan["plan"],
-                role=role,
-                research_data=research_data,
-            ),
+    return [
+        Send(
+            "write_section",
+            {
+                "topic": state["topic"],
+                "index": i,
+                "section_title": plan["section_title"],
+                "description": research_results[i].description,
+                "context": "\n\n".join(
+                    part for part in (research_results[i].outline_context, neighbour_context(plans, i)) if part
+                ),
+                "plan": plan["plan"],
+                "role": state["writer_role"],
+                "passages": research_results[i].passages,
+                "depth": research_results[i].depth,
+            },
         )
+        for i, plan in enumerate(plans)
+    ] or ["collect_sections"]
 
-        final_sections.append(result.content)  # type: ignore
 
-    return {**state, "sections": final_sections}
+async def collect_sections(state: ContentGenerationState):
+    # Reduce-шаг: черновики собираются в порядке секций оглавления
+    return {"sections": [draft["text"] for draft in state.get("drafts", [])]}
 
 
-graph_builder = StateGraph(ContentGenerationState)
+async def collect_plans(state: ContentGenerationState):
+    # Точка сбора веток планирования перед объединением с выбором роли
+    return {}
+
+
+async def join_writing(state: ContentGenerationState):
+    # Написание начинается, когда готовы и планы, и роль автора
+    return {}
 
-tool_node = ToolNode(tools=[wikipedia_tool, search_engine])
 
-graph_builder.add_node("tools", tool_node)
+# Граф - это DAG зависимостей: выбор роли зависит только от темы и пожеланий,
+# поэтому выполняется параллельно с исследованием и векторной базой,
+# а writing_phase ждёт завершения обеих ветвей
+graph_builder = StateGraph(ContentGenerationState)
+
 graph_builder.add_node("research_phase", research_phase)
-graph_builder.add_node("planning_phase", planning_phase)
 graph_builder.add_node("role_selector_phase", role_selector_phase)
-graph_builder.add_node("writing_phase", writing_phase)
 graph_builder.add_node("vector_store_node", vector_store_node)
 
-graph_builder.add_edge("tools", "research_phase")
 graph_builder.add_edge(START, "research_phase")
+graph_builder.add_edge(START, "role_selector_phase")
 graph_builder.add_edge("research_phase", "vector_store_node")
-graph_builder.add_edge("vector_store_node", "planning_phase")
-graph_builder.add_edge("planning_phase", "role_selector_phase")
-graph_builder.add_edge("role_selector_phase", "writing_phase")
-graph_builder.add_edge("writing_phase", END)
 
-graph_builder.add_conditional_edges("research_phase", tools_condition)
-graph_builder.add_edge("tools", "research_phase")
+if SECTION_MODE == "parallel":
+    graph_builder.add_node("plan_section", plan_section)
+    graph_builder.add_node("collect_plans", collect_plans)
+    graph_builder.add_node("writing_phase", join_writing)
+    graph_builder.add_node("write_section", write_section)
+    graph_builder.add_node("collect_sections", collect_sections)
 
-graph = graph_builder.compile()
+    graph_builder.add_conditional_edges(
+        "vector_store_node", dispatch_planning, ["plan_section", "collect_plans"]
+    )
+    graph_builder.add_edge("plan_section", "collect_plans")
+    graph_builder.add_edge(["collect_plans", "role_selector_phase"], "writing_phase")
+    graph_builder.add_conditional_edges(
+        "writing_phase", dispatch_writing, ["write_section", "collect_sections"]
+    )
+    graph_builder.add_edge("write_section", "collect_sections")
+    graph_builder.add_edge("collect_sections", END)
+else:
+    graph_builder.add_node("planning_phase", planning_phase)
+    graph_builder.add_node("writing_phase", writing_phase)
+
+    graph_builder.add_edge("vector_store_node", "planning_phase")
+    graph_builder.add_edge(["planning_phase", "role_selector_phase"], "writing_phase")
+    graph_builder.add_edge("writing_phase", END)
+
+graph = graph_builder.compile(checkpointer=checkpointer)
 
 
 if __name__ == "__main__":
-    import asyncio
 
     async def main() -> None:
 
@@ -325,13 +698,17 @@ if __name__ == "__main__":
             "topic": "Исстория Германии.",
             "wishes": "Развитие городов и городской жизни в истории Германии",
             "sections": sections,
-            "messages": [],
         }
 
-        result = await graph.ainvoke(state)
+        timings = RunMetrics(graph)
+        config = {"configurable": {"thread_id": str(uuid.uuid4())}, "callbacks": [timings]}
+        result = await graph.ainvoke(state, config)
 
         for section in result["sections"]:
             print(section)
             print()
 
+        print(timings.report())
+        print(json.dumps(timings.summary(), ensure_ascii=False, indent=2))
+
     asyncio.run(main())
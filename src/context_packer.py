@@ -0,0 +1,156 @@
+import functools
+import hashlib
+import logging
+import math
+import os
+import tempfile
+import threading
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from settings import CONTEXT_MMR_DIVERSITY, CONTEXT_NEAR_DUPLICATE, TOKENIZER_DOWNLOAD
+
+logger = logging.getLogger(__name__)
+
+# Откуда tiktoken скачивает словари: по адресу вычисляется имя файла в его кеше
+TIKTOKEN_FILES = {
+    "o200k_base": "https://openaipublic.blob.core.windows.net/encodings/o200k_base.tiktoken",
+    "cl100k_base": "https://openaipublic.blob.core.windows.net/encodings/cl100k_base.tiktoken",
+}
+
+
+def tiktoken_cached(name: str) -> bool:
+    # Тот же путь, что у tiktoken.load.read_file_cached; пустой каталог отключает кеш
+    cache_dir = os.getenv("TIKTOKEN_CACHE_DIR", os.getenv("DATA_GYM_CACHE_DIR"))
+    if cache_dir is None:
+        cache_dir = os.path.join(tempfile.gettempdir(), "data-gym-cache")
+    if not cache_dir or name not in TIKTOKEN_FILES:
+        return False
+    return os.path.exists(os.path.join(cache_dir, hashlib.sha1(TIKTOKEN_FILES[name].encode()).hexdigest()))
+
+
+@functools.cache
+def encoding(model: str):
+    # tiktoken скачивает словарь при первом использовании и без сети ждёт таймаута
+    # на каждом процессе, поэтому словарь берётся только из локального кеша
+    # (tokenizer_download = true разрешает скачать); иначе длина текста оценивается
+    import tiktoken
+
+    try:
+        name = tiktoken.encoding_name_for_model(model)
+    except KeyError:
+        # Модель, неизвестная tiktoken (локальные бэкенды), считается словарём gpt-4o
+        name = "o200k_base"
+    if not TOKENIZER_DOWNLOAD and not tiktoken_cached(name):
+        logger.info("Tokenizer %s for %s is not cached, token counts are estimated", name, model)
+        return None
+
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as error:
+        logger.warning("Tokenizer for %s is unavailable, token counts are estimated: %s", model, error)
+        return None
+
+
+def count_tokens(text: str, model: str) -> int:
+    tokenizer = encoding(model)
+    if tokenizer is None:
+        # Около трёх символов на токен для смеси русского текста и кода
+        return math.ceil(len(text) / 3)
+    return len(tokenizer.encode(text, disallowed_special=()))
+
+
+def trim_tokens(text: str, budget: int, model: str) -> str:
+    # Оставляет конец текста: для контекста предыдущей секции важнее всего переход к следующей
+    if count_tokens(text, model) <= budget:
+        return text
+    tokenizer = encoding(model)
+    if tokenizer is None:
+        return text[-budget * 3:]
+    return tokenizer.decode(tokenizer.encode(text, disallowed_special=())[-budget:])
+
+
+def mmr(
+    query: np.ndarray,
+    vectors: np.ndarray,
+    diversity: float = CONTEXT_MMR_DIVERSITY,
+    near_duplicate: float = CONTEXT_NEAR_DUPLICATE,
+) -> list[int]:
+    # Maximal Marginal Relevance по нормированным векторам: на каждом шаге берётся фрагмент,
+    # близкий к запросу и непохожий на уже выбранные. Почти дубликаты выбранных отбрасываются.
+    if not len(vectors):
+        return []
+
+    relevance = vectors @ query
+    similarity = vectors @ vectors.T
+    remaining = np.ones(len(vectors), dtype=bool)
+    redundancy = np.zeros(len(vectors), dtype=np.float32)
+    order: list[int] = []
+
+    while remaining.any():
+        scores = (1 - diversity) * relevance - diversity * redundancy
+        scores[~remaining] = -np.inf
+        best = int(np.argmax(scores))
+        order.append(best)
+        remaining[best] = False
+        remaining &= similarity[best] < near_duplicate
+        redundancy = np.maximum(redundancy, similarity[best])
+
+    return order
+
+
+class ContextPacker:
+    # Упаковка исследовательских фрагментов в бюджет токенов узла: фрагменты уже упорядочены
+    # по MMR в vector_store_node, здесь они берутся по порядку, пока помещаются в бюджет.
+    # Для каждого узла копится статистика: сколько токенов было и сколько ушло в промпт.
+    def __init__(self) -> None:
+        self.stats: dict[str, Counter] = defaultdict(Counter)
+        self._lock = threading.Lock()
+
+    def pack(self, node: str, passages: list[str], budget: int, model: str) -> str:
+        selected = []
+        used = 0
+        available = 0
+        for passage in passages:
+            tokens = count_tokens(passage, model)
+            available += tokens
+            if used + tokens <= budget:
+                selected.append(passage)
+                used += tokens
+
+        with self._lock:
+            stats = self.stats[node]
+            stats["calls"] += 1
+            stats["passages"] += len(passages)
+            stats["selected"] += len(selected)
+            stats["available_tokens"] += available
+            stats["packed_tokens"] += used
+
+        logger.info(
+            "%s: research context %d of %d tokens (%d of %d passages)",
+            node, used, available, len(selected), len(passages),
+        )
+        return "\n\n".join(selected)
+
+    def record_prompt(self, node: str, prompt: str, model: str) -> int:
+        tokens = count_tokens(prompt, model)
+        with self._lock:
+            self.stats[node]["prompts"] += 1
+            self.stats[node]["prompt_tokens"] += tokens
+        logger.info("%s: prompt %d tokens", node, tokens)
+        return tokens
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                node: {
+                    **stats,
+                    "saved_tokens": stats["available_tokens"] - stats["packed_tokens"],
+                    "avg_prompt_tokens": stats["prompt_tokens"] / max(stats["prompts"], 1),
+                }
+                for node, stats in self.stats.items()
+            }
+
+
+context_packer = ContextPacker()
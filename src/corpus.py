@@ -0,0 +1,219 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+import chromadb
+import click
+import numpy as np
+from langchain_community.vectorstores import Chroma
+
+from embeddings import embedding_service
+from retrievers import NumpyRetriever, PassageRetriever
+from retrievers import passage_id as make_passage_id
+from settings import (
+    RESEARCH_CORPUS_DIR,
+    RESEARCH_CORPUS_MAX_AGE_DAYS,
+    RESEARCH_CORPUS_MAX_DOCUMENTS,
+)
+
+
+class ResearchCorpus(PassageRetriever):
+    # Хранилище исследовательских фрагментов с дедупликацией по хешу содержимого:
+    # одинаковый фрагмент эмбеддится один раз, даже если его нашли разные статьи.
+    # Без directory хранилище живёт в памяти только для одной статьи.
+    def __init__(
+        self,
+        directory: str | None = None,
+        max_documents: int = RESEARCH_CORPUS_MAX_DOCUMENTS,
+        max_age_days: float = RESEARCH_CORPUS_MAX_AGE_DAYS,
+    ) -> None:
+        self.directory = directory
+        self.max_documents = max_documents
+        self.max_age_days = max_age_days
+        # Эфемерные клиенты Chroma в одном процессе разделяют коллекции,
+        # поэтому у временного хранилища статьи своё уникальное имя коллекции
+        name = "research" if directory else f"article-{uuid.uuid4().hex}"
+        client = chromadb.PersistentClient(path=directory) if directory else chromadb.EphemeralClient()
+        self.store = Chroma(collection_name=name, embedding_function=embedding_service, client=client)
+        # Того, чего нет в обёртке LangChain (число записей, обновление метаданных, поиск
+        # по нескольким векторам одним запросом), коллекция даёт через публичный API chromadb
+        self.collection = client.get_collection(name, embedding_function=None)
+        self._lock = threading.Lock()
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def add(self, texts: list[str], metadatas: list[dict]) -> list[str]:
+        ids: list[str] = []
+        unique: dict[str, tuple[str, dict]] = {}
+        for text, metadata in zip(texts, metadatas):
+            passage_id = make_passage_id(text)
+            ids.append(passage_id)
+            unique.setdefault(passage_id, (text, metadata))
+
+        if not unique:
+            return ids
+
+        with self._lock:
+            # added_at - время последнего использования фрагмента: повторно найденные
+            # фрагменты освежаются, чтобы вытеснение не удалило то, что статья только что взяла
+            now = time.time()
+            existing = self.store.get(ids=list(unique), include=["metadatas"])
+            if existing["ids"]:
+                self.collection.update(
+                    ids=existing["ids"],
+                    metadatas=[{**(metadata or {}), "added_at": now} for metadata in existing["metadatas"]],
+                )
+            new_ids = [passage_id for passage_id in unique if passage_id not in set(existing["ids"])]
+
+            if new_ids:
+                self.store.add_texts(
+                    texts=[unique[passage_id][0] for passage_id in new_ids],
+                    metadatas=[{**unique[passage_id][1], "added_at": now} for passage_id in new_ids],
+                    ids=new_ids,
+                )
+                # Корпус чистится там же, где растёт, а не только командой compact
+                self.evict_expired()
+                self.evict_overflow(keep=set(unique))
+
+        embedding_service.record_passages(embedded=len(new_ids), reused=len(unique) - len(new_ids))
+
+        return ids
+
+    def search_many(
+        self,
+        queries: list[str],
+        k: int,
+        exclude: list[set[str]] | None = None,
+        query_embeddings: list[list[float]] | None = None,
+    ) -> list[list[str]]:
+        # Все запросы эмбеддятся одним батчем и ищутся одним обращением к коллекции
+        exclude = exclude or [set() for _ in queries]
+        count = self.count()
+        if not queries or not count:
+            return [[] for _ in queries]
+
+        if query_embeddings is None:
+            query_embeddings = embedding_service.embed_documents(queries)
+        n_results = min(count, k + max(len(ids) for ids in exclude))
+        found = self.collection.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            include=["documents"],
+        )
+
+        return [
+            [document for passage_id, document in zip(ids, documents) if passage_id not in excluded][:k]
+            for ids, documents, excluded in zip(found["ids"], found["documents"], exclude)
+        ]
+
+    def vectors(self, ids: list[str], texts: list[str] | None = None) -> np.ndarray:
+        if not ids:
+            return np.zeros((0, 0), dtype=np.float32)
+        found = self.store.get(ids=list(set(ids)), include=["embeddings"])
+        by_id = dict(zip(found["ids"], found["embeddings"]))
+
+        # Фрагменты мог вытеснить параллельный запуск: их эмбеддинги считаются заново по текстам
+        missing = [position for position, passage_id in enumerate(ids) if passage_id not in by_id]
+        if missing and texts is None:
+            raise KeyError(f"В корпусе нет {len(missing)} фрагментов, а их тексты не переданы")
+        if missing:
+            vectors = embedding_service.embed_documents([texts[position] for position in missing])
+            by_id.update((ids[position], vector) for position, vector in zip(missing, vectors))
+
+        return NumpyRetriever.normalize([by_id[passage_id] for passage_id in ids])
+
+    def evict_expired(self) -> int:
+        cutoff = time.time() - self.max_age_days * 24 * 60 * 60
+        expired = self.store.get(where={"added_at": {"$lt": cutoff}}, include=[])["ids"]
+        if expired:
+            self.store.delete(ids=expired)
+        return len(expired)
+
+    def evict_overflow(self, keep: set[str] | None = None) -> int:
+        count = self.count()
+        if count <= self.max_documents:
+            return 0
+
+        # Удаляем с запасом до 90% лимита, чтобы не пересортировывать корпус на каждой вставке.
+        # Фрагменты из keep (их только что добавила или взяла статья) не вытесняются
+        keep = keep or set()
+        documents = self.store.get(include=["metadatas"])
+        by_age = sorted(
+            (
+                (passage_id, metadata)
+                for passage_id, metadata in zip(documents["ids"], documents["metadatas"])
+                if passage_id not in keep
+            ),
+            key=lambda item: (item[1] or {}).get("added_at", 0),
+        )
+        evicted = [passage_id for passage_id, _ in by_age[:count - int(self.max_documents * 0.9)]]
+        if evicted:
+            self.store.delete(ids=evicted)
+        return len(evicted)
+
+    def compact(self) -> dict:
+        with self._lock:
+            expired = self.evict_expired()
+            overflow = self.evict_overflow()
+
+        # Chroma хранит данные в SQLite: VACUUM возвращает место после удалений
+        database = os.path.join(self.directory, "chroma.sqlite3") if self.directory else None
+        if database and os.path.exists(database):
+            with sqlite3.connect(database) as connection:
+                connection.execute("VACUUM")
+
+        return {"expired": expired, "overflow": overflow, "documents": self.count()}
+
+    def close(self) -> None:
+        if not self.directory:
+            self.store.delete_collection()
+
+
+_shared_corpus: ResearchCorpus | None = None
+_shared_lock = threading.Lock()
+
+
+def open_corpus() -> ResearchCorpus:
+    # Постоянный корпус один на процесс, временный - свой для каждой статьи
+    global _shared_corpus
+
+    if not RESEARCH_CORPUS_DIR:
+        return ResearchCorpus()
+
+    with _shared_lock:
+        if _shared_corpus is None:
+            _shared_corpus = ResearchCorpus(RESEARCH_CORPUS_DIR)
+    return _shared_corpus
+
+
+@click.group()
+def cli():
+    pass
+
+
+@cli.command()
+@click.option("--directory", default=RESEARCH_CORPUS_DIR, required=True, help="Каталог корпуса")
+@click.option("--max-documents", default=RESEARCH_CORPUS_MAX_DOCUMENTS, show_default=True)
+@click.option("--max-age-days", default=RESEARCH_CORPUS_MAX_AGE_DAYS, show_default=True)
+def compact(directory: str, max_documents: int, max_age_days: float):
+    """Удалить устаревшие и лишние фрагменты и сжать файл базы."""
+    corpus = ResearchCorpus(directory, max_documents=max_documents, max_age_days=max_age_days)
+    result = corpus.compact()
+    click.echo(
+        f"Удалено устаревших: {result['expired']}, сверх лимита: {result['overflow']}, "
+        f"осталось фрагментов: {result['documents']}"
+    )
+
+
+@cli.command()
+@click.option("--directory", default=RESEARCH_CORPUS_DIR, required=True, help="Каталог корпуса")
+def stats(directory: str):
+    """Показать число фрагментов в корпусе."""
+    click.echo(f"Фрагментов в корпусе: {ResearchCorpus(directory).count()}")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,140 @@
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from langchain_community.embeddings import HuggingFaceEmbeddings
+from langchain_core.embeddings import Embeddings
+
+from settings import (
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_BATCH_WINDOW_MS,
+    EMBEDDING_MODEL,
+)
+
+
+class EmbeddingService(Embeddings):
+    # Общий на процесс сервис эмбеддингов: модель загружается один раз при первом
+    # обращении, а запросы от параллельных запусков графа склеиваются в общие батчи
+    def __init__(
+        self,
+        model_name: str,
+        max_batch_size: int = EMBEDDING_BATCH_SIZE,
+        batch_window: float = EMBEDDING_BATCH_WINDOW_MS / 1000,
+    ) -> None:
+        self.model_name = model_name
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+
+        self._model: Embeddings | None = None
+        self._load_lock = threading.Lock()
+        self._queue: queue.Queue[tuple[list[str], Future]] = queue.Queue()
+        self._worker: threading.Thread | None = None
+        self._worker_lock = threading.Lock()
+
+        self.load_seconds: float | None = None
+        self.batches = 0
+        self.texts = 0
+        self.max_observed_batch = 0
+        # Фрагменты исследований, которые хранилища проиндексировали заново или взяли готовыми
+        self.passages_embedded = 0
+        self.passages_reused = 0
+        self._passages_lock = threading.Lock()
+
+    @property
+    def model(self) -> Embeddings:
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    started = time.perf_counter()
+                    self._model = HuggingFaceEmbeddings(model_name=self.model_name)
+                    self.load_seconds = time.perf_counter() - started
+        return self._model
+
+    def warm_up(self, background: bool = False) -> None:
+        if background:
+            threading.Thread(target=lambda: self.model, name="embeddings-warmup", daemon=True).start()
+        else:
+            self.model
+
+    def submit(self, texts: list[str]) -> Future:
+        future: Future = Future()
+        if not texts:
+            future.set_result([])
+            return future
+
+        with self._worker_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="embeddings-batcher", daemon=True)
+                self._worker.start()
+
+        self._queue.put((list(texts), future))
+        return future
+
+    def _run(self) -> None:
+        while True:
+            pending = [self._queue.get()]
+            size = len(pending[0][0])
+            deadline = time.monotonic() + self.batch_window
+
+            # Ждём попутные запросы, пока не истечёт окно или не наберётся батч
+            while size < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                pending.append(item)
+                size += len(item[0])
+
+            texts = [text for item_texts, _ in pending for text in item_texts]
+            try:
+                vectors = self.model.embed_documents(texts)
+            except Exception as error:
+                for _, future in pending:
+                    future.set_exception(error)
+                continue
+
+            self.batches += 1
+            self.texts += len(texts)
+            self.max_observed_batch = max(self.max_observed_batch, len(texts))
+
+            offset = 0
+            for item_texts, future in pending:
+                future.set_result(vectors[offset:offset + len(item_texts)])
+                offset += len(item_texts)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.submit(texts).result()
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return await asyncio.wrap_future(self.submit(texts))
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return (await self.aembed_documents([text]))[0]
+
+    def record_passages(self, embedded: int, reused: int) -> None:
+        with self._passages_lock:
+            self.passages_embedded += embedded
+            self.passages_reused += reused
+
+    def metrics(self) -> dict:
+        return {
+            "model": self.model_name,
+            "load_seconds": self.load_seconds,
+            "batches": self.batches,
+            "texts": self.texts,
+            "mean_batch_size": self.texts / self.batches if self.batches else 0,
+            "max_batch_size": self.max_observed_batch,
+            "passages_embedded": self.passages_embedded,
+            "passages_reused": self.passages_reused,
+        }
+
+
+embedding_service = EmbeddingService(EMBEDDING_MODEL)
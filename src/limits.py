@@ -0,0 +1,21 @@
+import asyncio
+import weakref
+
+from settings import RESEARCH_CONCURRENCY, TOOL_CONCURRENCY
+
+# Общее на процесс ограничение: сколько запросов к инструментам поиска может выполняться
+# одновременно, сколько бы статей ни генерировалось параллельно (запросы к моделям
+# распределяет scheduler.llm_scheduler)
+tool_slots = asyncio.Semaphore(TOOL_CONCURRENCY)
+
+# Ограничение на статью: сколько её секций исследуется одновременно. research_phase и фоновое
+# исследование во время правки оглавления (speculation) берут слоты из одного семафора потока
+# статьи. Семафор живёт, пока его держат исследования, и не копится для завершённых статей
+_research_slots: weakref.WeakValueDictionary[str, asyncio.Semaphore] = weakref.WeakValueDictionary()
+
+
+def research_slots(scope: str) -> asyncio.Semaphore:
+    semaphore = _research_slots.get(scope)
+    if semaphore is None:
+        semaphore = _research_slots[scope] = asyncio.Semaphore(RESEARCH_CONCURRENCY)
+    return semaphore
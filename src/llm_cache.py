@@ -0,0 +1,82 @@
+import hashlib
+from collections import Counter
+from typing import Any, Optional
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+from langchain_core.runnables.config import var_child_runnable_config
+from pydantic import BaseModel
+
+from settings import LLM_CACHE_MAX_MB, LLM_CACHE_PATH
+from sqlite_store import SQLiteStore
+
+
+def current_node() -> str:
+    # Узел графа, из которого сделан вызов модели (LangGraph кладёт его в metadata конфига)
+    config = var_child_runnable_config.get() or {}
+    return config.get("metadata", {}).get("langgraph_node", "unknown")
+
+
+def serializable(generations: RETURN_VAL_TYPE) -> RETURN_VAL_TYPE:
+    # Структурированный вывод кладёт в сообщение pydantic-объект "parsed", который
+    # не сериализуется; его сохраняем словарём - парсер ChatOpenAI примет и его
+    result = []
+    for generation in generations:
+        message = getattr(generation, "message", None)
+        parsed = message.additional_kwargs.get("parsed") if message is not None else None
+        if isinstance(parsed, BaseModel):
+            message = message.model_copy(
+                update={"additional_kwargs": {**message.additional_kwargs, "parsed": parsed.model_dump()}}
+            )
+            generation = generation.model_copy(update={"message": message})
+        result.append(generation)
+    return result
+
+
+class SQLiteLLMCache(BaseCache):
+    # Постоянный кеш ответов моделей. Ключ - модель с параметрами вызова (llm_string,
+    # включая привязанные tools/response_format структурированного вывода) и отрендеренный промпт.
+    # При превышении max_bytes вытесняются давно не использованные ответы.
+    def __init__(self, path: str, max_bytes: int) -> None:
+        self.hits: Counter[str] = Counter()
+        self.misses: Counter[str] = Counter()
+        self._store = SQLiteStore(path, "llm_responses", max_bytes=max_bytes)
+
+    @staticmethod
+    def key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode()).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        value = self._store.get("", self.key(prompt, llm_string))
+        if value is None:
+            self.misses[current_node()] += 1
+            return None
+
+        self.hits[current_node()] += 1
+        generations = loads(value)
+        for generation in generations:
+            # Пометка для RunMetrics: ответ взят из кеша, его токены не оплачивались
+            if (message := getattr(generation, "message", None)) is not None:
+                message.response_metadata["cache_hit"] = True
+        return generations
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        self._store.put("", self.key(prompt, llm_string), dumps(serializable(return_val)))
+
+    def clear(self, **kwargs: Any) -> None:
+        self._store.clear()
+
+    def metrics(self) -> dict:
+        nodes = sorted(set(self.hits) | set(self.misses))
+        return {
+            node: {
+                "hits": self.hits[node],
+                "misses": self.misses[node],
+                "hit_rate": self.hits[node] / (self.hits[node] + self.misses[node]),
+            }
+            for node in nodes
+        }
+
+
+# Кеш включается только явно, заданием пути llm_cache_path
+llm_cache = SQLiteLLMCache(LLM_CACHE_PATH, LLM_CACHE_MAX_MB * 1024 * 1024) if LLM_CACHE_PATH else None
@@ -4,29 +4,102 @@ from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
 from pydantic import SecretStr
 
+from backends import llm_pool, node_model
+from context_packer import count_tokens
+from llm_cache import llm_cache
+from scheduler import llm_scheduler
+from settings import LLM_EXPECTED_COMPLETION_TOKENS
+
 load_dotenv()
 
-# llm = ChatOpenAI(
-#     base_url="http://localhost:11434/v1",
-#     api_key=SecretStr("ollama"),
-#     model="mistral-nemo",
-#     temperature=0,
-# )
 
-# think_llm = ChatOpenAI(
-#     base_url="http://localhost:11434/v1",
-#     api_key=SecretStr("ollama"),
-#     model="gemma3:12b",
-# )
+class ScheduledChatOpenAI(ChatOpenAI):
+    # Каждый запрос к API проходит через общий планировщик llm_scheduler (приоритет узла,
+    # лимиты RPM/TPM, адаптивный параллелизм, повторы с задержкой) и уходит на наименее
+    # загруженный бэкенд пула llm_pool; при сбое бэкенда запрос сразу переотправляется на другой.
+    # Свои повторы клиента отключены через max_retries=0. Ответы из кеша сюда не доходят.
+    def _estimate_tokens(self, messages) -> int:
+        prompt = count_tokens("".join(str(message.content) for message in messages), self.model_name)
+        return prompt + (self.max_tokens or LLM_EXPECTED_COMPLETION_TOKENS)
+
+    def _get_llm_string(self, stop=None, **kwargs) -> str:
+        # Ответы модели, закреплённой за узлом, кешируются отдельно от ответов модели по умолчанию
+        llm_string = super()._get_llm_string(stop=stop, **kwargs)
+        model = node_model(self.model_name)
+        return llm_string if model == self.model_name else f"{llm_string}---model:{model}"
+
+    def _get_ls_params(self, stop=None, **kwargs):
+        # Телеметрия (RunMetrics) видит модель, которая действительно ответила узлу
+        params = super()._get_ls_params(stop=stop, **kwargs)
+        params["ls_model_name"] = node_model(self.model_name)
+        return params
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        model = node_model(self.model_name)
+        estimated = self._estimate_tokens(messages)
+        attempt = 0
+        tried: set[str] = set()
+        while True:
+            try:
+                async with llm_scheduler.slot(estimated), llm_pool.using(model, tried) as backend:
+                    client = backend.client(self, model)
+                    result = await client._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            except Exception as error:
+                if llm_pool.can_fail_over(model, error, tried):
+                    continue
+                await llm_scheduler.retrying(attempt, error)
+                attempt += 1
+                tried.clear()
+                continue
+
+            usage = (result.llm_output or {}).get("token_usage") or {}
+            llm_scheduler.settle(estimated, usage.get("total_tokens") or estimated)
+            return result
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        model = node_model(self.model_name)
+        estimated = self._estimate_tokens(messages)
+        attempt = 0
+        tried: set[str] = set()
+        while True:
+            streamed = False
+            try:
+                async with llm_scheduler.slot(estimated), llm_pool.using(model, tried) as backend:
+                    client = backend.client(self, model)
+                    async for chunk in client._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                        streamed = True
+                        if usage := chunk.message.usage_metadata:
+                            llm_scheduler.settle(estimated, usage["total_tokens"])
+                        yield chunk
+                return
+            except Exception as error:
+                # Оборванный посреди ответа поток не повторяем - токены уже ушли потребителю
+                if streamed:
+                    raise
+                if llm_pool.can_fail_over(model, error, tried):
+                    continue
+                await llm_scheduler.retrying(attempt, error)
+                attempt += 1
+                tried.clear()
+
 
+# Локальные модели (Ollama, vLLM) и несколько серверов подключаются через пул бэкендов:
+# настройки llm_backends и llm_node_models
 
-llm = ChatOpenAI(
+llm = ScheduledChatOpenAI(
     api_key=SecretStr(os.getenv("openai_key", "")),
     model="gpt-4o-mini",
+    cache=llm_cache,
+    max_retries=0,
+    # Расход токенов приходит и в потоковых ответах - его считает RunMetrics
+    stream_usage=True,
     # max_completion_tokens=16350,
 )
 
-think_llm = ChatOpenAI(
+think_llm = ScheduledChatOpenAI(
     api_key=SecretStr(os.getenv("openai_key", "")),
     model="o3-mini",  # max_completion_tokens=16350
+    cache=llm_cache,
+    max_retries=0,
+    stream_usage=True,
 )
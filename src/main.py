@@ -1,28 +1,181 @@
 import asyncio
+import functools
+import importlib
+import json
 import os
+import threading
+import uuid
 
-from langgraph.graph import END, START, StateGraph
+from article_stream import ArticleStream
+from settings import EMBEDDING_WARMUP
 
-from article_assembler import assemble_article
-from content_generator import graph as outline_generator
-from states import ArticleState
-from topic_structure import sections_generator
+# Модули с тяжёлыми зависимостями (langchain_openai, langgraph.prebuilt, text splitters, chromadb)
+# импортируются не при старте, а в фоне, пока пользователь вводит тему
+HEAVY_MODULES = ("content_generator", "topic_structure", "article_assembler", "checkpoints", "llm_cache")
 
-graph_builder = StateGraph(ArticleState)
-graph_builder.add_node("sections_generator", sections_generator)
-graph_builder.add_node("outline_generator", outline_generator)
-graph_builder.add_node("assemble_article", assemble_article)
 
-graph_builder.add_edge(START, "sections_generator")
-graph_builder.add_edge("sections_generator", "outline_generator")
-graph_builder.add_edge("outline_generator", "assemble_article")
+@functools.cache
+def get_graph():
+    from langgraph.graph import END, START, StateGraph
 
-graph_builder.add_edge("assemble_article", END)
+    from article_assembler import assemble_article
+    from checkpoints import checkpointer
+    from content_generator import graph as outline_generator
+    from states import ArticleState
+    from topic_structure import sections_generator
 
-graph = graph_builder.compile()
+    graph_builder = StateGraph(ArticleState)
+    graph_builder.add_node("sections_generator", sections_generator)
+    graph_builder.add_node("outline_generator", outline_generator)
+    graph_builder.add_node("assemble_article", assemble_article)
+
+    graph_builder.add_edge(START, "sections_generator")
+    graph_builder.add_edge("sections_generator", "outline_generator")
+    graph_builder.add_edge("outline_generator", "assemble_article")
+
+    graph_builder.add_edge("assemble_article", END)
+
+    return graph_builder.compile(checkpointer=checkpointer)
+
+
+def __getattr__(name: str):
+    # main.graph собирается при первом обращении (from main import graph в batch.py и resume.py)
+    if name == "graph":
+        return get_graph()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def warm_up() -> None:
+    # Повторный import в основном потоке дождётся окончания фонового под блокировкой импорта
+    for module in HEAVY_MODULES:
+        importlib.import_module(module)
+
+    if EMBEDDING_WARMUP:
+        # Модель эмбеддингов грузится, пока пользователь вводит тему и правит оглавление
+        from embeddings import embedding_service
+
+        embedding_service.warm_up(background=True)
+
+
+def outline_headings(outline: list | None) -> list[str]:
+    # Заголовки разделов перед текстом каждого листа оглавления, как в assemble_article
+    from models import Section, outline_leaves
+
+    return [leaf.heading for leaf in outline_leaves([Section.model_validate(section) for section in outline or []])]
+
+
+async def generate_article(graph_input: dict | None, config: dict, topic: str) -> dict:
+    # graph_input = None продолжает поток config с последнего завершённого узла
+    from backends import llm_pool
+    from context_packer import context_packer
+    from embeddings import embedding_service
+    from llm_cache import llm_cache
+    from metrics import RunMetrics
+    from section_cache import section_cache
+    from speculation import research_speculator
+
+    graph = get_graph()
+    run_metrics = RunMetrics(graph)
+    config = {**config, "callbacks": [run_metrics]}
+    snapshot = await graph.aget_state(config)
+    # При продолжении после согласования оглавления статья выводится сразу
+    stream = (
+        ArticleStream(topic, f"outputs/{topic}.md", headings=outline_headings(snapshot.values.get("outline")))
+        if snapshot.values.get("sections")
+        else None
+    )
+    result: dict = {}
+
+    async for namespace, mode, chunk in graph.astream(
+        graph_input,
+        config,
+        stream_mode=["updates", "messages", "custom", "values"],
+        subgraphs=True,
+    ):
+        if mode == "updates" and not namespace and "sections_generator" in chunk:
+            # Оглавление согласовано - дальше статья выводится по мере написания
+            os.system("clear")
+            stream = ArticleStream(
+                topic, f"outputs/{topic}.md", headings=outline_headings(chunk["sections_generator"]["outline"])
+            )
+        elif mode == "messages" and stream is not None:
+            message, metadata = chunk
+            if "section_index" in metadata:
+                stream.on_token(metadata["section_index"], message.content)
+        elif mode == "custom" and stream is not None and "section_index" in chunk:
+            stream.on_section(chunk["section_index"], chunk["text"])
+        elif mode == "values" and not namespace:
+            result = chunk
+
+    if stream is None:
+        stream = ArticleStream(topic, f"outputs/{topic}.md")
+    stream.finish(result["article"])
+
+    metrics = stream.metrics()
+    print(
+        f"\nВремя до первого токена: {metrics['time_to_first_token'] or 0:.1f} c, "
+        f"до первой секции: {metrics['time_to_first_section'] or 0:.1f} c, "
+        f"всего: {metrics['total']:.1f} c"
+    )
+
+    summary = run_metrics.summary()
+    with open(f"outputs/{topic}.metrics.json", "w") as file:
+        json.dump(summary, file, ensure_ascii=False, indent=2)
+    total = summary["llm_total"]
+    print(
+        f"Вызовов моделей: {total.get('calls', 0)} (из кеша {total.get('cache_hits', 0)}), "
+        f"токенов: {total.get('prompt_tokens', 0)} в промптах, {total.get('completion_tokens', 0)} в ответах; "
+        f"телеметрия: outputs/{topic}.metrics.json"
+    )
+
+    if llm_cache is not None:
+        print("\nКеш ответов моделей по узлам:")
+        for node, stats in llm_cache.metrics().items():
+            print(f"  {node}: {stats['hits']} попаданий, {stats['misses']} промахов ({stats['hit_rate']:.0%})")
+
+    if section_cache is not None and section_cache.metrics():
+        print("\nПовторно использовано из прошлых запусков:")
+        for stage, stats in section_cache.metrics().items():
+            print(f"  {stage}: {stats['hits']} из {stats['hits'] + stats['misses']} секций")
+
+    if len(llm_pool.backends) > 1:
+        print("\nБэкенды моделей:")
+        for name, stats in llm_pool.metrics().items():
+            print(f"  {name}: {stats.get('requests', 0)} запросов, {stats.get('errors', 0)} ошибок")
+
+    if speculation := research_speculator.metrics():
+        print(
+            f"\nИсследование во время правки оглавления: начато {speculation.get('started', 0)}, "
+            f"пригодилось {speculation.get('reused', 0)}, отменено {speculation.get('cancelled', 0)}"
+        )
+
+    embeddings = embedding_service.metrics()
+    if embeddings["batches"]:
+        load = f", модель загружена за {embeddings['load_seconds']:.1f} c" if embeddings["load_seconds"] else ""
+        print(
+            f"\nЭмбеддинги: {embeddings['texts']} текстов в {embeddings['batches']} батчах "
+            f"(в среднем {embeddings['mean_batch_size']:.1f}, максимум {embeddings['max_batch_size']}){load}; "
+            f"фрагментов проиндексировано {embeddings['passages_embedded']}, "
+            f"взято готовыми {embeddings['passages_reused']}"
+        )
+
+    print("\nКонтекст промптов по узлам:")
+    for node, stats in context_packer.metrics().items():
+        line = f"  {node}: в среднем {stats['avg_prompt_tokens']:.0f} токенов на промпт"
+        if stats.get("calls"):
+            # Узлы без исследовательских данных в промпте (краткое содержание) их не упаковывают
+            line += (
+                f", исследование {stats['packed_tokens']} из {stats['available_tokens']} токенов "
+                f"(сэкономлено {stats['saved_tokens']})"
+            )
+        print(line)
+
+    return result
 
 
 async def main():
+    threading.Thread(target=warm_up, daemon=True).start()
+
     os.makedirs("outputs", exist_ok=True)
     topic = await asyncio.get_event_loop().run_in_executor(
         None, input, ">>> Тема для статьи: "
@@ -31,13 +184,15 @@ async def main():
         None, input, ">>> Пожелания к статье: "
     )
 
-    result = await graph.ainvoke({"topic": topic, "wishes": wishes})
+    thread_id = str(uuid.uuid4())
+    print(f"Идентификатор запуска: {thread_id} (продолжить после сбоя: python resume.py {thread_id})")
 
-    with open(f"outputs/{topic}.md", "w") as file:
-        file.write(result["article"])
-
-    os.system("clear")
-    print(result["article"])
+    await generate_article(
+        {"topic": topic, "wishes": wishes},
+        {"configurable": {"thread_id": thread_id}},
+        topic,
+    )
 
 
-asyncio.run(main())
+if __name__ == "__main__":
+    asyncio.run(main())
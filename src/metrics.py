@@ -0,0 +1,282 @@
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langgraph.graph import END, START
+
+
+def node_path(metadata: dict, name: str = "") -> str:
+    # Путь узла с учётом вложенных графов: "outline_generator/research_phase"
+    namespace = metadata.get("langgraph_checkpoint_ns", "")
+    # Числовые сегменты - номера параллельных вызовов подграфа внутри узла, в пути они не нужны
+    path = [part.split(":")[0] for part in namespace.split("|") if part and not part.split(":")[0].isdigit()]
+    return "/".join(path or [name or metadata.get("langgraph_node", "unknown")])
+
+
+@dataclass
+class NodeSpan:
+    node: str
+    start: float
+    end: float | None = None
+
+    @property
+    def duration(self) -> float:
+        return (self.end or self.start) - self.start
+
+
+class NodeTimingHandler(BaseCallbackHandler):
+    # Замеряет время выполнения узлов графа и строит отчёт по критическому пути.
+    # Узлы вложенных графов записываются с префиксом родительского узла: "outer/inner".
+    run_inline = True
+
+    def __init__(self, graph) -> None:
+        drawable = graph.get_graph()
+        self.nodes = set(drawable.nodes)
+        self.edges = [(edge.source, edge.target) for edge in drawable.edges]
+        self.spans: list[NodeSpan] = []
+        self._runs: dict[UUID, NodeSpan] = {}
+        self._origin = time.perf_counter()
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+        metadata = metadata or {}
+        name = kwargs.get("name")
+        if name is None or name != metadata.get("langgraph_node"):
+            return
+
+        path = node_path(metadata, name)
+        if path.split("/")[-1] in (START, END):
+            return
+        parent = self._runs.get(kwargs.get("parent_run_id"))
+        if parent is not None and parent.node == path:
+            # Узел-функция, обёрнутая в runnable (@chain), порождает вложенный запуск с тем же именем
+            return
+
+        span = NodeSpan(path, time.perf_counter() - self._origin)
+        self._runs[run_id] = span
+        self.spans.append(span)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        if span := self._runs.pop(run_id, None):
+            span.end = time.perf_counter() - self._origin
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self.on_chain_end(None, run_id=run_id)
+
+    def node_windows(self) -> dict[str, tuple[float, float]]:
+        # Ветки Send одного узла объединяются в одно окно от первого старта до последнего финиша
+        windows: dict[str, tuple[float, float]] = {}
+        for span in self.spans:
+            if span.end is None or span.node in (START, END):
+                continue
+            start, end = windows.get(span.node, (span.start, span.end))
+            windows[span.node] = (min(start, span.start), max(end, span.end))
+        return windows
+
+    def critical_path(self) -> list[str]:
+        windows = {
+            name: window for name, window in self.node_windows().items() if name in self.nodes
+        }
+        if not windows:
+            return []
+
+        predecessors = defaultdict(set)
+        for source, target in self.edges:
+            predecessors[target].add(source)
+
+        # От последнего завершившегося узла идём назад к той зависимости,
+        # которая освободилась позже всех - она и задерживала старт
+        node = max(windows, key=lambda name: windows[name][1])
+        path = [node]
+        while candidates := [name for name in predecessors[node] if name in windows and name not in path]:
+            node = max(candidates, key=lambda name: windows[name][1])
+            path.append(node)
+
+        return path[::-1]
+
+    def report(self) -> str:
+        windows = self.node_windows()
+        critical = self.critical_path()
+        branches = defaultdict(int)
+        for span in self.spans:
+            branches[span.node] += 1
+
+        lines = [f"{'node':<28}{'start, s':>10}{'end, s':>10}{'time, s':>10}{'runs':>6}  critical"]
+        for node, (start, end) in sorted(windows.items(), key=lambda item: item[1]):
+            mark = "*" if node in critical else ""
+            lines.append(
+                f"{node:<28}{start:>10.2f}{end:>10.2f}{end - start:>10.2f}{branches[node]:>6}  {mark}"
+            )
+
+        if critical:
+            total = windows[critical[-1]][1] - windows[critical[0]][0]
+            lines.append(f"critical path ({total:.2f} s): " + " -> ".join(critical))
+
+        return "\n".join(lines)
+
+
+class RunMetrics(NodeTimingHandler):
+    # Полная телеметрия одного запуска графа: к времени узлов добавляются задержка
+    # и токены каждого вызова модели (с учётом ответов из кеша) и вызовы инструментов.
+    # Передаётся в callbacks конфига и наследуется вложенными графами.
+    def __init__(self, graph) -> None:
+        super().__init__(graph)
+        self.llm: dict[str, Counter] = defaultdict(Counter)
+        self.tools: dict[str, Counter] = defaultdict(Counter)
+        self._llm_runs: dict[UUID, tuple[str, str, float]] = {}
+        self._tool_runs: dict[UUID, tuple[str, float]] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        metadata = metadata or {}
+        model = metadata.get("ls_model_name") or (kwargs.get("invocation_params") or {}).get("model", "unknown")
+        self._llm_runs[run_id] = (node_path(metadata), model, time.perf_counter())
+
+    def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, **kwargs):
+        self.on_chat_model_start(serialized, prompts, run_id=run_id, metadata=metadata, **kwargs)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        if (run := self._llm_runs.pop(run_id, None)) is None:
+            return
+        node, model, started = run
+        stats = self.llm[f"{node}\x00{model}"]
+        stats["calls"] += 1
+        stats["seconds"] += time.perf_counter() - started
+
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                if message is None:
+                    continue
+                usage = getattr(message, "usage_metadata", None) or {}
+                if message.response_metadata.get("cache_hit"):
+                    stats["cache_hits"] += 1
+                    stats["cached_tokens"] += usage.get("total_tokens", 0)
+                else:
+                    stats["prompt_tokens"] += usage.get("input_tokens", 0)
+                    stats["completion_tokens"] += usage.get("output_tokens", 0)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        if (run := self._llm_runs.pop(run_id, None)) is None:
+            return
+        node, model, started = run
+        stats = self.llm[f"{node}\x00{model}"]
+        stats["errors"] += 1
+        stats["seconds"] += time.perf_counter() - started
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name", "unknown")
+        self._tool_runs[run_id] = (name, time.perf_counter())
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        if (run := self._tool_runs.pop(run_id, None)) is None:
+            return
+        name, started = run
+        self.tools[name]["calls"] += 1
+        self.tools[name]["seconds"] += time.perf_counter() - started
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        if (run := self._tool_runs.pop(run_id, None)) is None:
+            return
+        name, started = run
+        self.tools[name]["calls"] += 1
+        self.tools[name]["errors"] += 1
+        self.tools[name]["seconds"] += time.perf_counter() - started
+
+    def summary(self) -> dict:
+        nodes: dict[str, Counter] = defaultdict(Counter)
+        for span in self.spans:
+            if span.end is not None and span.node not in (START, END):
+                nodes[span.node]["runs"] += 1
+                nodes[span.node]["seconds"] += span.duration
+
+        llm = [
+            {"node": key.split("\x00")[0], "model": key.split("\x00")[1], **stats}
+            for key, stats in sorted(self.llm.items())
+        ]
+        return {
+            "seconds": time.perf_counter() - self._origin,
+            "critical_path": self.critical_path(),
+            "nodes": {node: dict(stats) for node, stats in sorted(nodes.items())},
+            "llm": llm,
+            "llm_total": dict(sum((Counter(stats) for stats in self.llm.values()), Counter())),
+            "tools": {name: dict(stats) for name, stats in sorted(self.tools.items())},
+        }
+
+
+def prometheus_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_value(value: float) -> str:
+    # Без потери точности: {:g} оставляет 6 значащих цифр, и счётчик токенов 1234567
+    # превращается в 1.23457e+06, а его прирост между опросами теряется
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class ArticleTotals:
+    # Счётчики статей процесса нарастающим итогом: сводка добавляется, когда статья завершена,
+    # поэтому *_total не убывают, даже если сами сводки уже забыты (сервис хранит их ограниченно)
+    def __init__(self) -> None:
+        self.samples: dict[tuple[str, tuple], float] = defaultdict(float)
+
+    def add(self, summary: dict) -> None:
+        samples = self.samples
+        samples[("articles_total", (("status", summary.get("status", "ok")),))] += 1
+        samples[("article_seconds_total", ())] += summary.get("seconds", 0)
+        for node, stats in summary.get("nodes", {}).items():
+            samples[("node_runs_total", (("node", node),))] += stats.get("runs", 0)
+            samples[("node_seconds_total", (("node", node),))] += stats.get("seconds", 0)
+        for stats in summary.get("llm", []):
+            labels = (("node", stats["node"]), ("model", stats["model"]))
+            samples[("llm_calls_total", labels)] += stats.get("calls", 0)
+            samples[("llm_errors_total", labels)] += stats.get("errors", 0)
+            samples[("llm_cache_hits_total", labels)] += stats.get("cache_hits", 0)
+            samples[("llm_seconds_total", labels)] += stats.get("seconds", 0)
+            samples[("llm_tokens_total", labels + (("kind", "prompt"),))] += stats.get("prompt_tokens", 0)
+            samples[("llm_tokens_total", labels + (("kind", "completion"),))] += stats.get("completion_tokens", 0)
+        for tool, stats in summary.get("tools", {}).items():
+            samples[("tool_calls_total", (("tool", tool),))] += stats.get("calls", 0)
+            samples[("tool_errors_total", (("tool", tool),))] += stats.get("errors", 0)
+            samples[("tool_seconds_total", (("tool", tool),))] += stats.get("seconds", 0)
+
+
+def prometheus_text(
+    summaries: list[dict] | ArticleTotals,
+    tool_cache_stats: dict | None = None,
+    embedding_stats: dict | None = None,
+    prefix: str = "outlines",
+) -> str:
+    # Текстовый формат Prometheus (для node_exporter textfile collector или pushgateway):
+    # счётчики суммируются по всем статьям процесса, метрики без суффикса _total - gauge
+    if not isinstance(summaries, ArticleTotals):
+        totals = ArticleTotals()
+        for summary in summaries:
+            totals.add(summary)
+        summaries = totals
+    samples = defaultdict(float, summaries.samples)
+    for namespace, stats in (tool_cache_stats or {}).items():
+        for result, value in stats.items():
+            samples[("tool_cache_requests_total", (("tool", namespace), ("result", result)))] += value
+    if embedding_stats:
+        model = (("model", embedding_stats["model"]),)
+        if embedding_stats.get("load_seconds") is not None:
+            samples[("embedding_model_load_seconds", model)] = embedding_stats["load_seconds"]
+        samples[("embedding_batches_total", model)] = embedding_stats.get("batches", 0)
+        samples[("embedding_texts_total", model)] = embedding_stats.get("texts", 0)
+        samples[("embedding_max_batch_size", model)] = embedding_stats.get("max_batch_size", 0)
+        for result in ("embedded", "reused"):
+            samples[("passages_total", (("result", result),))] = embedding_stats.get(f"passages_{result}", 0)
+
+    lines = []
+    for name in sorted({name for name, _ in samples}):
+        lines.append(f"# TYPE {prefix}_{name} {'counter' if name.endswith('_total') else 'gauge'}")
+        for (sample, labels), value in sorted(samples.items()):
+            if sample != name:
+                continue
+            rendered = ",".join(f'{key}="{prometheus_label(label)}"' for key, label in labels)
+            value = prometheus_value(value)
+            lines.append(f"{prefix}_{name}{{{rendered}}} {value}" if rendered else f"{prefix}_{name} {value}")
+    return "\n".join(lines) + "\n"
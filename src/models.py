@@ -1,14 +1,27 @@
+from dataclasses import dataclass
+from typing import Iterator, Literal, Optional
+
 from pydantic import BaseModel, Field
 
+# Заголовки секций начинаются со второго уровня: первый - заголовок статьи
+TOP_HEADING_LEVEL = 2
+
+TITLE_DESCRIPTION = "Заголовок секции статьи"
+CONTENT_DESCRIPTION = "Подробное описание того, что должна содержать данная секция статьи."
+SUBSECTIONS_DESCRIPTION = "Подсекции большой секции; пустой список, если секция раскрывается одним текстом."
+
 
 class Section(BaseModel):
-    section_title: str = Field(description="Заголовок секции статьи")
-    content: str = Field(
-        description="Подробное описание того, что должна содержать данная секция статьи."
-    )
+    section_title: str = Field(description=TITLE_DESCRIPTION)
+    content: str = Field(description=CONTENT_DESCRIPTION)
+    subsections: list["Section"] = Field(default_factory=list, description=SUBSECTIONS_DESCRIPTION)
 
     def __str__(self) -> str:
-        return f"\n## {self.section_title}\n\n{self.content}\n"
+        return self.render(TOP_HEADING_LEVEL)
+
+    def render(self, level: int) -> str:
+        text = f"\n{heading(level)} {self.section_title}\n\n{self.content}\n"
+        return text + "".join(subsection.render(level + 1) for subsection in self.subsections)
 
 
 class SectionsList(BaseModel):
@@ -18,3 +31,181 @@ class SectionsList(BaseModel):
 
     def __str__(self):
         return "\n".join([str(section) for section in self.sections])
+
+
+# Схема оглавления для структурированного вывода модели. Рекурсивная Section в режиме
+# function calling превращается в "items": {} и вложенность до модели не доходит,
+# поэтому модель заполняет явные модели до трёх уровней, а граф работает с SectionsList
+
+
+class OutlineSubsubsection(BaseModel):
+    section_title: str = Field(description=TITLE_DESCRIPTION)
+    content: str = Field(description=CONTENT_DESCRIPTION)
+
+
+class OutlineSubsection(BaseModel):
+    section_title: str = Field(description=TITLE_DESCRIPTION)
+    content: str = Field(description=CONTENT_DESCRIPTION)
+    subsections: list[OutlineSubsubsection] = Field(default_factory=list, description=SUBSECTIONS_DESCRIPTION)
+
+
+class OutlineSection(BaseModel):
+    section_title: str = Field(description=TITLE_DESCRIPTION)
+    content: str = Field(description=CONTENT_DESCRIPTION)
+    subsections: list[OutlineSubsection] = Field(default_factory=list, description=SUBSECTIONS_DESCRIPTION)
+
+
+class GeneratedOutline(BaseModel):
+    sections: list[OutlineSection] = Field(description="Список подтем для описания основной темы.")
+
+    def to_outline(self) -> SectionsList:
+        return SectionsList.model_validate(self.model_dump())
+
+
+def heading(level: int) -> str:
+    # В Markdown нет заголовков глубже шестого уровня
+    return "#" * min(level, 6)
+
+
+def walk_outline(sections: list[Section], depth: int = 0) -> Iterator[tuple[int, Section]]:
+    # Все секции оглавления в порядке чтения вместе с глубиной вложенности;
+    # сквозная нумерация этого обхода - номера секций в правках оглавления
+    for section in sections:
+        yield depth, section
+        yield from walk_outline(section.subsections, depth + 1)
+
+
+@dataclass(slots=True)
+class OutlineLeaf:
+    # Лист оглавления - единица исследования, планирования и написания. Заголовок секции
+    # уточнён заголовками родителей (одноимённые подсекции разных разделов не путаются
+    # в мемоизации), heading - строки заголовков, которые ставятся перед текстом листа,
+    # parents - родительские секции, их описания служат листу контекстом
+    section: Section
+    heading: str
+    parents: list[Section]
+
+
+def outline_leaves(sections: list[Section]) -> list[OutlineLeaf]:
+    leaves: list[OutlineLeaf] = []
+    opened: list[Section] = []
+
+    def visit(section: Section, parents: list[Section]) -> None:
+        if section.subsections:
+            for subsection in section.subsections:
+                visit(subsection, [*parents, section])
+            return
+
+        # Заголовки родителей ставятся перед первым листом раздела
+        shared = 0
+        while shared < min(len(opened), len(parents)) and opened[shared] is parents[shared]:
+            shared += 1
+        lines = [
+            f"{heading(TOP_HEADING_LEVEL + depth)} {parent.section_title}"
+            for depth, parent in enumerate(parents)
+            if depth >= shared
+        ]
+        lines.append(f"{heading(TOP_HEADING_LEVEL + len(parents))} {section.section_title}")
+        opened[:] = parents
+
+        title = " › ".join([*(parent.section_title for parent in parents), section.section_title])
+        leaves.append(
+            OutlineLeaf(
+                Section(section_title=title, content=section.content),
+                "\n\n".join(lines),
+                parents,
+            )
+        )
+
+    for section in sections:
+        visit(section, [])
+    return leaves
+
+
+class SectionEdit(BaseModel):
+    action: Literal["add", "remove", "rename", "rewrite", "move"] = Field(
+        description=(
+            "add - новая секция, remove - удалить секцию, rename - новый заголовок, "
+            "rewrite - новое описание, move - переставить секцию"
+        )
+    )
+    index: Optional[int] = Field(
+        default=None,
+        description="Номер секции в текущем оглавлении (с 1, сквозной вместе с подсекциями) для remove, rename, rewrite и move",
+    )
+    after: Optional[int] = Field(
+        default=None,
+        description=(
+            "Для add и move: номер секции текущего оглавления, рядом с которой (на том же уровне) "
+            "поставить секцию; 0 - в начало, пусто - в конец"
+        ),
+    )
+    parent: Optional[int] = Field(
+        default=None,
+        description="Для add и move без after: номер секции, в конец подсекций которой поставить секцию; пусто - верхний уровень",
+    )
+    section_title: Optional[str] = Field(default=None, description="Заголовок для add и rename")
+    content: Optional[str] = Field(default=None, description="Подробное описание для add и rewrite")
+
+
+class OutlineEdits(BaseModel):
+    edits: list[SectionEdit] = Field(
+        description="Правки оглавления по порядку; пустой список, если оглавление менять не нужно."
+    )
+
+    def apply(self, outline: SectionsList) -> SectionsList:
+        # Номера в правках относятся к исходному оглавлению (сквозная нумерация обхода
+        # walk_outline), поэтому секции адресуются по исходному номеру, а не по позиции,
+        # сдвинутой предыдущими правками. Секции сравниваются по идентичности:
+        # у pydantic-моделей == сравнивает поля
+        sections = [section.model_copy(deep=True) for section in outline.sections]
+        by_index = {number: section for number, (_, section) in enumerate(walk_outline(sections), start=1)}
+
+        def locate(section: Section, siblings: list[Section] = sections) -> Optional[tuple[list[Section], int]]:
+            # Список, в котором лежит секция, и её позиция; None - секция удалена вместе с родителем
+            for position, item in enumerate(siblings):
+                if item is section:
+                    return siblings, position
+                found = locate(section, item.subsections)
+                if found is not None:
+                    return found
+            return None
+
+        def original(index: Optional[int]) -> Section:
+            if index not in by_index or locate(by_index[index]) is None:
+                raise ValueError(f"Outline has no section {index}")
+            return by_index[index]
+
+        def place(section: Section, after: Optional[int], parent: Optional[int]) -> None:
+            # Перемещённая внутрь собственного поддерева секция туда не найдётся (поддерево
+            # уже вынуто из оглавления) и окажется в конце верхнего уровня - без циклов
+            target = by_index[parent].subsections if parent in by_index and locate(by_index[parent]) else sections
+            if after == 0:
+                target.insert(0, section)
+            elif after in by_index and (found := locate(by_index[after])) is not None:
+                siblings, position = found
+                siblings.insert(position + 1, section)
+            else:
+                target.append(section)
+
+        for edit in self.edits:
+            if edit.action == "add":
+                if not edit.section_title or not edit.content:
+                    raise ValueError("New section needs a title and a description")
+                place(Section(section_title=edit.section_title, content=edit.content), edit.after, edit.parent)
+                continue
+
+            section = original(edit.index)
+            if edit.action == "remove":
+                siblings, position = locate(section)
+                del siblings[position]
+            elif edit.action == "rename":
+                section.section_title = edit.section_title or section.section_title
+            elif edit.action == "rewrite":
+                section.content = edit.content or section.content
+            elif edit.action == "move":
+                siblings, position = locate(section)
+                del siblings[position]
+                place(section, edit.after, edit.parent)
+
+        return SectionsList(sections=sections)
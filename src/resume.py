@@ -0,0 +1,33 @@
+import asyncio
+import os
+
+import click
+from langchain_core.runnables import RunnableConfig
+
+from main import generate_article, graph
+
+
+async def resume(thread_id: str) -> None:
+    config = RunnableConfig(configurable={"thread_id": thread_id})
+    snapshot = await graph.aget_state(config)
+
+    if not snapshot.values:
+        raise click.ClickException(f"Запуск {thread_id} не найден в чекпоинтах")
+    if not snapshot.next:
+        print(f"Запуск {thread_id} уже завершён: outputs/{snapshot.values['topic']}.md")
+        return
+
+    print(f"Продолжаем «{snapshot.values['topic']}» с узла: {', '.join(snapshot.next)}")
+    os.makedirs("outputs", exist_ok=True)
+    await generate_article(None, config, snapshot.values["topic"])
+
+
+@click.command()
+@click.argument("thread_id")
+def main(thread_id: str):
+    """Продолжает прерванную генерацию статьи с последнего завершённого узла."""
+    asyncio.run(resume(thread_id))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+import hashlib
+import math
+import re
+from abc import ABC, abstractmethod
+from collections import Counter
+
+import numpy as np
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from embeddings import embedding_service
+from settings import (
+    PASSAGE_OVERLAP,
+    PASSAGE_SIZE,
+    RETRIEVER_BACKEND,
+    RETRIEVER_HYBRID_WEIGHT,
+)
+
+passage_splitter = RecursiveCharacterTextSplitter(
+    chunk_size=PASSAGE_SIZE, chunk_overlap=PASSAGE_OVERLAP
+)
+
+
+def split_passages(text: str) -> list[str]:
+    # Большие выгрузки исследований индексируются фрагментами фиксированного размера,
+    # а не одним огромным текстом, который модель эмбеддингов всё равно обрежет
+    return passage_splitter.split_text(text) if text else []
+
+
+def passage_id(text: str) -> str:
+    normalized = " ".join(text.split()).lower()
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+class PassageRetriever(ABC):
+    # Общий интерфейс хранилищ исследовательских фрагментов для vector_store_node
+
+    @abstractmethod
+    def add(self, texts: list[str], metadatas: list[dict]) -> list[str]:
+        # Индексирует фрагменты и возвращает их идентификаторы (хеши содержимого)
+        ...
+
+    @abstractmethod
+    def search_many(
+        self,
+        queries: list[str],
+        k: int,
+        exclude: list[set[str]] | None = None,
+        query_embeddings: list[list[float]] | None = None,
+    ) -> list[list[str]]:
+        # Для каждого запроса возвращает до k фрагментов, кроме перечисленных в exclude.
+        # Уже посчитанные эмбеддинги запросов передаются в query_embeddings,
+        # чтобы вызывающий код не эмбеддил те же запросы второй раз
+        ...
+
+    @abstractmethod
+    def vectors(self, ids: list[str], texts: list[str] | None = None) -> np.ndarray:
+        # Нормированные эмбеддинги фрагментов в порядке ids; по texts (тексты тех же
+        # фрагментов) пересчитываются эмбеддинги, которых в хранилище уже нет
+        ...
+
+    def close(self) -> None:
+        pass
+
+
+def tokenize(text: str) -> list[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+class BM25Index:
+    def __init__(self, k1: float = 1.5, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self.lengths: list[int] = []
+        # термин -> (номера документов, частоты термина в них)
+        self.postings: dict[str, tuple[list[int], list[int]]] = {}
+
+    def add(self, texts: list[str]) -> None:
+        for text in texts:
+            doc = len(self.lengths)
+            counts = Counter(tokenize(text))
+            self.lengths.append(sum(counts.values()))
+            for term, count in counts.items():
+                docs, freqs = self.postings.setdefault(term, ([], []))
+                docs.append(doc)
+                freqs.append(count)
+
+    def scores(self, query: str) -> np.ndarray:
+        total = len(self.lengths)
+        result = np.zeros(total, dtype=np.float32)
+        if not total:
+            return result
+
+        lengths = np.asarray(self.lengths, dtype=np.float32)
+        norm = self.k1 * (1 - self.b + self.b * lengths / max(lengths.mean(), 1.0))
+
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            docs, freqs = self.postings[term]
+            idf = math.log(1 + (total - len(docs) + 0.5) / (len(docs) + 0.5))
+            tf = np.asarray(freqs, dtype=np.float32)
+            result[docs] += idf * tf * (self.k1 + 1) / (tf + norm[docs])
+
+        return result
+
+
+class NumpyRetriever(PassageRetriever):
+    # Хранилище в памяти для одной статьи: нормированные эмбеддинги лежат в матрице float32,
+    # косинусная близость считается одним матричным умножением, top-k - через argpartition.
+    # При hybrid_weight > 0 к косинусной оценке подмешивается BM25 по тем же фрагментам.
+    def __init__(self, hybrid_weight: float = RETRIEVER_HYBRID_WEIGHT) -> None:
+        self.hybrid_weight = hybrid_weight
+        self.ids: list[str] = []
+        self.texts: list[str] = []
+        self.metadatas: list[dict] = []
+        self.positions: dict[str, int] = {}
+        self.matrix: np.ndarray | None = None
+        self.bm25 = BM25Index() if hybrid_weight > 0 else None
+
+    @staticmethod
+    def normalize(vectors: list[list[float]]) -> np.ndarray:
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-12)
+
+    def add(self, texts: list[str], metadatas: list[dict]) -> list[str]:
+        ids = [passage_id(text) for text in texts]
+
+        new: dict[str, tuple[str, dict]] = {}
+        for id_, text, metadata in zip(ids, texts, metadatas):
+            if id_ not in self.positions and id_ not in new:
+                new[id_] = (text, metadata)
+
+        if new:
+            new_texts = [text for text, _ in new.values()]
+            vectors = self.normalize(embedding_service.embed_documents(new_texts))
+            self.matrix = vectors if self.matrix is None else np.vstack([self.matrix, vectors])
+
+            for id_, (text, metadata) in new.items():
+                self.positions[id_] = len(self.ids)
+                self.ids.append(id_)
+                self.texts.append(text)
+                self.metadatas.append(metadata)
+
+            if self.bm25 is not None:
+                self.bm25.add(new_texts)
+
+        embedding_service.record_passages(embedded=len(new), reused=len(set(ids)) - len(new))
+        return ids
+
+    def search_many(
+        self,
+        queries: list[str],
+        k: int,
+        exclude: list[set[str]] | None = None,
+        query_embeddings: list[list[float]] | None = None,
+    ) -> list[list[str]]:
+        if not queries or self.matrix is None:
+            return [[] for _ in queries]
+
+        if query_embeddings is None:
+            query_embeddings = embedding_service.embed_documents(queries)
+        scores = self.normalize(query_embeddings) @ self.matrix.T
+
+        if self.bm25 is not None:
+            lexical = np.stack([self.bm25.scores(query) for query in queries])
+            lexical /= np.maximum(lexical.max(axis=1, keepdims=True), 1e-12)
+            scores = (1 - self.hybrid_weight) * scores + self.hybrid_weight * lexical
+
+        for row, excluded in enumerate(exclude or []):
+            positions = [self.positions[id_] for id_ in excluded if id_ in self.positions]
+            scores[row, positions] = -np.inf
+
+        top = min(k, scores.shape[1])
+        if top <= 0:
+            return [[] for _ in queries]
+
+        candidates = np.argpartition(-scores, top - 1, axis=1)[:, :top]
+        results = []
+        for row, columns in enumerate(candidates):
+            ordered = columns[np.argsort(-scores[row, columns])]
+            results.append([self.texts[column] for column in ordered if np.isfinite(scores[row, column])])
+
+        return results
+
+    def vectors(self, ids: list[str], texts: list[str] | None = None) -> np.ndarray:
+        # Индекс статьи ничего не вытесняет, поэтому texts не нужны
+        if self.matrix is None or not ids:
+            return np.zeros((0, 0), dtype=np.float32)
+        return self.matrix[[self.positions[id_] for id_ in ids]]
+
+
+def open_retriever() -> PassageRetriever:
+    # numpy - быстрый индекс в памяти на одну статью,
+    # chroma - для больших и постоянных корпусов (research_corpus_dir)
+    if RETRIEVER_BACKEND == "numpy":
+        return NumpyRetriever()
+
+    # Chroma импортируется только при выборе этого бэкенда
+    from corpus import open_corpus
+
+    return open_corpus()
@@ -0,0 +1,227 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+
+import openai
+from langchain_core.runnables.config import var_child_runnable_config
+
+from settings import (
+    LLM_BACKOFF_BASE,
+    LLM_BACKOFF_MAX,
+    LLM_CONCURRENCY,
+    LLM_MAX_RETRIES,
+    LLM_RPM,
+    LLM_TARGET_LATENCY,
+    LLM_TPM,
+)
+
+logger = logging.getLogger(__name__)
+
+# Чем меньше число, тем раньше запрос получает слот
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BATCH = 2
+
+# Узлы, ответа которых пользователь ждёт у консоли
+INTERACTIVE_NODES = {"generate_outline"}
+
+
+# Ошибки, после которых запрос имеет смысл повторить (на том же или другом бэкенде)
+TRANSIENT_ERRORS = (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)
+
+
+def request_priority() -> int:
+    # Приоритет по конфигу текущего узла: configurable.priority задаётся явно,
+    # иначе правка оглавления впереди всего, пакетный режим (interactive = False) - позади
+    config = var_child_runnable_config.get() or {}
+    configurable = config.get("configurable", {})
+    if "priority" in configurable:
+        return int(configurable["priority"])
+    if not configurable.get("interactive", True):
+        return PRIORITY_BATCH
+    node = config.get("metadata", {}).get("langgraph_node")
+    return PRIORITY_INTERACTIVE if node in INTERACTIVE_NODES else PRIORITY_NORMAL
+
+
+class TokenBucket:
+    # Бюджет на минуту, пополняется непрерывно; 0 - без ограничения.
+    # Баланс может уйти в минус, если фактический расход превысил оценку
+    def __init__(self, per_minute: float) -> None:
+        self.per_minute = per_minute
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.per_minute, self.tokens + (now - self.updated) * self.per_minute / 60)
+        self.updated = now
+
+    def delay(self, amount: float) -> float:
+        # Через сколько секунд в ведре будет amount (запрос больше ёмкости ждёт полного ведра)
+        if not self.per_minute:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.per_minute)
+        return max(0.0, (amount - self.tokens) * 60 / self.per_minute)
+
+    def take(self, amount: float) -> None:
+        if self.per_minute:
+            self._refill()
+            self.tokens -= amount
+
+
+def retry_after(error: Exception) -> float | None:
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+class LLMScheduler:
+    # Общий на процесс диспетчер запросов к моделям:
+    # - слоты выдаются по приоритету, внутри приоритета - по очереди;
+    # - запросы в минуту и токены в минуту ограничены ведрами токенов;
+    # - число одновременных запросов подстраивается (AIMD): 429 и превышение целевой задержки
+    #   уменьшают его, успешные ответы понемногу возвращают к max_concurrency;
+    # - 429, таймауты и 5xx повторяются с экспоненциальной задержкой со случайным разбросом.
+    def __init__(
+        self,
+        max_concurrency: int = LLM_CONCURRENCY,
+        rpm: float = LLM_RPM,
+        tpm: float = LLM_TPM,
+        target_latency: float = LLM_TARGET_LATENCY,
+        max_retries: int = LLM_MAX_RETRIES,
+        backoff_base: float = LLM_BACKOFF_BASE,
+        backoff_max: float = LLM_BACKOFF_MAX,
+    ) -> None:
+        self.max_concurrency = max_concurrency
+        self.limit = float(max_concurrency)
+        self.target_latency = target_latency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.active = 0
+        self.paused_until = 0.0
+        self.counters: Counter[str] = Counter()
+        self.granted: Counter[int] = Counter()
+
+        self._waiters: list[tuple[int, int, float, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._timer: asyncio.TimerHandle | None = None
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._waiters:
+            priority, _, tokens, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if self.active >= max(1, int(self.limit)):
+                return
+
+            delay = max(self.paused_until - time.monotonic(), self.requests.delay(1), self.tokens.delay(tokens))
+            if delay > 0:
+                # Головной запрос ждёт пополнения бюджета; менее приоритетные его не обгоняют
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+
+            heapq.heappop(self._waiters)
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            self.active += 1
+            future.set_result(None)
+
+    async def acquire(self, priority: int, tokens: float) -> None:
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), tokens, future))
+        self._dispatch()
+
+        started = time.monotonic()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+        self.granted[priority] += 1
+        self.counters["wait_ms"] += int((time.monotonic() - started) * 1000)
+
+    def release(self) -> None:
+        self.active -= 1
+        self._dispatch()
+
+    def settle(self, estimated: float, actual: float) -> None:
+        # Списываем разницу между оценкой и фактическим расходом токенов
+        self.tokens.take(actual - estimated)
+
+    def on_success(self, latency: float) -> None:
+        self.counters["completed"] += 1
+        if self.target_latency and latency > self.target_latency:
+            self.limit = max(1.0, self.limit * 0.9)
+        else:
+            self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+
+    def on_rate_limited(self, error: Exception) -> float | None:
+        self.counters["rate_limited"] += 1
+        self.limit = max(1.0, self.limit / 2)
+        pause = retry_after(error)
+        if pause:
+            # Сервер сказал, сколько ждать - до этого момента слоты не выдаются никому
+            self.paused_until = max(self.paused_until, time.monotonic() + pause)
+        return pause
+
+    def backoff(self, attempt: int, minimum: float | None = None) -> float:
+        return max(minimum or 0.0, random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt)))
+
+    @asynccontextmanager
+    async def slot(self, tokens: float = 0, priority: int | None = None):
+        await self.acquire(request_priority() if priority is None else priority, tokens)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release()
+        self.on_success(time.monotonic() - started)
+
+    async def retrying(self, attempt: int, error: Exception) -> None:
+        # Решает, повторять ли запрос после ошибки, и выжидает паузу; иначе пробрасывает ошибку
+        if isinstance(error, openai.RateLimitError):
+            minimum = self.on_rate_limited(error)
+        elif isinstance(error, TRANSIENT_ERRORS):
+            self.counters["transient_errors"] += 1
+            minimum = None
+        else:
+            raise error
+
+        if attempt >= self.max_retries:
+            self.counters["gave_up"] += 1
+            raise error
+
+        delay = self.backoff(attempt, minimum)
+        self.counters["retries"] += 1
+        logger.info("LLM request failed (%s), retry %d in %.1f s", type(error).__name__, attempt + 1, delay)
+        await asyncio.sleep(delay)
+
+    def metrics(self) -> dict:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queued": sum(1 for *_, future in self._waiters if not future.done()),
+            "granted_by_priority": dict(self.granted),
+            **self.counters,
+        }
+
+
+llm_scheduler = LLMScheduler()
@@ -0,0 +1,49 @@
+import hashlib
+from collections import Counter
+
+from settings import SECTION_CACHE_MAX_ENTRIES, SECTION_CACHE_PATH, SECTION_CACHE_TTL_HOURS
+from sqlite_store import SQLiteStore
+
+
+class SectionCache:
+    # Мемоизация работы над секциями между запусками: исследование, план и текст секции
+    # хранятся под хешем своих входных данных (тема, заголовок, описание, роль, модель,
+    # контекст соседей). Повторный запуск статьи после правки оглавления пересчитывает
+    # только изменившиеся секции и соседей, чей контекст от них зависит.
+    def __init__(self, path: str, ttl_seconds: float, max_entries: int) -> None:
+        self.hits: Counter[str] = Counter()
+        self.misses: Counter[str] = Counter()
+        self._store = SQLiteStore(path, "section_results", ttl_seconds=ttl_seconds, max_entries=max_entries)
+
+    @staticmethod
+    def key(*parts: str) -> str:
+        return hashlib.sha256("\x00".join(parts).encode()).hexdigest()
+
+    def get(self, stage: str, key: str) -> str | None:
+        value = self._store.get(stage, key)
+        if value is None:
+            self.misses[stage] += 1
+        else:
+            self.hits[stage] += 1
+        return value
+
+    def put(self, stage: str, key: str, value: str) -> None:
+        self._store.put(stage, key, value)
+
+    def metrics(self) -> dict:
+        return {
+            stage: {"hits": self.hits[stage], "misses": self.misses[stage]}
+            for stage in sorted(set(self.hits) | set(self.misses))
+        }
+
+
+# Мемоизация включается только явно, заданием пути section_cache_path
+section_cache = (
+    SectionCache(
+        SECTION_CACHE_PATH,
+        ttl_seconds=SECTION_CACHE_TTL_HOURS * 60 * 60,
+        max_entries=SECTION_CACHE_MAX_ENTRIES,
+    )
+    if SECTION_CACHE_PATH
+    else None
+)
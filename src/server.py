@@ -0,0 +1,370 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import click
+from aiohttp import web
+
+from metrics import ArticleTotals
+from models import SectionsList
+
+# Статусы, после которых задание больше не меняется
+FINISHED = {"done", "failed", "cancelled"}
+# Как часто слать комментарий в SSE-поток, чтобы прокси не закрывали простаивающее соединение
+HEARTBEAT_SECONDS = 15
+# Сколько ждать правку оглавления: ушедший клиент не должен навсегда занимать воркер
+FEEDBACK_TIMEOUT_SECONDS = 30 * 60
+
+
+class Job:
+    # Задание на статью. События (узлы графа, оглавление, готовые секции) копятся в истории,
+    # чтобы подключившийся позже клиент получил их все; токены отдаются только живым подписчикам
+    def __init__(self, topic: str, wishes: str, review: bool, feedback_timeout: float = FEEDBACK_TIMEOUT_SECONDS) -> None:
+        self.id = uuid.uuid4().hex
+        self.topic = topic
+        self.wishes = wishes
+        self.review = review
+        self.feedback_timeout = feedback_timeout
+        self.status = "queued"
+        self.created_at = time.time()
+        self.outline: list[dict] | None = None
+        self.article: str | None = None
+        self.error: str | None = None
+        self.metrics: dict | None = None
+        self.task: asyncio.Task | None = None
+
+        self.events: list[tuple[str, dict]] = []
+        self.subscribers: set[asyncio.Queue] = set()
+        self.feedback: asyncio.Queue[str] = asyncio.Queue()
+
+    def publish(self, event: str, data: dict, history: bool = True) -> None:
+        if history:
+            self.events.append((event, data))
+        for queue in self.subscribers:
+            queue.put_nowait((event, data))
+
+    async def outline_feedback(self, outline: SectionsList) -> str:
+        # Вместо input() в topic_structure: оглавление уходит клиенту, правка приходит
+        # запросом POST /jobs/{id}/feedback. Не дождавшись правки, задание продолжается
+        # как без согласования: оглавление принимается как есть
+        self.outline = [section.model_dump() for section in outline.sections]
+        self.status = "waiting_feedback"
+        self.publish("outline", {"sections": self.outline})
+        try:
+            feedback = await asyncio.wait_for(self.feedback.get(), self.feedback_timeout)
+        except asyncio.TimeoutError:
+            self.review = False
+            feedback = "done"
+        self.status = "running"
+        self.publish("status", {"status": self.status, "review": self.review})
+        return feedback
+
+    def info(self) -> dict:
+        return {
+            "id": self.id,
+            "topic": self.topic,
+            "wishes": self.wishes,
+            "review": self.review,
+            "status": self.status,
+            "created_at": self.created_at,
+            "outline": self.outline,
+            "article": self.article,
+            "error": self.error,
+            "metrics": self.metrics,
+        }
+
+
+class ArticleService:
+    # Очередь заданий ограниченного размера и пул воркеров: когда очередь заполнена,
+    # новые задания отклоняются с 503 и Retry-After, а не копятся в памяти
+    def __init__(self, workers: int, queue_size: int, keep_jobs: int, feedback_timeout: float) -> None:
+        self.workers = workers
+        self.keep_jobs = keep_jobs
+        self.feedback_timeout = feedback_timeout
+        self.queue: asyncio.Queue[Job] = asyncio.Queue(maxsize=queue_size)
+        self.jobs: OrderedDict[str, Job] = OrderedDict()
+        # Счётчики завершённых статей за всё время процесса, а не только по хранимым заданиям
+        self.totals = ArticleTotals()
+        self._workers: list[asyncio.Task] = []
+
+    async def start(self, app: web.Application) -> None:
+        self._workers = [asyncio.create_task(self.worker()) for _ in range(self.workers)]
+
+    async def stop(self, app: web.Application) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+
+    def submit(self, job: Job) -> None:
+        # asyncio.QueueFull, если очередь заполнена
+        self.queue.put_nowait(job)
+        self.jobs[job.id] = job
+        job.publish("status", {"status": job.status})
+
+        # Завершённые задания хранятся ограниченно: самые старые забываются
+        finished = [key for key, item in self.jobs.items() if item.status in FINISHED]
+        for key in finished[: max(0, len(self.jobs) - self.keep_jobs)]:
+            del self.jobs[key]
+
+    def cancel(self, job: Job) -> None:
+        if job.task is not None:
+            job.task.cancel()
+        elif job.status == "queued":
+            self.finish(job, "cancelled")
+
+    def finish(self, job: Job, status: str, **data) -> None:
+        job.status = status
+        if job.metrics:
+            self.totals.add({**job.metrics, "status": "ok" if status == "done" else "error"})
+        job.publish(status, {"status": status, **data})
+
+    async def worker(self) -> None:
+        while True:
+            job = await self.queue.get()
+            if job.status == "queued":
+                # Отдельная задача, чтобы отмена задания не останавливала воркер
+                job.task = asyncio.create_task(self.run(job))
+                try:
+                    await asyncio.wait([job.task])
+                finally:
+                    job.task.cancel()
+            self.queue.task_done()
+
+    async def run(self, job: Job) -> None:
+        from main import get_graph
+        from metrics import RunMetrics
+
+        graph = get_graph()
+        run_metrics = RunMetrics(graph)
+        config = {
+            "configurable": {
+                "thread_id": job.id,
+                # Без согласования оглавление принимается как есть, запросы идут с пакетным приоритетом
+                "interactive": job.review,
+                "outline_feedback": job.outline_feedback if job.review else None,
+            },
+            "callbacks": [run_metrics],
+        }
+        job.status = "running"
+        job.publish("status", {"status": job.status})
+
+        result: dict = {}
+        try:
+            async for namespace, mode, chunk in graph.astream(
+                {"topic": job.topic, "wishes": job.wishes},
+                config,
+                stream_mode=["updates", "messages", "custom", "values"],
+                subgraphs=True,
+            ):
+                if mode == "updates":
+                    path = [part.split(":")[0] for part in namespace]
+                    for node in chunk:
+                        job.publish("node", {"node": "/".join([*path, node])})
+                elif mode == "messages":
+                    message, metadata = chunk
+                    if "section_index" in metadata and message.content:
+                        job.publish(
+                            "token",
+                            {"section_index": metadata["section_index"], "text": message.content},
+                            history=False,
+                        )
+                elif mode == "custom" and "section_index" in chunk:
+                    job.publish("section", {"section_index": chunk["section_index"], "text": chunk["text"]})
+                elif mode == "values" and not namespace:
+                    result = chunk
+        except asyncio.CancelledError:
+            job.metrics = run_metrics.summary()
+            await self.forget(job)
+            self.finish(job, "cancelled")
+            raise
+        except Exception as error:
+            job.error = repr(error)
+            job.metrics = run_metrics.summary()
+            await self.forget(job)
+            self.finish(job, "failed", error=job.error)
+            return
+
+        job.article = result["article"]
+        job.metrics = run_metrics.summary()
+        await self.forget(job)
+        self.finish(job, "done", article=job.article)
+
+    async def forget(self, job: Job) -> None:
+        # Задания сервиса не продолжаются после завершения, их чекпоинты больше не нужны
+        from checkpoints import checkpointer
+        from topic_structure import outline_thread_id
+
+        for thread_id in (job.id, outline_thread_id(job.id)):
+            await checkpointer.adelete_thread(thread_id)
+
+    def prometheus(self) -> str:
+        from embeddings import embedding_service
+        from metrics import prometheus_text
+        from tool_cache import tool_cache
+
+        statuses = [job.status for job in self.jobs.values()]
+        lines = [
+            "# TYPE outlines_service_jobs gauge",
+            *(
+                f'outlines_service_jobs{{status="{status}"}} {statuses.count(status)}'
+                for status in ("queued", "running", "waiting_feedback")
+            ),
+        ]
+        return (
+            prometheus_text(self.totals, tool_cache.metrics(), embedding_service.metrics())
+            + "\n".join(lines)
+            + "\n"
+        )
+
+
+routes = web.RouteTableDef()
+service_key = web.AppKey("service", ArticleService)
+
+
+def bad_request(message: str) -> web.HTTPBadRequest:
+    return web.HTTPBadRequest(text=json.dumps({"error": message}), content_type="application/json")
+
+
+async def json_body(request: web.Request) -> dict:
+    try:
+        body = await request.json()
+    except ValueError:
+        raise bad_request("request body must be JSON") from None
+    if not isinstance(body, dict):
+        raise bad_request("request body must be a JSON object")
+    return body
+
+
+def get_job(request: web.Request) -> Job:
+    job = request.app[service_key].jobs.get(request.match_info["job_id"])
+    if job is None:
+        raise web.HTTPNotFound(text=json.dumps({"error": "job not found"}), content_type="application/json")
+    return job
+
+
+@routes.post("/jobs")
+async def create_job(request: web.Request) -> web.Response:
+    body = await json_body(request)
+    topic, wishes, review = body.get("topic"), body.get("wishes", ""), body.get("review", True)
+    if not isinstance(topic, str) or not topic.strip():
+        raise bad_request("topic is required and must be a non-empty string")
+    if not isinstance(wishes, str):
+        raise bad_request("wishes must be a string")
+    # Строка "false" не должна включать согласование оглавления
+    if not isinstance(review, bool):
+        raise bad_request("review must be true or false")
+
+    service = request.app[service_key]
+    job = Job(topic, wishes, review, service.feedback_timeout)
+    try:
+        service.submit(job)
+    except asyncio.QueueFull:
+        return web.json_response({"error": "queue is full"}, status=503, headers={"Retry-After": "30"})
+    return web.json_response({"id": job.id, "status": job.status}, status=202)
+
+
+@routes.get("/jobs/{job_id}")
+async def job_info(request: web.Request) -> web.Response:
+    return web.json_response(get_job(request).info())
+
+
+@routes.delete("/jobs/{job_id}")
+async def cancel_job(request: web.Request) -> web.Response:
+    job = get_job(request)
+    if job.status not in FINISHED:
+        request.app[service_key].cancel(job)
+    return web.json_response({"id": job.id, "status": job.status}, status=202)
+
+
+@routes.post("/jobs/{job_id}/feedback")
+async def outline_feedback(request: web.Request) -> web.Response:
+    # Правка оглавления, "done" - согласовать как есть; "!" в начале - составить заново
+    job = get_job(request)
+    if job.status != "waiting_feedback":
+        return web.json_response({"error": f"job is {job.status}, not waiting for feedback"}, status=409)
+    body = await json_body(request)
+    feedback = body.get("feedback")
+    if feedback is not None and not isinstance(feedback, str):
+        raise bad_request("feedback must be a string")
+    job.feedback.put_nowait(feedback or "done")
+    return web.json_response({"id": job.id, "status": job.status}, status=202)
+
+
+@routes.get("/jobs/{job_id}/events")
+async def job_events(request: web.Request) -> web.StreamResponse:
+    # Server-Sent Events: сначала история задания, затем события по мере появления
+    job = get_job(request)
+    response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+    await response.prepare(request)
+
+    queue: asyncio.Queue[tuple[str, dict]] = asyncio.Queue()
+    # Подписка и снимок истории без await между ними - ни одно событие не теряется и не дублируется
+    job.subscribers.add(queue)
+    for item in job.events:
+        queue.put_nowait(item)
+
+    try:
+        while True:
+            try:
+                event, data = await asyncio.wait_for(queue.get(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                await response.write(b": ping\n\n")
+                continue
+            await response.write(f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode())
+            if event in FINISHED:
+                break
+    finally:
+        job.subscribers.discard(queue)
+    return response
+
+
+@routes.get("/metrics")
+async def prometheus_metrics(request: web.Request) -> web.Response:
+    return web.Response(text=request.app[service_key].prometheus(), content_type="text/plain")
+
+
+def create_app(
+    workers: int, queue_size: int, keep_jobs: int = 1000, feedback_timeout: float = FEEDBACK_TIMEOUT_SECONDS
+) -> web.Application:
+    service = ArticleService(workers, queue_size, keep_jobs, feedback_timeout)
+    app = web.Application()
+    app[service_key] = service
+    app.add_routes(routes)
+    app.on_startup.append(service.start)
+    app.on_cleanup.append(service.stop)
+    return app
+
+
+@click.command()
+@click.option("--host", default="127.0.0.1", show_default=True)
+@click.option("--port", default=8080, show_default=True)
+@click.option("--workers", default=4, show_default=True, help="Сколько статей генерируется одновременно")
+@click.option("--queue-size", default=100, show_default=True, help="Сколько заданий может ждать в очереди")
+@click.option(
+    "--feedback-timeout",
+    default=FEEDBACK_TIMEOUT_SECONDS,
+    show_default=True,
+    help="Сколько секунд ждать правку оглавления, прежде чем принять его как есть",
+)
+@click.option("--fake", is_flag=True, help="Фейковые модели, поиск и эмбеддинги (без сети и ключей, для тестов)")
+def main(host: str, port: int, workers: int, queue_size: int, feedback_timeout: float, fake: bool):
+    """HTTP-сервис генерации статей: очередь заданий, SSE-поток прогресса и API правок оглавления."""
+    if fake:
+        # Настройки читаются при импорте settings, поэтому окружение задаётся до импорта графов
+        from benchmarks.pipeline import configure_environment, install_fakes
+
+        configure_environment(os.getenv("section_mode", "parallel"))
+        install_fakes(latency=0.05, response_chars=2000, tool_latency=0.05, tool_chars=3000, sections=5)
+
+    from main import warm_up
+
+    threading.Thread(target=warm_up, daemon=True).start()
+    web.run_app(create_app(workers, queue_size, feedback_timeout=feedback_timeout), host=host, port=port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import json
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Максимальное число секций, исследуемых одновременно в research_phase
+RESEARCH_CONCURRENCY = int(os.getenv("research_concurrency", "4"))
+
+# Начинать исследование секций в фоне, пока пользователь правит оглавление
+SPECULATIVE_RESEARCH = os.getenv("speculative_research", "false").lower() in ("1", "true", "yes")
+
+# Правка оглавления по пожеланиям: "patch" - модель возвращает только список правок к текущему
+# оглавлению, "full" - каждый раунд оглавление генерируется заново
+OUTLINE_EDIT_MODE = os.getenv("outline_edit_mode", "patch")
+
+# Режим планирования и написания секций: "parallel" - map-reduce ветки графа
+# на каждую секцию, "sequential" - последовательно с текстом предыдущей секции в контексте
+SECTION_MODE = os.getenv("section_mode", "parallel")
+
+# Модель эмбеддингов, общая для всех запусков графа в процессе
+EMBEDDING_MODEL = os.getenv("embedding_model", "all-MiniLM-L6-v2")
+EMBEDDING_BATCH_SIZE = int(os.getenv("embedding_batch_size", "64"))
+# Сколько миллисекунд ждать попутные запросы перед отправкой батча в модель
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("embedding_batch_window_ms", "10"))
+# Загружать модель эмбеддингов в фоне сразу при старте приложения
+EMBEDDING_WARMUP = os.getenv("embedding_warmup", "false").lower() in ("1", "true", "yes")
+
+# Каталог постоянного корпуса исследований; если не задан, корпус живёт в памяти одной статьи
+RESEARCH_CORPUS_DIR = os.getenv("research_corpus_dir") or None
+RESEARCH_CORPUS_MAX_DOCUMENTS = int(os.getenv("research_corpus_max_documents", "50000"))
+RESEARCH_CORPUS_MAX_AGE_DAYS = float(os.getenv("research_corpus_max_age_days", "30"))
+
+# Размер фрагмента исследовательских данных для индексации, в символах
+PASSAGE_SIZE = int(os.getenv("passage_size", "1000"))
+PASSAGE_OVERLAP = int(os.getenv("passage_overlap", "100"))
+# Сколько связанных фрагментов из других секций добавлять к данным секции
+RELATED_PASSAGES = int(os.getenv("related_passages", "3"))
+
+# Бэкенд поиска по фрагментам: "numpy" - индекс в памяти на одну статью,
+# "chroma" - для больших и постоянных корпусов (по умолчанию при заданном research_corpus_dir)
+RETRIEVER_BACKEND = os.getenv("retriever_backend", "chroma" if RESEARCH_CORPUS_DIR else "numpy")
+# Вес BM25 в гибридной оценке numpy-бэкенда, 0 - только косинусная близость
+RETRIEVER_HYBRID_WEIGHT = float(os.getenv("retriever_hybrid_weight", "0"))
+
+# Кеш результатов поиска DuckDuckGo и Wikipedia; пустой путь - кеш только в памяти процесса
+TOOL_CACHE_PATH = os.getenv("tool_cache_path", ".cache/tools.sqlite3")
+TOOL_CACHE_TTL_HOURS = float(os.getenv("tool_cache_ttl_hours", "24"))
+TOOL_CACHE_MAX_ENTRIES = int(os.getenv("tool_cache_max_entries", "10000"))
+
+# Асинхронный поиск по Wikipedia: адрес MediaWiki API (можно указать локальную заглушку),
+# число страниц из выдачи и максимальная длина текста каждой страницы
+WIKIPEDIA_API_URL = os.getenv("wikipedia_api_url", "https://en.wikipedia.org/w/api.php")
+WIKIPEDIA_TOP_K = int(os.getenv("wikipedia_top_k", "5"))
+WIKIPEDIA_PAGE_CHARS = int(os.getenv("wikipedia_page_chars", "2000"))
+WIKIPEDIA_TIMEOUT = float(os.getenv("wikipedia_timeout", "10"))
+
+# Постоянный кеш ответов llm и think_llm (включается заданием пути) и его размер в мегабайтах
+LLM_CACHE_PATH = os.getenv("llm_cache_path", "")
+LLM_CACHE_MAX_MB = float(os.getenv("llm_cache_max_mb", "256"))
+
+# Глобальные ограничения одновременных обращений к моделям и к внешним инструментам поиска
+LLM_CONCURRENCY = int(os.getenv("llm_concurrency", "8"))
+TOOL_CONCURRENCY = int(os.getenv("tool_concurrency", "4"))
+
+# Лимиты аккаунта OpenAI: запросов и токенов в минуту (0 - без ограничения)
+LLM_RPM = float(os.getenv("llm_rpm", "0"))
+LLM_TPM = float(os.getenv("llm_tpm", "0"))
+# Ожидаемая длина ответа для оценки расхода токенов до запроса, если max_tokens не задан
+LLM_EXPECTED_COMPLETION_TOKENS = int(os.getenv("llm_expected_completion_tokens", "1000"))
+# Целевая задержка ответа в секундах: при превышении параллелизм снижается (0 - не учитывать)
+LLM_TARGET_LATENCY = float(os.getenv("llm_target_latency", "0"))
+# Повторы при 429, таймаутах и 5xx: число попыток и границы экспоненциальной задержки
+LLM_MAX_RETRIES = int(os.getenv("llm_max_retries", "6"))
+LLM_BACKOFF_BASE = float(os.getenv("llm_backoff_base", "1"))
+LLM_BACKOFF_MAX = float(os.getenv("llm_backoff_max", "60"))
+
+# Пул OpenAI-совместимых бэкендов (Ollama, vLLM, OpenAI) в виде JSON-списка; пусто - только OpenAI
+# с ключом openai_key. models - какие модели обслуживает бэкенд и под каким именем
+# (без models - любые), max_concurrency - его собственный предел одновременных запросов:
+# [{"name": "box1", "base_url": "http://box1:11434/v1", "api_key": "ollama",
+#   "models": {"gpt-4o-mini": "mistral-nemo"}, "max_concurrency": 4}]
+LLM_BACKENDS = json.loads(os.getenv("llm_backends", "") or "[]")
+# Закрепление моделей за узлами графа, JSON: {"write_section": "mistral-nemo"}
+LLM_NODE_MODELS = json.loads(os.getenv("llm_node_models", "") or "{}")
+# Период проверки здоровья бэкендов и сколько секунд не слать запросы на упавший бэкенд
+LLM_HEALTH_CHECK_INTERVAL = float(os.getenv("llm_health_check_interval", "30"))
+LLM_BACKEND_COOLDOWN = float(os.getenv("llm_backend_cooldown", "30"))
+
+# Мемоизация исследования, плана и текста секций между запусками (включается заданием пути,
+# например .cache/sections.sqlite3): повторный запуск статьи пересчитывает только изменившиеся секции
+SECTION_CACHE_PATH = os.getenv("section_cache_path", "")
+SECTION_CACHE_TTL_HOURS = float(os.getenv("section_cache_ttl_hours", "168"))
+SECTION_CACHE_MAX_ENTRIES = int(os.getenv("section_cache_max_entries", "20000"))
+
+# Постоянные чекпоинты графов: прерванный запуск продолжается по thread_id (python resume.py <thread_id>)
+CHECKPOINT_PATH = os.getenv("checkpoint_path", ".cache/checkpoints.sqlite3")
+# Потоки чекпоинтов без записей дольше этого срока удаляются (0 - хранить всегда)
+CHECKPOINT_MAX_AGE_DAYS = float(os.getenv("checkpoint_max_age_days", "7"))
+
+# Бюджеты токенов исследовательских данных в промптах планирования и написания секции
+# и конца предыдущей секции в последовательном режиме
+PLANNING_CONTEXT_TOKENS = int(os.getenv("planning_context_tokens", "3000"))
+WRITING_CONTEXT_TOKENS = int(os.getenv("writing_context_tokens", "4000"))
+PREVIOUS_CONTEXT_TOKENS = int(os.getenv("previous_context_tokens", "1000"))
+# Бюджет скользящего краткого содержания уже написанных разделов в последовательном режиме:
+# контекст секции не растёт с длиной статьи
+ROLLING_SUMMARY_TOKENS = int(os.getenv("rolling_summary_tokens", "500"))
+# Отбор фрагментов по MMR: 0 - только релевантность, 1 - только разнообразие;
+# фрагменты с косинусной близостью выше порога к уже выбранным считаются дубликатами
+CONTEXT_MMR_DIVERSITY = float(os.getenv("context_mmr_diversity", "0.3"))
+CONTEXT_NEAR_DUPLICATE = float(os.getenv("context_near_duplicate", "0.95"))
+# Скачивать словарь токенизатора tiktoken, если его нет в локальном кеше; без этого
+# и без кеша длина текста в токенах оценивается приблизительно, без обращения к сети
+TOKENIZER_DOWNLOAD = os.getenv("tokenizer_download", "false").lower() in ("1", "true", "yes")
@@ -0,0 +1,68 @@
+import asyncio
+import hashlib
+import logging
+from collections import Counter
+from typing import Awaitable, Callable
+
+from limits import research_slots
+from models import Section
+from scheduler import PRIORITY_BATCH
+
+logger = logging.getLogger(__name__)
+
+Research = Callable[..., Awaitable[dict]]
+
+
+def section_key(section: Section) -> str:
+    return hashlib.sha256(f"{section.section_title}\x00{section.content}".encode()).hexdigest()
+
+
+class ResearchSpeculator:
+    # Исследование секций, пока пользователь правит оглавление: после каждого раунда правок
+    # для секций текущего оглавления запускается исследование в фоне. Работа привязана к потоку
+    # статьи и ключу секции (название + описание): секции, дожившие до итогового оглавления,
+    # забирает research_phase, исчезнувшие из оглавления отменяются.
+    # Запросы к моделям идут с пакетным приоритетом и не тормозят саму правку оглавления,
+    # а слоты исследования общие с research_phase той же статьи (limits.research_slots).
+    def __init__(self) -> None:
+        self.stats: Counter[str] = Counter()
+        self._tasks: dict[str, dict[str, asyncio.Task]] = {}
+
+    def update(self, scope: str, topic: str, sections: list[Section], research: Research) -> None:
+        semaphore = research_slots(scope)
+        tasks = self._tasks.setdefault(scope, {})
+        current = {section_key(section): section for section in sections}
+        for key in set(tasks) - set(current):
+            tasks.pop(key).cancel()
+            self.stats["cancelled"] += 1
+
+        config = {"configurable": {"priority": PRIORITY_BATCH}}
+        for key, section in current.items():
+            if key not in tasks:
+                tasks[key] = asyncio.create_task(research(topic, section, semaphore, config))
+                self.stats["started"] += 1
+
+    async def take(self, scope: str, section: Section) -> dict | None:
+        # Результат заранее начатого исследования секции или None, если его нет или оно упало
+        task = self._tasks.get(scope, {}).pop(section_key(section), None)
+        if task is None:
+            return None
+        try:
+            result = await task
+        except Exception as error:
+            self.stats["failed"] += 1
+            logger.warning("Speculative research failed for section %r: %s", section.section_title, error)
+            return None
+        self.stats["reused"] += 1
+        return result
+
+    def discard(self, scope: str) -> None:
+        for task in self._tasks.pop(scope, {}).values():
+            task.cancel()
+            self.stats["cancelled"] += 1
+
+    def metrics(self) -> dict:
+        return dict(self.stats)
+
+
+research_speculator = ResearchSpeculator()
@@ -0,0 +1,118 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+
+class SQLiteStore:
+    # Общее хранилище кешей (инструменты, ответы моделей, мемоизация секций): таблица
+    # "область, ключ -> значение" в SQLite с TTL и вытеснением давно не использованных
+    # записей сверх лимита числа записей или суммарного размера.
+    # База открывается при первом обращении, а не при импорте модуля кеша.
+    def __init__(
+        self,
+        path: str,
+        table: str,
+        ttl_seconds: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+    ) -> None:
+        self.path = path
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+    @property
+    def _connection(self) -> sqlite3.Connection:
+        # Вызывается под self._lock
+        if self._db is None:
+            if self.path != ":memory:" and os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    scope TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    PRIMARY KEY (scope, key)
+                )
+                """
+            )
+            connection.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.table}_accessed ON {self.table} (accessed_at)"
+            )
+            connection.commit()
+            self._db = connection
+        return self._db
+
+    def get(self, scope: str, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                f"SELECT value, created_at FROM {self.table} WHERE scope = ? AND key = ?",
+                (scope, key),
+            ).fetchone()
+            if row is None:
+                return None
+
+            value, created_at = row
+            if self.ttl_seconds is not None and now - created_at > self.ttl_seconds:
+                self._connection.execute(f"DELETE FROM {self.table} WHERE scope = ? AND key = ?", (scope, key))
+                self._connection.commit()
+                return None
+
+            self._connection.execute(
+                f"UPDATE {self.table} SET accessed_at = ? WHERE scope = ? AND key = ?",
+                (now, scope, key),
+            )
+            self._connection.commit()
+            return value
+
+    def put(self, scope: str, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?, ?, ?, ?)",
+                (scope, key, value, len(value.encode()), now, now),
+            )
+            self._evict()
+            self._connection.commit()
+
+    def _evict(self) -> None:
+        # Вытесняем давно не использованные записи сверх лимитов
+        if self.max_entries is not None:
+            self._connection.execute(
+                f"""
+                DELETE FROM {self.table} WHERE rowid IN (
+                    SELECT rowid FROM {self.table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            )
+
+        if self.max_bytes is not None:
+            (total,) = self._connection.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()
+            if total <= self.max_bytes:
+                return
+            rows = self._connection.execute(f"SELECT rowid, size FROM {self.table} ORDER BY accessed_at").fetchall()
+            stale = []
+            for rowid, size in rows:
+                if total <= self.max_bytes:
+                    break
+                stale.append((rowid,))
+                total -= size
+            self._connection.executemany(f"DELETE FROM {self.table} WHERE rowid = ?", stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection.execute(f"DELETE FROM {self.table}")
+            self._connection.commit()
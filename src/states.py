@@ -1,13 +1,18 @@
+from dataclasses import dataclass, field
+
 from langgraph.graph import add_messages
 from typing_extensions import Annotated, TypedDict
 
-from models import SectionsList
+from models import Section, SectionsList
 
 
 class ArticleState(TypedDict):
     topic: str
     wishes: str
     sections: list[str]
+    # Согласованное оглавление: sections после написания хранит тексты листьев,
+    # а заголовки разделов при сборке статьи берутся отсюда
+    outline: list[Section]
     article: str
 
 
@@ -15,13 +20,50 @@ class OutlineState(TypedDict):
     topic: str
     wishes: Annotated[list[str], add_messages]
     sections: SectionsList
+    # Пожелание последнего раунда правок - по нему оглавление правится точечно
+    feedback: str
+    # Пожелания, уже учтённые в оглавлении до последнего раунда правок
+    previous_wishes: list[str]
+
+
+def merge_by_index(left: list[dict], right: list[dict]) -> list[dict]:
+    # Результаты параллельных веток объединяются по номеру секции,
+    # повторная запись той же секции заменяет предыдущую
+    merged = {item["index"]: item for item in left or []}
+    merged.update((item["index"], item) for item in right or [])
+    return [merged[index] for index in sorted(merged)]
+
+
+@dataclass(slots=True)
+class ResearchRecord:
+    # Исследование листа оглавления в состоянии графа. Сырые данные нужны только до разбиения
+    # на фрагменты в vector_store_node, дальше запись несёт лишь фрагменты в порядке MMR.
+    # outline_context - описания родительских разделов, depth - глубина листа в оглавлении
+    section_title: str
+    description: str
+    research_data: str = ""
+    passages: list[str] = field(default_factory=list)
+    outline_context: str = ""
+    depth: int = 0
 
 
 class ContentGenerationState(TypedDict):
     topic: str
     wishes: str
     sections: SectionsList
-    messages: Annotated[list, add_messages]
-    research_results: list[dict[str, str]]
-    plans: list[dict[str, str]]
+    research_results: list[ResearchRecord]
+    plans: Annotated[list[dict], merge_by_index]
+    drafts: Annotated[list[dict], merge_by_index]
     writer_role: str
+
+
+class SectionTask(TypedDict, total=False):
+    topic: str
+    index: int
+    section_title: str
+    description: str
+    passages: list[str]
+    plan: str
+    context: str
+    role: str
+    depth: int
@@ -0,0 +1,84 @@
+import asyncio
+from collections import Counter
+from typing import Awaitable, Callable
+
+from settings import TOOL_CACHE_MAX_ENTRIES, TOOL_CACHE_PATH, TOOL_CACHE_TTL_HOURS
+from sqlite_store import SQLiteStore
+
+
+def normalize_query(query: str) -> str:
+    # Запросы, отличающиеся регистром, пробелами и знаками в конце, считаются одинаковыми
+    return " ".join(query.lower().split()).strip(" ?!.,;:\"'")
+
+
+class ToolCache:
+    # Кеш результатов инструментов на диске (SQLite) с TTL и LRU-ограничением размера.
+    # Одинаковые запросы, выполняющиеся одновременно, схлопываются в один внешний запрос.
+    def __init__(self, path: str, ttl_seconds: float, max_entries: int) -> None:
+        self.hits: Counter[str] = Counter()
+        self.misses: Counter[str] = Counter()
+        self.coalesced: Counter[str] = Counter()
+
+        self._store = SQLiteStore(path, "tool_results", ttl_seconds=ttl_seconds, max_entries=max_entries)
+        self._inflight: dict[tuple[str, str], asyncio.Task] = {}
+
+    def get(self, namespace: str, query: str) -> str | None:
+        return self._store.get(namespace, query)
+
+    def put(self, namespace: str, query: str, result: str) -> None:
+        self._store.put(namespace, query, result)
+
+    async def get_or_fetch(
+        self, namespace: str, query: str, fetch: Callable[[], Awaitable[str]]
+    ) -> str:
+        key = (namespace, normalize_query(query))
+
+        if key not in self._inflight:
+            cached = await asyncio.to_thread(self.get, *key)
+            if cached is not None:
+                self.hits[namespace] += 1
+                return cached
+
+        # Пока шли в кеш, такой же запрос мог уже уйти наружу
+        if key in self._inflight:
+            self.coalesced[namespace] += 1
+        else:
+            self.misses[namespace] += 1
+            task = asyncio.create_task(self._fetch(key, fetch))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+
+        # Запрос выполняет задача кеша, а не тот, кто пришёл первым: отмена любого
+        # из ожидающих (фоновое исследование, отменённое задание сервиса) не отменяет
+        # запрос для остальных, а результат всё равно попадёт в кеш
+        return await asyncio.shield(self._inflight[key])
+
+    async def _fetch(self, key: tuple[str, str], fetch: Callable[[], Awaitable[str]]) -> str:
+        result = str(await fetch())
+        await asyncio.to_thread(self.put, *key, result)
+        return result
+
+    def _finish(self, key: tuple[str, str], task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Ошибку получат только ожидающие этого запроса; без них она не должна логироваться
+        if not task.cancelled():
+            task.exception()
+
+    def metrics(self) -> dict:
+        namespaces = set(self.hits) | set(self.misses) | set(self.coalesced)
+        return {
+            namespace: {
+                "hits": self.hits[namespace],
+                "misses": self.misses[namespace],
+                "coalesced": self.coalesced[namespace],
+            }
+            for namespace in sorted(namespaces)
+        }
+
+
+tool_cache = ToolCache(
+    TOOL_CACHE_PATH or ":memory:",
+    ttl_seconds=TOOL_CACHE_TTL_HOURS * 60 * 60,
+    max_entries=TOOL_CACHE_MAX_ENTRIES,
+)
@@ -1,33 +1,48 @@
+import asyncio
 import warnings
 
 from langchain.tools import Tool, tool
 from langchain_community.tools import DuckDuckGoSearchResults
-from langchain_community.tools.wikipedia.tool import WikipediaQueryRun
-from langchain_community.utilities import WikipediaAPIWrapper
+
+from limits import tool_slots
+from tool_cache import tool_cache
+from wikipedia_client import wikipedia
 
 warnings.catch_warnings()
 warnings.simplefilter("ignore")
 
+duckduckgo = DuckDuckGoSearchResults(num_results=5)
+
 
 @tool
 async def search_engine(query: str):
     """Search engine to the internet"""
-    search = DuckDuckGoSearchResults(num_results=5)
-    return await search.arun(query)
+
+    async def fetch():
+        async with tool_slots:
+            return await duckduckgo.arun(query)
+
+    return await tool_cache.get_or_fetch("duckduckgo", query, fetch)
+
+
+async def wikipedia_search(query: str) -> str:
+    async def fetch():
+        async with tool_slots:
+            return await wikipedia.run(query)
+
+    return await tool_cache.get_or_fetch("wikipedia", query, fetch)
 
 
 wikipedia_tool = Tool(
     name="Wikipedia",
-    func=WikipediaQueryRun(
-        api_wrapper=WikipediaAPIWrapper(top_k_results=5)  # type: ignore
-    ).run,
+    func=None,
+    coroutine=wikipedia_search,
     description="Поиск по Wikipedia",
     # verbose=True,
 )
 
 
 if __name__ == "__main__":
-    import asyncio
     from pprint import pprint
 
     async def main():
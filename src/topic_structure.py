@@ -1,19 +1,155 @@
 import asyncio
+import logging
 import uuid
 
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnableConfig
 from langchain_core.runnables import chain as as_runnable
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import END, START, StateGraph
 from langgraph.types import Command, interrupt
 
+from checkpoints import checkpointer
 from llms import think_llm
-from models import SectionsList
+from models import GeneratedOutline, OutlineEdits, SectionsList, outline_leaves, walk_outline
+from settings import OUTLINE_EDIT_MODE, SPECULATIVE_RESEARCH
+from speculation import research_speculator
 from states import OutlineState
 
+logger = logging.getLogger(__name__)
+
+
+outline_prompt = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            """
+            Вы - экспертный технический редактор. Ваша задача — **создать список тем и подтем** для статьи.
+
+            Этап 1: определене типа запроса
+            По заданной пользователем названию статьи и его пожеланиям (если они есть), определите его тип по
+            следующим критериям:
+             - Исследовательская статья: широкая тема, требующего всестороннего освещения, введения в предметную
+             область, объяснения базовых концепций
+             - Фактический: конкретный вопрос, требующий прямого ответа, технической информации или пошаговых инструкций.
+
+            Этап 2: создание структуры
+            В зависимости от определенного типа запроса:
+
+            Если статья **исследовательская**:
+            - Пользователь скорее всего ничего о ней не знает, поэтому ему нужны те знания, которые введут его в курс дела
+            - Составте список из 5-8 логически связанных подтем.
+            - Начните с базовых концепций, постепенно переходя к более сложным.
+            - Фокусируйтесь на основных аспектах темы.
+            - Не нужно переходить к узким темам. Важнее дать общее понимание. Узкие темы пользователь раскроет другим запросом
+
+            Если вопрос **фактический**:
+            - Составте список из 3-5 конкретных подтем, напрямую отвечающих на вопрос.
+            - Избегайте общих введений, фокусируйтесь на сути вопроса.
+            - Если вопрос технический, включите подтему с практическими примерами.
+            - Не нужно добавлять введение и заключение - пользователя интересует только ответ на вопрос.
+
+            Этап 3: рекомендации для дальнейшего изучения
+            Всегда добавляйте финальную подтему "Рекомендации для дальнейшего изучения", включающую:
+            - 5-10 связыных тем или вопросов для углубления и раскрытия знаний.
+            - конкретные формулировки запросов, которые пользователь может использовать.
+            - Ссылки на авторитетные рессурсы (документация, книги, ресурсы интернета)
+
+            Общие требования:
+            🔹 Удалите подтемы, которые пользователь считает ненужными.
+            🔹 Добавьте те подтемы, предложеныные в пожеланиях пользователя.
+            🔹 НЕ дублируйте подтемы, если они уже есть.
+            🔹 Структурируйте их так, чтобы они плавно раскрывали тему.
+            🔹 Напишите название подтемы и очень подробное описание того, что будет в этой подтеме.
+            Это должны быть четкие указания для редактора-исполнителя, который будет писать эту часть статьи.
+            🔹 Для каждой подтемы предоставьте детальное описание содержания и рекомендации по написанию подтемы
+            (не менее 2-3 предложений) - по этому описанию и рекомендациям будет написана собственно статья другим редактором.
+            🔹 Используйте технически точную терминологию.
+            🔹 Для объёмной статьи большую подтему разбейте на подсекции (subsections) с такими же
+            заголовками и подробными описаниями; подсекции можно вкладывать не глубже трёх уровней. Текст пишется
+            отдельно для каждой подтемы без подсекций, а описание раздела с подсекциями задаёт их общую линию.
+
+
+            **Тема статьи:** {topic}
+            **Прошлые подтемы:** {sections}
+            **Пожелания пользователя:** {wishes}
+            """,
+        ),
+        ("user", "Обновите список подтем согласно указанным пожеланиям."),
+    ]
+)
+
+outline_patch_prompt = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            """
+            Вы - экспертный технический редактор. Пользователь просматривает оглавление статьи
+            и просит его поправить. **Не переписывайте оглавление целиком** - верните только список
+            правок, которые нужно применить к текущему оглавлению:
+             - add: новая подтема с заголовком и подробным описанием (не менее 2-3 предложений),
+             after - номер подтемы, после которой её поставить (0 - в начало, пусто - в конец);
+             - remove: удалить подтему с номером index;
+             - rename: новый заголовок подтемы index;
+             - rewrite: новое подробное описание подтемы index;
+             - move: переставить подтему index после подтемы after (0 - в начало).
+            Подтема встаёт на тот же уровень, что и подтема after. Чтобы добавить или перенести
+            подтему в подсекции раздела, укажите его номер в parent и не указывайте after.
+
+            Номера подтем - как в текущем оглавлении, до применения правок; подсекции нумеруются
+            сквозь вместе с разделами и показаны с отступом. Удаление раздела удаляет и его подсекции.
+            Меняйте только то, чего касается новое пожелание; если менять ничего не нужно,
+            верните пустой список правок. Прошлые пожелания уже учтены в оглавлении.
+
+            **Тема статьи:** {topic}
+            **Текущее оглавление:**
+            {sections}
+            **Прошлые пожелания:** {wishes}
+            """,
+        ),
+        ("user", "{feedback}"),
+    ]
+)
+
+# Промпты и цепочки собираются один раз при импорте, а не на каждый раунд правок
+outline_chain = (
+    outline_prompt | think_llm.with_structured_output(GeneratedOutline) | GeneratedOutline.to_outline
+)
+outline_patch_chain = outline_patch_prompt | think_llm.with_structured_output(OutlineEdits)
+
+
+def numbered_sections(outline: SectionsList) -> str:
+    return "\n".join(
+        f"{'    ' * depth}[{i}] {section.section_title}: {section.content}"
+        for i, (depth, section) in enumerate(walk_outline(outline.sections), start=1)
+    )
+
+
+async def patch_outline(state: OutlineState) -> SectionsList | None:
+    # Точечная правка: модель возвращает короткий список правок вместо всего оглавления.
+    # Если правки не применяются к оглавлению, раунд выполняется полной генерацией
+    outline = SectionsList.model_validate(state["sections"])
+    edits = await outline_patch_chain.ainvoke(
+        {
+            "topic": state["topic"],
+            "sections": numbered_sections(outline),
+            "wishes": "\n".join(state.get("previous_wishes", [])) or "нет",
+            "feedback": state["feedback"],
+        }
+    )
+    try:
+        return edits.apply(outline)
+    except ValueError as error:
+        logger.warning("Outline edits do not apply, regenerating the outline: %s", error)
+        return None
+
 
 async def generate_outline(state: OutlineState):
+    # Первый раунд и пожелания с "!" в начале - полная генерация оглавления, остальные раунды
+    # в режиме outline_edit_mode = "patch" - точечные правки
+    if OUTLINE_EDIT_MODE == "patch" and state.get("sections") and state.get("feedback"):
+        sections = await patch_outline(state)
+        if sections is not None:
+            return {"sections": sections, "wishes": state["wishes"]}
 
     topic = state["topic"]
     wishes = (
@@ -27,66 +163,7 @@ async def generate_outline(state: OutlineState):
         else "no sections"
     )
 
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            (
-                "system",
-                """
-                Вы - экспертный технический редактор. Ваша задача — **создать список тем и подтем** для статьи.
-
-                Этап 1: определене типа запроса
-                По заданной пользователем названию статьи и его пожеланиям (если они есть), определите его тип по
-                следующим критериям:
-                 - Исследовательская статья: широкая тема, требующего всестороннего освещения, введения в предметную
-                 область, объяснения базовых концепций
-                 - Фактический: конкретный вопрос, требующий прямого ответа, технической информации или пошаговых инструкций.
-
-                Этап 2: создание структуры
-                В зависимости от определенного типа запроса:
-
-                Если статья **исследовательская**:
-                - Пользователь скорее всего ничего о ней не знает, поэтому ему нужны те знания, которые введут его в курс дела
-                - Составте список из 5-8 логически связанных подтем.
-                - Начните с базовых концепций, постепенно переходя к более сложным.
-                - Фокусируйтесь на основных аспектах темы.
-                - Не нужно переходить к узким темам. Важнее дать общее понимание. Узкие темы пользователь раскроет другим запросом
-
-                Если вопрос **фактический**:
-                - Составте список из 3-5 конкретных подтем, напрямую отвечающих на вопрос.
-                - Избегайте общих введений, фокусируйтесь на сути вопроса.
-                - Если вопрос технический, включите подтему с практическими примерами.
-                - Не нужно добавлять введение и заключение - пользователя интересует только ответ на вопрос.
-
-                Этап 3: рекомендации для дальнейшего изучения
-                Всегда добавляйте финальную подтему "Рекомендации для дальнейшего изучения", включающую:
-                - 5-10 связыных тем или вопросов для углубления и раскрытия знаний.
-                - конкретные формулировки запросов, которые пользователь может использовать.
-                - Ссылки на авторитетные рессурсы (документация, книги, ресурсы интернета)
-
-                Общие требования:
-                🔹 Удалите подтемы, которые пользователь считает ненужными.
-                🔹 Добавьте те подтемы, предложеныные в пожеланиях пользователя.
-                🔹 НЕ дублируйте подтемы, если они уже есть.
-                🔹 Структурируйте их так, чтобы они плавно раскрывали тему.
-                🔹 Напишите название подтемы и очень подробное описание того, что будет в этой подтеме.
-                Это должны быть четкие указания для редактора-исполнителя, который будет писать эту часть статьи.
-                🔹 Для каждой подтемы предоставьте детальное описание содержания и рекомендации по написанию подтемы
-                (не менее 2-3 предложений) - по этому описанию и рекомендациям будет написана собственно статья другим редактором.
-                🔹 Используйте технически точную терминологию.
-
-
-                **Тема статьи:** {topic}
-                **Прошлые подтемы:** {sections}
-                **Пожелания пользователя:** {wishes}
-                """,
-            ),
-            ("user", "Обновите список подтем согласно указанным пожеланиям."),
-        ]
-    )
-
-    generate_outline_chain = prompt | think_llm.with_structured_output(SectionsList)
-
-    sections = await generate_outline_chain.ainvoke(
+    sections = await outline_chain.ainvoke(
         {"topic": topic, "sections": prev_sections, "wishes": wishes}
     )
 
@@ -98,10 +175,11 @@ async def display_sections(state: OutlineState):
     sections = SectionsList.model_validate(state["sections"]).sections
 
     print("\nТекущий список подтем:")
-    for i, section in enumerate(sections, start=1):
-        print(f"[{i}] {section.section_title.capitalize()}:\n\t{section.content}")
+    for i, (depth, section) in enumerate(walk_outline(sections), start=1):
+        indent = "\t" * depth
+        print(f"{indent}[{i}] {section.section_title.capitalize()}:\n{indent}\t{section.content}")
 
-    return state
+    return {}
 
 
 async def process_user_feedback(state: OutlineState):
@@ -116,27 +194,39 @@ async def process_user_feedback(state: OutlineState):
     if user_feedback.lower() == "done":
         return Command(update={"wishes": state["wishes"]}, goto=END)
 
+    # "!" в начале пожелания просит составить оглавление заново, а не править точечно
+    regenerate = user_feedback.startswith("!")
+    user_feedback = user_feedback.removeprefix("!").strip()
+
+    # Точечная правка получает пожелания, которые оглавление уже учитывает, отдельно от нового.
+    # Пожелания в состоянии - сообщения (add_messages), сравниваются их тексты
+    previous_wishes = [getattr(item, "content", str(item)) for item in state["wishes"]]
     new_wishes = (
         state["wishes"] + [user_feedback]
-        if user_feedback not in state["wishes"]
+        if user_feedback not in previous_wishes
         else state["wishes"]
     )
 
     return Command(
-        update={"wishes": new_wishes},
+        update={
+            "wishes": new_wishes,
+            "feedback": "" if regenerate else user_feedback,
+            "previous_wishes": previous_wishes,
+        },
         goto="generate_outline",
     )
 
 
 async def finalize_outline(state: OutlineState):
     print("\nFinal node and finished values:")
-    for i, section in enumerate(state["sections"].sections, start=1):
-        print(f"[{i}] {section.section_title}\n\t{section.content}")
+    for i, (depth, section) in enumerate(walk_outline(state["sections"].sections), start=1):
+        indent = "\t" * depth
+        print(f"{indent}[{i}] {section.section_title}\n{indent}\t{section.content}")
 
     return Command(goto=END)
 
 
-def get_graph():
+def get_graph(checkpointer=checkpointer):
     graph_builder = StateGraph(OutlineState)
 
     graph_builder.add_node("generate_outline", generate_outline)
@@ -150,33 +240,77 @@ def get_graph():
 
     graph_builder.set_finish_point("finalize_outline")
 
-    checkpointer = MemorySaver()
-
     return graph_builder.compile(checkpointer=checkpointer)
 
 
+# Граф компилируется один раз; запуски различаются только thread_id
+graph = get_graph()
+
+
+def outline_thread_id(article_thread: str) -> str:
+    # Поток оглавления привязан к потоку статьи, поэтому его согласование тоже возобновляется
+    return f"{article_thread}:outline"
+
+
 @as_runnable
-async def sections_generator(state: OutlineState):
-    config = RunnableConfig(configurable={"thread_id": uuid.uuid4()})
-
-    graph = get_graph()
-
-    async for chunk in graph.astream(
-        {"topic": state["topic"], "wishes": state["wishes"]},
-        config,
-        stream_mode="updates",
-    ):
-        if "__interrupt__" in chunk:
-            while True:
+async def sections_generator(state: OutlineState, config: RunnableConfig):
+    # В пакетном режиме (configurable.interactive = False) оглавление принимается без вопросов
+    interactive = config.get("configurable", {}).get("interactive", True)
+    # Вместо консоли правки оглавления может присылать вызывающий код (HTTP-сервис):
+    # configurable.outline_feedback - async-функция, получающая оглавление и возвращающая правку
+    outline_feedback = config.get("configurable", {}).get("outline_feedback")
+    article_thread = config.get("configurable", {}).get("thread_id")
+    # Колбэки (RunMetrics) передаются дальше, чтобы узлы оглавления тоже попали в телеметрию
+    thread_config = RunnableConfig(
+        configurable={
+            "thread_id": outline_thread_id(article_thread) if article_thread else str(uuid.uuid4()),
+            # По нему планировщик моделей отличает интерактивную правку от пакетного режима
+            "interactive": interactive,
+        },
+        callbacks=config.get("callbacks"),
+    )
+
+    # Исследование секций идёт в фоне, пока пользователь читает оглавление и думает над правками
+    speculate = SPECULATIVE_RESEARCH and interactive and article_thread is not None
+    if speculate:
+        from content_generator import research_section
+
+    snapshot = await graph.aget_state(thread_config)
+    if not snapshot.values:
+        await graph.ainvoke({"topic": state["topic"], "wishes": state["wishes"]}, thread_config)
+        snapshot = await graph.aget_state(thread_config)
+
+    while snapshot.next:
+        if speculate and "sections" in snapshot.values:
+            leaves = outline_leaves(SectionsList.model_validate(snapshot.values["sections"]).sections)
+            research_speculator.update(
+                article_thread, state["topic"], [leaf.section for leaf in leaves], research_section
+            )
+        if not any(task.interrupts for task in snapshot.tasks):
+            # Прошлый запуск оборвался посреди узла - продолжаем с последнего чекпоинта
+            await graph.ainvoke(None, thread_config)
+        else:
+            if outline_feedback is not None:
+                user_feedback = await outline_feedback(SectionsList.model_validate(snapshot.values["sections"]))
+            elif interactive:
                 user_feedback = await asyncio.get_event_loop().run_in_executor(
-                    None, input, ">>> Дополните свои пожелания: "
+                    None, input, ">>> Дополните свои пожелания ('!' в начале - составить оглавление заново): "
                 )
-                await graph.ainvoke(Command(resume=user_feedback), config)
-
-                if user_feedback.lower() == "done":
-                    break
+            else:
+                user_feedback = "done"
+            await graph.ainvoke(Command(resume=user_feedback), thread_config)
+        snapshot = await graph.aget_state(thread_config)
+
+    outline = SectionsList.model_validate(snapshot.values["sections"])
+    if speculate:
+        # Исследование секций, не вошедших в итоговое оглавление, отменяется
+        leaves = outline_leaves(outline.sections)
+        research_speculator.update(
+            article_thread, state["topic"], [leaf.section for leaf in leaves], research_section
+        )
 
-    return graph.get_state(config).values["sections"]
+    # sections перезапишут тексты листьев, а оглавление для заголовков статьи остаётся в outline
+    return {"sections": outline.sections, "outline": outline.sections}
 
 
 if __name__ == "__main__":
@@ -0,0 +1,92 @@
+import asyncio
+import contextlib
+import logging
+
+import httpx
+
+from settings import (
+    WIKIPEDIA_API_URL,
+    WIKIPEDIA_PAGE_CHARS,
+    WIKIPEDIA_TIMEOUT,
+    WIKIPEDIA_TOP_K,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncWikipedia:
+    # Асинхронный поиск по Wikipedia через MediaWiki API: один пул соединений
+    # на процесс, страницы из выдачи загружаются параллельно и обрезаются до page_chars
+    def __init__(
+        self,
+        api_url: str = WIKIPEDIA_API_URL,
+        top_k: int = WIKIPEDIA_TOP_K,
+        page_chars: int = WIKIPEDIA_PAGE_CHARS,
+        timeout: float = WIKIPEDIA_TIMEOUT,
+    ) -> None:
+        self.api_url = api_url
+        self.top_k = top_k
+        self.page_chars = page_chars
+        self.timeout = timeout
+        self._client: httpx.AsyncClient | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    async def client(self) -> httpx.AsyncClient:
+        # Пул соединений привязан к циклу событий, поэтому в новом цикле создаётся заново,
+        # а прежний закрывается. Его соединения принадлежат старому циклу, который может быть
+        # уже закрыт, - ошибки такого закрытия не важны
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            if self._client is not None:
+                with contextlib.suppress(Exception):
+                    await self._client.aclose()
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+                headers={"User-Agent": "outlines/0.1 (article generator)"},
+            )
+            self._loop = loop
+        return self._client
+
+    async def _query(self, **params) -> dict:
+        client = await self.client()
+        response = await client.get(
+            self.api_url, params={"action": "query", "format": "json", **params}
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def search(self, query: str) -> list[str]:
+        data = await self._query(list="search", srsearch=query, srlimit=self.top_k)
+        return [item["title"] for item in data.get("query", {}).get("search", [])]
+
+    async def page(self, title: str) -> str | None:
+        data = await self._query(
+            prop="extracts", explaintext=1, exintro=1, redirects=1, titles=title
+        )
+        for page in data.get("query", {}).get("pages", {}).values():
+            extract = page.get("extract")
+            if extract:
+                return f"Page: {page.get('title', title)}\nSummary: {extract[:self.page_chars]}"
+        return None
+
+    async def run(self, query: str) -> str:
+        titles = await self.search(query[:300])
+        # Страница, которую не удалось загрузить, пропускается - остальные результаты остаются
+        pages = await asyncio.gather(*(self.page(title) for title in titles), return_exceptions=True)
+        for title, page in zip(titles, pages):
+            if isinstance(page, BaseException):
+                if not isinstance(page, Exception):
+                    raise page
+                logger.warning("Wikipedia page %r failed: %s", title, page)
+        summaries = [page for page in pages if isinstance(page, str) and page]
+
+        return "\n\n".join(summaries) if summaries else "No good Wikipedia Search Result was found"
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+wikipedia = AsyncWikipedia()
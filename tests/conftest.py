@@ -0,0 +1,15 @@
+import os
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC)
+
+# Настройки читаются при импорте settings, поэтому окружение задаётся до импорта модулей
+# приложения: без сети, ключей и файлов кешей в рабочем каталоге
+os.environ.setdefault("openai_key", "offline-tests")
+os.environ["checkpoint_path"] = ":memory:"
+os.environ["tool_cache_path"] = ""
+os.environ["llm_cache_path"] = ""
+os.environ["section_cache_path"] = ""
+os.environ["retriever_backend"] = "numpy"
+os.environ["embedding_warmup"] = "false"
@@ -0,0 +1,81 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from aiohttp.test_utils import TestServer
+
+import llms
+from backends import Backend, BackendPool
+from benchmarks.scheduler import fake_endpoint
+from scheduler import LLMScheduler
+from tests.test_scheduler import ask
+
+
+class BackendPoolTest(unittest.IsolatedAsyncioTestCase):
+    async def start(self, port: int | None = None) -> tuple[TestServer, dict]:
+        app, stats = fake_endpoint(10**6, 0.01)
+        server = TestServer(app, port=port)
+        await server.start_server()
+        self.addAsyncCleanup(server.close)
+        return server, stats
+
+    async def use(self, health_check_interval: float) -> tuple[BackendPool, LLMScheduler, int, dict]:
+        # Первый бэкенд недоступен: сервер запускается только ради свободного порта и сразу гасится
+        down, _ = await self.start()
+        down_url, down_port = str(down.make_url("/v1")), down.port
+        await down.close()
+        up, up_stats = await self.start()
+
+        pool = BackendPool(
+            [
+                Backend("down", base_url=down_url, api_key="test"),
+                Backend("up", base_url=str(up.make_url("/v1")), api_key="test"),
+            ],
+            cooldown=60,
+            health_check_interval=health_check_interval,
+        )
+        scheduler = LLMScheduler(max_concurrency=4, rpm=0, tpm=0, target_latency=0)
+        for name, value in (("llm_scheduler", scheduler), ("llm_pool", pool)):
+            patcher = mock.patch.object(llms, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(lambda: pool._monitor and pool._monitor.cancel())
+        return pool, scheduler, down_port, up_stats
+
+    async def test_requests_fail_over_while_backend_is_down(self):
+        pool, scheduler, _, up_stats = await self.use(health_check_interval=0)
+        down, up = pool.backends
+
+        answers = await asyncio.gather(*(ask(f"request {number}") for number in range(6)))
+
+        self.assertEqual(answers, ["ok"] * 6)
+        self.assertEqual(up_stats["requests"], 6)
+        self.assertGreater(down.stats["errors"], 0)
+        self.assertFalse(down.healthy)
+        self.assertTrue(up.healthy)
+        # Переотправка на другой бэкенд - не повтор с задержкой
+        self.assertEqual(scheduler.counters["retries"], 0)
+
+    async def test_backend_rejoins_after_health_check(self):
+        pool, _, down_port, up_stats = await self.use(health_check_interval=0.05)
+        down, _ = pool.backends
+
+        self.assertEqual(await ask("while down"), "ok")
+        self.assertFalse(down.healthy)
+
+        _, restarted_stats = await self.start(port=down_port)
+        for _ in range(100):
+            if down.healthy:
+                break
+            await asyncio.sleep(0.05)
+        # До конца cooldown остаётся почти минута: вернула бэкенд именно проверка здоровья
+        self.assertTrue(down.healthy)
+
+        for number in range(4):
+            self.assertEqual(await ask(f"after recovery {number}"), "ok")
+        self.assertEqual(restarted_stats["requests"], 4)
+        self.assertEqual(up_stats["requests"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
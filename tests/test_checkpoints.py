@@ -0,0 +1,142 @@
+import operator
+import os
+import tempfile
+import unittest
+from typing import Annotated, TypedDict
+from unittest import mock
+
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.checkpoint.serde.types import TASKS
+from langgraph.graph import END, START, StateGraph
+from langgraph.types import Send
+
+from checkpoints import SqliteCheckpointSaver
+
+
+def thread_config(thread_id: str = "thread", checkpoint_id: str | None = None) -> dict:
+    configurable = {"thread_id": thread_id, "checkpoint_ns": ""}
+    if checkpoint_id is not None:
+        configurable["checkpoint_id"] = checkpoint_id
+    return {"configurable": configurable}
+
+
+class SaverTest(unittest.TestCase):
+    def setUp(self):
+        self.saver = SqliteCheckpointSaver(":memory:", max_age_days=0)
+
+    def put(self, config: dict, values: dict, step: int) -> dict:
+        checkpoint = empty_checkpoint()
+        checkpoint["channel_values"] = values
+        checkpoint["channel_versions"] = {
+            channel: self.saver.get_next_version(None, None) for channel in values
+        }
+        metadata = {"source": "loop", "step": step, "writes": None, "parents": {}}
+        return self.saver.put(config, checkpoint, metadata, checkpoint["channel_versions"])
+
+    def test_put_get_tuple_round_trip(self):
+        first = self.put(thread_config(), {"topic": "Asyncio", "sections": [{"title": "Loop"}]}, step=0)
+        second = self.put(first, {"topic": "Asyncio", "article": "text"}, step=1)
+
+        latest = self.saver.get_tuple(thread_config())
+        self.assertEqual(latest.config, second)
+        self.assertEqual(latest.parent_config, first)
+        self.assertEqual(latest.checkpoint["channel_values"], {"topic": "Asyncio", "article": "text"})
+        self.assertEqual(latest.metadata["step"], 1)
+
+        earlier = self.saver.get_tuple(first)
+        self.assertEqual(earlier.checkpoint["channel_values"]["sections"], [{"title": "Loop"}])
+        self.assertIsNone(earlier.parent_config)
+        self.assertIsNone(self.saver.get_tuple(thread_config("missing")))
+
+    def test_pending_writes_and_sends(self):
+        first = self.put(thread_config(), {"topic": "Asyncio"}, step=0)
+        sends = [Send("plan_section", {"index": 0}), Send("plan_section", {"index": 1})]
+        self.saver.put_writes(first, [(TASKS, send) for send in sends], task_id="dispatch")
+        self.saver.put_writes(first, [("plans", ["plan 0"])], task_id="plan-0")
+        # Повторная запись той же задачи (ретрай после сбоя) не перезаписывает сохранённую
+        self.saver.put_writes(first, [("plans", ["stale"])], task_id="plan-0")
+
+        writes = self.saver.get_tuple(first).pending_writes
+        self.assertIn(("plan-0", "plans", ["plan 0"]), writes)
+        self.assertNotIn(("plan-0", "plans", ["stale"]), writes)
+
+        # Отправки родительского чекпоинта становятся pending_sends следующего
+        second = self.put(first, {"topic": "Asyncio"}, step=1)
+        self.assertEqual(self.saver.get_tuple(second).checkpoint["pending_sends"], sends)
+
+    def test_list_is_newest_first_with_filters(self):
+        config = thread_config()
+        ids = []
+        for step in range(4):
+            config = self.put(config, {"step": step}, step=step)
+            ids.append(config["configurable"]["checkpoint_id"])
+        self.put(thread_config("other"), {"step": 0}, step=0)
+
+        listed = [item.config["configurable"]["checkpoint_id"] for item in self.saver.list(thread_config())]
+        self.assertEqual(listed, ids[::-1])
+
+        before = self.saver.list(thread_config(), before=thread_config(checkpoint_id=ids[2]), limit=1)
+        self.assertEqual([item.config["configurable"]["checkpoint_id"] for item in before], [ids[1]])
+
+        steps = [item.metadata["step"] for item in self.saver.list(thread_config(), filter={"step": 3})]
+        self.assertEqual(steps, [3])
+        self.assertEqual(len(list(self.saver.list(None))), 5)
+
+    def test_prune_and_delete_threads(self):
+        with mock.patch("checkpoints.time.time", return_value=0):
+            self.put(thread_config("stale"), {"topic": "old"}, step=0)
+        self.put(thread_config("fresh"), {"topic": "new"}, step=0)
+        self.put(thread_config("finished"), {"topic": "done"}, step=0)
+
+        self.assertEqual(self.saver.prune(max_age_days=1), 1)
+        self.assertIsNone(self.saver.get_tuple(thread_config("stale")))
+
+        self.saver.delete_thread("finished")
+        self.assertIsNone(self.saver.get_tuple(thread_config("finished")))
+        self.assertEqual(self.saver.stored_bytes("finished"), 0)
+        self.assertIsNotNone(self.saver.get_tuple(thread_config("fresh")))
+        self.assertEqual(self.saver.compact(max_age_days=1), {"pruned": 0, "threads": 1})
+
+
+class State(TypedDict):
+    items: list[int]
+    results: Annotated[list[int], operator.add]
+
+
+class ResumeTest(unittest.TestCase):
+    def test_failed_branch_resumes_without_rerunning_finished_ones(self):
+        calls: list[int] = []
+        failing = {1}
+
+        def work(task: dict) -> dict:
+            calls.append(task["item"])
+            if task["item"] in failing:
+                failing.discard(task["item"])
+                raise RuntimeError("transient failure")
+            return {"results": [task["item"] * 10]}
+
+        def build(saver: SqliteCheckpointSaver):
+            builder = StateGraph(State)
+            builder.add_node("work", work)
+            builder.add_conditional_edges(
+                START, lambda state: [Send("work", {"item": item}) for item in state["items"]], ["work"]
+            )
+            builder.add_edge("work", END)
+            return builder.compile(checkpointer=saver)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "checkpoints.sqlite3")
+            config = {"configurable": {"thread_id": "article"}}
+
+            with self.assertRaises(RuntimeError):
+                build(SqliteCheckpointSaver(path)).invoke({"items": [0, 1, 2], "results": []}, config)
+
+            # Новый процесс: другой экземпляр хранилища на том же файле продолжает запуск
+            result = build(SqliteCheckpointSaver(path)).invoke(None, config)
+
+        self.assertEqual(sorted(result["results"]), [0, 10, 20])
+        self.assertEqual(sorted(calls), [0, 1, 1, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from langchain_core.messages import AIMessage, ToolMessage
+
+from benchmarks.retrieval import HashingEmbeddings
+from embeddings import embedding_service
+from section_cache import SectionCache
+
+RESEARCH = "Asyncio event loop runs coroutines cooperatively. " * 20
+
+
+class FakeLLM:
+    model_name = "gpt-4o-mini"
+
+    def __init__(self) -> None:
+        self.prompts: list[str] = []
+
+    async def ainvoke(self, prompt: str) -> AIMessage:
+        self.prompts.append(prompt)
+        return AIMessage(content=f"plan {len(self.prompts)}")
+
+
+class PlanMemoizationTest(unittest.TestCase):
+    # content_generator импортируется в тестах, а не при сборе: test_server подменяет
+    # модели фейками до первого импорта графов
+    def setUp(self):
+        import content_generator
+
+        self.llm = FakeLLM()
+        self.cache = SectionCache(":memory:", ttl_seconds=3600, max_entries=100)
+        previous = embedding_service._model
+        embedding_service._model = HashingEmbeddings()
+        self.addCleanup(setattr, embedding_service, "_model", previous)
+        for name, value in (("llm", self.llm), ("section_cache", self.cache)):
+            patcher = mock.patch.object(content_generator, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def plan(self, research) -> str:
+        import content_generator
+
+        state = {
+            "topic": "Asyncio",
+            "sections": [{"section_title": "Event loop", "content": "How the loop works"}],
+        }
+        config = {"configurable": {"thread_id": "test"}}
+
+        async def run() -> str:
+            with mock.patch.object(content_generator, "researched_section", side_effect=research):
+                results = (await content_generator.research_phase(state, config))["research_results"]
+            results = content_generator.enhance_research(state["topic"], results)
+            task = {
+                "topic": state["topic"],
+                "index": 0,
+                "section_title": results[0].section_title,
+                "description": results[0].description,
+                "passages": results[0].passages,
+            }
+            return (await content_generator.plan_section(task))["plans"][0]["plan"]
+
+        return asyncio.run(run())
+
+    def test_plan_from_failed_research_is_rebuilt(self):
+        found = {"messages": [ToolMessage(content=RESEARCH, tool_call_id="search")]}
+
+        # Исследование упало: план строится без данных и не запоминается
+        self.assertEqual(self.plan([RuntimeError("search is down")]), "plan 1")
+        self.assertNotIn("Asyncio event loop", self.llm.prompts[0])
+
+        # Исследование удалось: план строится заново уже по данным
+        self.assertEqual(self.plan([found]), "plan 2")
+        self.assertIn("Asyncio event loop", self.llm.prompts[1])
+
+        # Те же данные (исследование взято из мемоизации) - тот же план без вызова модели
+        self.assertEqual(self.plan([AssertionError("research is memoized")]), "plan 2")
+        self.assertEqual(len(self.llm.prompts), 2)
+        self.assertEqual(self.cache.metrics()["plan"], {"hits": 1, "misses": 2})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import hashlib
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import context_packer
+
+
+class TokenizerTest(unittest.TestCase):
+    def setUp(self):
+        context_packer.encoding.cache_clear()
+        self.addCleanup(context_packer.encoding.cache_clear)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache_dir = directory.name
+        patcher = mock.patch.dict(os.environ, {"TIKTOKEN_CACHE_DIR": self.cache_dir})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_uncached_tokenizer_is_estimated_without_network(self):
+        with mock.patch("tiktoken.get_encoding", side_effect=AssertionError("network")) as get_encoding:
+            self.assertIsNone(context_packer.encoding("gpt-4o-mini"))
+            self.assertEqual(context_packer.count_tokens("x" * 30, "gpt-4o-mini"), 10)
+            self.assertEqual(context_packer.trim_tokens("abcdefghij", 2, "gpt-4o-mini"), "efghij")
+        get_encoding.assert_not_called()
+
+    def test_cached_tokenizer_is_loaded(self):
+        url = context_packer.TIKTOKEN_FILES["cl100k_base"]
+        open(os.path.join(self.cache_dir, hashlib.sha1(url.encode()).hexdigest()), "wb").close()
+
+        with mock.patch("tiktoken.get_encoding", return_value="cl100k") as get_encoding:
+            self.assertEqual(context_packer.encoding("gpt-4"), "cl100k")
+            # Модель без словаря в кеше по-прежнему считается приблизительно
+            self.assertIsNone(context_packer.encoding("llama3.1"))
+        get_encoding.assert_called_once_with("cl100k_base")
+
+    def test_download_can_be_enabled(self):
+        with (
+            mock.patch.object(context_packer, "TOKENIZER_DOWNLOAD", True),
+            mock.patch("tiktoken.get_encoding", return_value="o200k") as get_encoding,
+        ):
+            self.assertEqual(context_packer.encoding("llama3.1"), "o200k")
+        get_encoding.assert_called_once_with("o200k_base")
+
+
+if __name__ == "__main__":
+    unittest.main()
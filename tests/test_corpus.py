@@ -0,0 +1,95 @@
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from benchmarks.retrieval import HashingEmbeddings
+from corpus import ResearchCorpus
+from embeddings import embedding_service
+from retrievers import passage_id
+
+
+def passages(prefix: str, count: int) -> list[str]:
+    return [f"{prefix} passage number {number} about {prefix}{number}" for number in range(count)]
+
+
+class ResearchCorpusTest(unittest.TestCase):
+    def setUp(self):
+        self.previous = embedding_service._model
+        embedding_service._model = HashingEmbeddings()
+        self.corpus = ResearchCorpus(max_documents=10)
+
+    def tearDown(self):
+        self.corpus.close()
+        embedding_service._model = self.previous
+
+    def add(self, texts: list[str], at: float) -> list[str]:
+        with mock.patch("corpus.time.time", return_value=at):
+            return self.corpus.add(texts, [{"topic": "test"} for _ in texts])
+
+    def stored(self) -> set[str]:
+        return set(self.corpus.store.get(include=[])["ids"])
+
+    def test_reused_passages_survive_overflow_eviction(self):
+        old = passages("old", 5)
+        reused = passages("reused", 3)
+        self.add(reused + old, at=1000)
+
+        # Вторая статья берёт часть старых фрагментов и переполняет корпус
+        fresh = passages("fresh", 4)
+        reused_before = embedding_service.passages_reused
+        ids = self.add(reused + fresh, at=2000)
+
+        self.assertEqual(embedding_service.passages_reused - reused_before, 3)
+        self.assertLessEqual(self.corpus.count(), 9)
+        self.assertTrue(set(ids) <= self.stored())
+        self.assertEqual(len(self.stored() & {passage_id(text) for text in old}), 2)
+
+    def test_expiry_counts_from_last_use(self):
+        reused = passages("reused", 2)
+        stale = passages("stale", 2)
+        self.add(reused + stale, at=0)
+        self.add(reused, at=self.corpus.max_age_days * 24 * 60 * 60)
+
+        with mock.patch("corpus.time.time", return_value=(self.corpus.max_age_days + 1) * 24 * 60 * 60):
+            self.assertEqual(self.corpus.evict_expired(), 2)
+
+        self.assertEqual(self.stored(), {passage_id(text) for text in reused})
+
+    def test_adding_passages_evicts_expired_ones(self):
+        stale = passages("stale", 2)
+        self.add(stale, at=0)
+        fresh = passages("fresh", 2)
+        self.add(fresh, at=(self.corpus.max_age_days + 1) * 24 * 60 * 60)
+
+        self.assertEqual(self.stored(), {passage_id(text) for text in fresh})
+
+    def test_persistent_corpus_is_reopened(self):
+        with tempfile.TemporaryDirectory() as directory:
+            texts = passages("kept", 3)
+            ResearchCorpus(directory).add(texts, [{"topic": "test"} for _ in texts])
+
+            reopened = ResearchCorpus(directory)
+            self.assertEqual(reopened.count(), 3)
+            found = reopened.search_many(texts[:2], k=1, exclude=[set(), {passage_id(texts[1])}])
+            self.assertEqual(found[0], texts[:1])
+            self.assertNotIn(texts[1], found[1])
+
+    def test_vectors_reembed_evicted_passages(self):
+        texts = passages("kept", 2) + passages("evicted", 1)
+        ids = self.add(texts, at=1000)
+        self.corpus.store.delete(ids=[ids[2]])
+
+        vectors = self.corpus.vectors(ids, texts)
+
+        expected = np.asarray(HashingEmbeddings().embed_documents(texts[2:]), dtype=np.float32)
+        expected /= np.linalg.norm(expected)
+        self.assertEqual(vectors.shape[0], 3)
+        np.testing.assert_allclose(vectors[2], expected[0], atol=1e-6)
+        with self.assertRaises(KeyError):
+            self.corpus.vectors(ids)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+
+from metrics import ArticleTotals, prometheus_text, prometheus_value
+
+SUMMARY = {
+    "seconds": 12.345678901,
+    "nodes": {"write_section": {"runs": 3, "seconds": 1.5}},
+    "llm": [{"node": "write_section", "model": "gpt-4o-mini", "calls": 3, "prompt_tokens": 1234567, "completion_tokens": 2}],
+    "tools": {},
+}
+
+
+class PrometheusTextTest(unittest.TestCase):
+    def test_values_keep_full_precision(self):
+        self.assertEqual(prometheus_value(1234567.0), "1234567")
+        self.assertEqual(prometheus_value(10**12 + 1), "1000000000001")
+        self.assertEqual(prometheus_value(12.345678901), "12.345678901")
+        self.assertEqual(prometheus_value(0), "0")
+
+        text = prometheus_text([SUMMARY])
+        self.assertIn(
+            'outlines_llm_tokens_total{node="write_section",model="gpt-4o-mini",kind="prompt"} 1234567', text
+        )
+        self.assertIn("outlines_article_seconds_total 12.345678901\n", text)
+        self.assertIn('outlines_node_seconds_total{node="write_section"} 1.5\n', text)
+
+    def test_totals_and_summaries_render_the_same(self):
+        totals = ArticleTotals()
+        for summary in (SUMMARY, {**SUMMARY, "status": "error"}):
+            totals.add(summary)
+
+        text = prometheus_text(totals)
+        self.assertEqual(text, prometheus_text([SUMMARY, {**SUMMARY, "status": "error"}]))
+        self.assertIn('outlines_articles_total{status="error"} 1\n', text)
+        self.assertIn("# TYPE outlines_articles_total counter", text)
+
+
+if __name__ == "__main__":
+    unittest.main()
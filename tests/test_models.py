@@ -0,0 +1,163 @@
+import json
+import unittest
+
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from models import GeneratedOutline, OutlineEdits, Section, SectionEdit, SectionsList, outline_leaves, walk_outline
+
+
+def section(title: str, *subsections: Section) -> Section:
+    return Section(section_title=title, content=f"about {title}", subsections=list(subsections))
+
+
+def outline() -> SectionsList:
+    # 1 Basics
+    # 2 Loop: 3 Tasks (4 Create, 5 Cancel), 6 Futures
+    # 7 Links
+    return SectionsList(
+        sections=[
+            section("Basics"),
+            section("Loop", section("Tasks", section("Create"), section("Cancel")), section("Futures")),
+            section("Links"),
+        ]
+    )
+
+
+def titles(sections: list[Section]) -> list[tuple[int, str]]:
+    return [(depth, item.section_title) for depth, item in walk_outline(sections)]
+
+
+class GeneratedOutlineTest(unittest.TestCase):
+    def test_function_schema_describes_every_level(self):
+        schema = convert_to_openai_tool(GeneratedOutline)["function"]["parameters"]
+        top = schema["properties"]["sections"]["items"]
+        middle = top["properties"]["subsections"]["items"]
+        bottom = middle["properties"]["subsections"]["items"]
+
+        for level in (top, middle, bottom):
+            self.assertEqual(set(level["required"]), {"section_title", "content"})
+        self.assertNotIn("subsections", bottom["properties"])
+        self.assertNotIn('"items": {}', json.dumps(schema))
+
+    def test_to_outline_keeps_nesting(self):
+        generated = GeneratedOutline.model_validate(outline().model_dump())
+        self.assertEqual(generated.to_outline(), outline())
+
+
+class OutlineTreeTest(unittest.TestCase):
+    def test_walk_outline_numbers_sections_in_reading_order(self):
+        self.assertEqual(
+            titles(outline().sections),
+            [(0, "Basics"), (0, "Loop"), (1, "Tasks"), (2, "Create"), (2, "Cancel"), (1, "Futures"), (0, "Links")],
+        )
+
+    def test_outline_leaves_open_parent_headings_once(self):
+        leaves = outline_leaves(outline().sections)
+
+        self.assertEqual(
+            [leaf.section.section_title for leaf in leaves],
+            ["Basics", "Loop › Tasks › Create", "Loop › Tasks › Cancel", "Loop › Futures", "Links"],
+        )
+        self.assertEqual(
+            [leaf.heading for leaf in leaves],
+            ["## Basics", "## Loop\n\n### Tasks\n\n#### Create", "#### Cancel", "### Futures", "## Links"],
+        )
+        self.assertEqual([len(leaf.parents) for leaf in leaves], [0, 2, 2, 1, 0])
+        self.assertEqual(leaves[1].section.content, "about Create")
+
+    def test_headings_stop_at_level_six(self):
+        deep = section("1", section("2", section("3", section("4", section("5", section("6"))))))
+        self.assertEqual(outline_leaves([deep])[0].heading.split("\n\n")[-1], "###### 6")
+
+
+class FlatEditsTest(unittest.TestCase):
+    def apply(self, *edits: SectionEdit) -> list[str]:
+        flat = SectionsList(sections=[section(title) for title in ("Basics", "Loop", "Links")])
+        return [item.section_title for item in OutlineEdits(edits=list(edits)).apply(flat).sections]
+
+    def test_rename_and_rewrite(self):
+        edits = OutlineEdits(
+            edits=[
+                SectionEdit(action="rename", index=2, section_title="Event loop"),
+                SectionEdit(action="rewrite", index=2, content="How the loop schedules callbacks"),
+            ]
+        )
+        result = edits.apply(SectionsList(sections=[section("Basics"), section("Loop")]))
+        self.assertEqual(result.sections[1], Section(section_title="Event loop", content="How the loop schedules callbacks"))
+
+    def test_insert_at_start_middle_and_end(self):
+        self.assertEqual(
+            self.apply(
+                SectionEdit(action="add", after=0, section_title="Intro", content="intro"),
+                SectionEdit(action="add", after=2, section_title="Tasks", content="tasks"),
+                SectionEdit(action="add", section_title="Faq", content="faq"),
+            ),
+            ["Intro", "Basics", "Loop", "Tasks", "Links", "Faq"],
+        )
+
+    def test_delete_and_move(self):
+        self.assertEqual(self.apply(SectionEdit(action="remove", index=2)), ["Basics", "Links"])
+        self.assertEqual(self.apply(SectionEdit(action="move", index=3, after=0)), ["Links", "Basics", "Loop"])
+        self.assertEqual(self.apply(SectionEdit(action="move", index=1, after=2)), ["Loop", "Basics", "Links"])
+
+    def test_edits_do_not_change_the_original(self):
+        flat = SectionsList(sections=[section("Basics")])
+        OutlineEdits(edits=[SectionEdit(action="rename", index=1, section_title="Other")]).apply(flat)
+        self.assertEqual(flat.sections[0].section_title, "Basics")
+
+    def test_out_of_range_index_is_rejected(self):
+        for edit in (
+            SectionEdit(action="remove", index=4),
+            SectionEdit(action="rename", index=0, section_title="X"),
+            SectionEdit(action="move", after=1),
+            SectionEdit(action="add", after=1, section_title="No description"),
+        ):
+            with self.subTest(edit=edit), self.assertRaises(ValueError):
+                self.apply(edit)
+
+
+class NestedEditsTest(unittest.TestCase):
+    def apply(self, *edits: SectionEdit) -> list[tuple[int, str]]:
+        return titles(OutlineEdits(edits=list(edits)).apply(outline()).sections)
+
+    def test_add_into_parent_and_next_to_subsection(self):
+        self.assertEqual(
+            self.apply(
+                SectionEdit(action="add", parent=3, section_title="Gather", content="gather"),
+                SectionEdit(action="add", after=6, section_title="Queues", content="queues"),
+            ),
+            [
+                (0, "Basics"), (0, "Loop"), (1, "Tasks"), (2, "Create"), (2, "Cancel"), (2, "Gather"),
+                (1, "Futures"), (1, "Queues"), (0, "Links"),
+            ],
+        )
+
+    def test_move_subtree_out_of_its_parent(self):
+        self.assertEqual(
+            self.apply(SectionEdit(action="move", index=3, after=7)),
+            [(0, "Basics"), (0, "Loop"), (1, "Futures"), (0, "Links"), (0, "Tasks"), (1, "Create"), (1, "Cancel")],
+        )
+
+    def test_move_into_own_subtree_goes_to_the_end(self):
+        top = [title for depth, title in self.apply(SectionEdit(action="move", index=2, parent=3)) if depth == 0]
+        self.assertEqual(top, ["Basics", "Links", "Loop"])
+
+    def test_removing_parent_removes_its_subsections(self):
+        self.assertEqual(self.apply(SectionEdit(action="remove", index=3)), [
+            (0, "Basics"), (0, "Loop"), (1, "Futures"), (0, "Links"),
+        ])
+        with self.assertRaises(ValueError):
+            self.apply(SectionEdit(action="remove", index=3), SectionEdit(action="rename", index=4, section_title="X"))
+
+    def test_numbers_refer_to_the_original_outline(self):
+        self.assertEqual(
+            self.apply(
+                SectionEdit(action="remove", index=1),
+                SectionEdit(action="rename", index=4, section_title="Create tasks"),
+            )[2],
+            (2, "Create tasks"),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
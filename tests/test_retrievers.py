@@ -0,0 +1,61 @@
+import unittest
+
+from benchmarks.retrieval import HashingEmbeddings, make_corpus
+from embeddings import embedding_service
+from retrievers import NumpyRetriever
+
+
+class CountingEmbeddings(HashingEmbeddings):
+    def __init__(self) -> None:
+        super().__init__()
+        self.texts: list[str] = []
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.texts.extend(texts)
+        return super().embed_documents(texts)
+
+
+class QueryEmbeddingsTest(unittest.TestCase):
+    def setUp(self):
+        self.previous = embedding_service._model
+        self.embeddings = CountingEmbeddings()
+        embedding_service._model = self.embeddings
+
+    def tearDown(self):
+        embedding_service._model = self.previous
+
+    def test_precomputed_query_embeddings_are_not_embedded_again(self):
+        texts, metadatas, queries = make_corpus(passages=40, sections=4)
+        retriever = NumpyRetriever()
+        retriever.add(texts, metadatas)
+        query_embeddings = embedding_service.embed_documents(queries)
+        embedded = len(self.embeddings.texts)
+
+        found = retriever.search_many(queries, k=3, query_embeddings=query_embeddings)
+
+        self.assertEqual(len(self.embeddings.texts), embedded)
+        self.assertEqual(found, retriever.search_many(queries, k=3))
+
+    def test_enhance_research_embeds_each_query_once(self):
+        from content_generator import enhance_research
+        from states import ResearchRecord
+
+        texts, _, _ = make_corpus(passages=12, sections=3)
+        research = [
+            ResearchRecord(
+                section_title=f"Section {number}",
+                description=f"description {number}",
+                research_data="\n\n".join(texts[number * 4:(number + 1) * 4]),
+            )
+            for number in range(3)
+        ]
+
+        enhanced = enhance_research("topic", research)
+
+        queries = [text for text in self.embeddings.texts if text.startswith("topic Section")]
+        self.assertEqual(sorted(queries), [f"topic Section {n} description {n}" for n in range(3)])
+        self.assertTrue(all(record.passages for record in enhanced))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,158 @@
+import asyncio
+import time
+import unittest
+from contextlib import asynccontextmanager
+from unittest import mock
+
+import httpx
+import openai
+from aiohttp.test_utils import TestServer
+from langchain_core.runnables.config import var_child_runnable_config
+from pydantic import SecretStr
+
+import llms
+from backends import Backend, BackendPool
+from benchmarks.scheduler import fake_endpoint
+from scheduler import PRIORITY_BATCH, PRIORITY_INTERACTIVE, PRIORITY_NORMAL, LLMScheduler
+
+
+@asynccontextmanager
+async def endpoint(rpm: int = 10**6, latency: float = 0.0, window: float = 60):
+    app, stats = fake_endpoint(rpm, latency, window)
+    server = TestServer(app)
+    await server.start_server()
+    try:
+        yield str(server.make_url("/v1")), stats
+    finally:
+        await server.close()
+
+
+def rate_limit_error(retry_after: str) -> openai.RateLimitError:
+    response = httpx.Response(
+        429, headers={"retry-after": retry_after}, request=httpx.Request("POST", "http://test/v1/chat/completions")
+    )
+    return openai.RateLimitError("Rate limit reached", response=response, body=None)
+
+
+# Свой клиент без кеша: llms.llm в других тестах подменяется фейковой моделью
+llm = llms.ScheduledChatOpenAI(api_key=SecretStr("test"), model="gpt-4o-mini", max_retries=0)
+
+
+async def ask(prompt: str, priority: int = PRIORITY_NORMAL) -> str:
+    # Приоритет планировщик берёт из конфига текущего узла графа; здесь графа нет
+    var_child_runnable_config.set({"configurable": {"priority": priority}})
+    return (await llm.ainvoke(prompt)).content
+
+
+class SchedulerTest(unittest.IsolatedAsyncioTestCase):
+    def use(self, scheduler: LLMScheduler, base_url: str) -> None:
+        pool = BackendPool([Backend("test", base_url=base_url, api_key="test")], health_check_interval=0)
+        for name, value in (("llm_scheduler", scheduler), ("llm_pool", pool)):
+            patcher = mock.patch.object(llms, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_rate_limited_requests_wait_for_retry_after(self):
+        scheduler = LLMScheduler(max_concurrency=4, rpm=0, tpm=0, target_latency=0, backoff_base=0.01)
+        async with endpoint(rpm=2, window=0.4) as (base_url, server):
+            self.use(scheduler, base_url)
+            started = time.monotonic()
+            answers = await asyncio.gather(*(ask(f"request {number}") for number in range(6)))
+            elapsed = time.monotonic() - started
+
+        self.assertEqual(answers, ["ok"] * 6)
+        self.assertGreater(server["rate_limited"], 0)
+        self.assertEqual(scheduler.counters["rate_limited"], server["rate_limited"])
+        self.assertEqual(scheduler.counters["retries"], server["rate_limited"])
+        self.assertEqual(scheduler.counters["completed"], 6)
+        # Шесть запросов при двух на окно - не меньше двух ожиданий по retry-after
+        self.assertGreaterEqual(elapsed, 0.7)
+
+    async def test_retry_after_pauses_every_slot(self):
+        scheduler = LLMScheduler(max_concurrency=4, rpm=0, tpm=0)
+        self.assertEqual(scheduler.on_rate_limited(rate_limit_error("0.3")), 0.3)
+
+        started = time.monotonic()
+        await scheduler.acquire(PRIORITY_INTERACTIVE, 0)
+        self.assertGreaterEqual(time.monotonic() - started, 0.25)
+        scheduler.release()
+
+    async def test_gives_up_after_max_retries(self):
+        scheduler = LLMScheduler(max_concurrency=2, rpm=0, tpm=0, max_retries=2, backoff_base=0.01)
+        error = rate_limit_error("0")
+        for attempt in range(2):
+            await scheduler.retrying(attempt, error)
+        with self.assertRaises(openai.RateLimitError):
+            await scheduler.retrying(2, error)
+        with self.assertRaises(ValueError):
+            await scheduler.retrying(0, ValueError("not transient"))
+
+        self.assertEqual(scheduler.counters["retries"], 2)
+        self.assertEqual(scheduler.counters["gave_up"], 1)
+
+    def test_aimd_limit(self):
+        scheduler = LLMScheduler(max_concurrency=8, rpm=0, tpm=0, target_latency=1.0)
+
+        # Мультипликативное уменьшение на 429, но не ниже одного слота
+        scheduler.on_rate_limited(rate_limit_error(""))
+        self.assertEqual(scheduler.limit, 4)
+        for _ in range(5):
+            scheduler.on_rate_limited(rate_limit_error(""))
+        self.assertEqual(scheduler.limit, 1)
+        self.assertEqual(scheduler.paused_until, 0)
+
+        # Аддитивное восстановление: примерно +1 слот за limit успешных ответов
+        for _ in range(3):
+            scheduler.on_success(0.1)
+        self.assertGreaterEqual(scheduler.limit, 2)
+        self.assertLess(scheduler.limit, 3)
+
+        for _ in range(100):
+            scheduler.on_success(0.1)
+        self.assertEqual(scheduler.limit, 8)
+
+        # Ответы медленнее целевой задержки тоже уменьшают параллелизм
+        scheduler.on_success(2.0)
+        self.assertAlmostEqual(scheduler.limit, 7.2)
+
+    async def test_rate_limits_shrink_concurrency_on_the_wire(self):
+        scheduler = LLMScheduler(max_concurrency=8, rpm=0, tpm=0, target_latency=0, backoff_base=0.01)
+        async with endpoint(rpm=4, window=0.3) as (base_url, server):
+            self.use(scheduler, base_url)
+            await asyncio.gather(*(ask(f"request {number}") for number in range(8)))
+
+        self.assertGreater(server["rate_limited"], 0)
+        self.assertLess(scheduler.limit, 8)
+
+    async def test_slots_are_granted_by_priority(self):
+        scheduler = LLMScheduler(max_concurrency=1, rpm=0, tpm=0, target_latency=0)
+        finished: list[str] = []
+
+        async def request(name: str, priority: int) -> None:
+            await ask(name, priority)
+            finished.append(name)
+
+        async with endpoint(latency=0.05) as (base_url, _):
+            self.use(scheduler, base_url)
+            first = asyncio.create_task(request("first", PRIORITY_NORMAL))
+            await asyncio.sleep(0.02)
+            # Пока первый запрос занимает единственный слот, очередь набирается в обратном порядке
+            queued = [
+                asyncio.create_task(request(name, priority))
+                for name, priority in (
+                    ("batch", PRIORITY_BATCH),
+                    ("normal", PRIORITY_NORMAL),
+                    ("interactive", PRIORITY_INTERACTIVE),
+                )
+            ]
+            await asyncio.gather(first, *queued)
+
+        self.assertEqual(finished, ["first", "interactive", "normal", "batch"])
+        self.assertEqual(
+            scheduler.metrics()["granted_by_priority"],
+            {PRIORITY_INTERACTIVE: 1, PRIORITY_NORMAL: 2, PRIORITY_BATCH: 1},
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
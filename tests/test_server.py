@@ -0,0 +1,197 @@
+import asyncio
+import json
+import unittest
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from benchmarks.pipeline import configure_environment, install_fakes
+
+# Как server.py --fake: фейковые модели, поиск и эмбеддинги подменяются до импорта графов
+configure_environment("parallel")
+install_fakes(latency=0.01, response_chars=300, tool_latency=0.01, tool_chars=500, sections=3)
+
+from checkpoints import checkpointer  # noqa: E402
+from server import create_app  # noqa: E402
+
+
+async def events(response):
+    # Разбор потока Server-Sent Events на пары (событие, данные)
+    event = None
+    async for line in response.content:
+        line = line.decode().rstrip("\n")
+        if line.startswith("event: "):
+            event = line.removeprefix("event: ")
+        elif line.startswith("data: "):
+            yield event, json.loads(line.removeprefix("data: "))
+
+
+class ArticleServiceTest(unittest.TestCase):
+    # Один цикл событий на все тесты: общие на процесс семафоры (limits.tool_slots)
+    # привязываются к циклу, в котором их впервые пришлось ждать
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.loop = asyncio.new_event_loop()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        pending = asyncio.all_tasks(cls.loop)
+        for task in pending:
+            task.cancel()
+        if pending:
+            cls.loop.run_until_complete(asyncio.wait(pending))
+        cls.loop.run_until_complete(cls.loop.shutdown_asyncgens())
+        cls.loop.close()
+
+    def run_with_client(self, scenario, workers: int = 2, queue_size: int = 10, **options):
+        async def run():
+            client = TestClient(TestServer(create_app(workers, queue_size, **options)))
+            await client.start_server()
+            try:
+                return await asyncio.wait_for(scenario(client), 60)
+            finally:
+                await client.close()
+
+        return self.loop.run_until_complete(run())
+
+    def test_review_flow_streams_events_until_done(self):
+        async def scenario(client):
+            response = await client.post("/jobs", json={"topic": "Асинхронность в Python", "review": True})
+            self.assertEqual(response.status, 202)
+            job_id = (await response.json())["id"]
+
+            received = []
+            async with client.get(f"/jobs/{job_id}/events") as stream:
+                self.assertEqual(stream.headers["Content-Type"], "text/event-stream")
+                async for event, data in events(stream):
+                    received.append(event)
+                    if event == "outline":
+                        self.assertEqual(len(data["sections"]), 3)
+                        info = await (await client.get(f"/jobs/{job_id}")).json()
+                        self.assertEqual(info["status"], "waiting_feedback")
+                        response = await client.post(f"/jobs/{job_id}/feedback", json={"feedback": "done"})
+                        self.assertEqual(response.status, 202)
+                    if event == "done":
+                        self.assertTrue(data["article"].startswith("# Асинхронность в Python"))
+                        break
+
+            self.assertEqual(received[0], "status")
+            self.assertIn("node", received)
+            self.assertEqual(received.count("section"), 3)
+            self.assertEqual(received[-1], "done")
+
+            info = await (await client.get(f"/jobs/{job_id}")).json()
+            self.assertEqual(info["status"], "done")
+            self.assertGreater(info["metrics"]["llm_total"]["calls"], 0)
+            # Чекпоинты завершённого задания удалены вместе с потоком оглавления
+            self.assertEqual(checkpointer.stored_bytes(job_id), 0)
+            self.assertEqual(checkpointer.stored_bytes(f"{job_id}:outline"), 0)
+
+            # Поздний подписчик получает историю задания целиком
+            async with client.get(f"/jobs/{job_id}/events") as stream:
+                replayed = [event async for event, _ in events(stream)]
+            self.assertEqual(replayed, [event for event in received if event != "token"])
+
+            metrics = await (await client.get("/metrics")).text()
+            self.assertIn('outlines_articles_total{status="ok"} 1', metrics)
+            self.assertIn("# TYPE outlines_embedding_max_batch_size gauge", metrics)
+            self.assertIn('outlines_passages_total{result="embedded"}', metrics)
+
+        self.run_with_client(scenario)
+
+    def test_job_without_review_finishes_on_its_own(self):
+        async def scenario(client):
+            job_id = (await (await client.post("/jobs", json={"topic": "Тема", "review": False})).json())["id"]
+            async with client.get(f"/jobs/{job_id}/events") as stream:
+                received = [event async for event, _ in events(stream)]
+
+            self.assertNotIn("outline", received)
+            self.assertEqual(received[-1], "done")
+
+        self.run_with_client(scenario)
+
+    def test_outline_is_accepted_when_feedback_times_out(self):
+        async def scenario(client):
+            job_id = (await (await client.post("/jobs", json={"topic": "Тема"})).json())["id"]
+            async with client.get(f"/jobs/{job_id}/events") as stream:
+                received = [(event, data) async for event, data in events(stream)]
+
+            events_only = [event for event, _ in received]
+            self.assertIn("outline", events_only)
+            self.assertIn(("status", {"status": "running", "review": False}), received)
+            self.assertEqual(events_only[-1], "done")
+            self.assertFalse((await (await client.get(f"/jobs/{job_id}")).json())["review"])
+
+        self.run_with_client(scenario, feedback_timeout=0.05)
+
+    def test_article_counters_outlive_forgotten_jobs(self):
+        async def scenario(client):
+            for number in range(3):
+                job_id = (await (await client.post("/jobs", json={"topic": f"Тема {number}", "review": False})).json())["id"]
+                async with client.get(f"/jobs/{job_id}/events") as stream:
+                    [event async for event, _ in events(stream)]
+
+            # Хранится одно завершённое задание, но счётчик учитывает все три
+            self.assertEqual((await client.get(f"/jobs/{job_id}")).status, 200)
+            metrics = await (await client.get("/metrics")).text()
+            self.assertIn('outlines_articles_total{status="ok"} 3', metrics)
+
+        self.run_with_client(scenario, keep_jobs=1)
+
+    def test_cancel_job_waiting_for_feedback(self):
+        async def scenario(client):
+            job_id = (await (await client.post("/jobs", json={"topic": "Тема"})).json())["id"]
+            async with client.get(f"/jobs/{job_id}/events") as stream:
+                async for event, _ in events(stream):
+                    if event == "outline":
+                        response = await client.delete(f"/jobs/{job_id}")
+                        self.assertEqual(response.status, 202)
+                    last = event
+
+            self.assertEqual(last, "cancelled")
+            info = await (await client.get(f"/jobs/{job_id}")).json()
+            self.assertEqual(info["status"], "cancelled")
+            response = await client.post(f"/jobs/{job_id}/feedback", json={"feedback": "done"})
+            self.assertEqual(response.status, 409)
+
+        self.run_with_client(scenario)
+
+    def test_cancel_queued_job_and_reject_when_queue_is_full(self):
+        async def scenario(client):
+            # Единственный воркер занят заданием, ждущим правки оглавления
+            busy = (await (await client.post("/jobs", json={"topic": "Первая"})).json())["id"]
+            while (await (await client.get(f"/jobs/{busy}")).json())["status"] != "waiting_feedback":
+                await asyncio.sleep(0.01)
+
+            queued = (await (await client.post("/jobs", json={"topic": "Вторая"})).json())["id"]
+            response = await client.post("/jobs", json={"topic": "Третья"})
+            self.assertEqual(response.status, 503)
+            self.assertIn("Retry-After", response.headers)
+
+            await client.delete(f"/jobs/{queued}")
+            self.assertEqual((await (await client.get(f"/jobs/{queued}")).json())["status"], "cancelled")
+            await client.delete(f"/jobs/{busy}")
+
+        self.run_with_client(scenario, workers=1, queue_size=1)
+
+    def test_invalid_requests(self):
+        async def scenario(client):
+            for body in ("{not json", "[1, 2]"):
+                response = await client.post("/jobs", data=body, headers={"Content-Type": "application/json"})
+                self.assertEqual(response.status, 400)
+            for body in ({}, {"topic": ""}, {"topic": 1}, {"topic": "Тема", "review": "false"}, {"topic": "Тема", "wishes": 1}):
+                response = await client.post("/jobs", json=body)
+                self.assertEqual(response.status, 400, body)
+                self.assertIn("error", await response.json())
+
+            self.assertEqual((await client.get("/jobs/unknown")).status, 404)
+
+            job_id = (await (await client.post("/jobs", json={"topic": "Тема"})).json())["id"]
+            while (await (await client.get(f"/jobs/{job_id}")).json())["status"] != "waiting_feedback":
+                await asyncio.sleep(0.01)
+            response = await client.post(f"/jobs/{job_id}/feedback", data="oops", headers={"Content-Type": "application/json"})
+            self.assertEqual(response.status, 400)
+            response = await client.post(f"/jobs/{job_id}/feedback", json={"feedback": 42})
+            self.assertEqual(response.status, 400)
+            await client.delete(f"/jobs/{job_id}")
+
+        self.run_with_client(scenario)
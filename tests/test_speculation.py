@@ -0,0 +1,108 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from langchain_core.messages import ToolMessage
+
+import limits
+from models import Section
+from scheduler import PRIORITY_BATCH
+from speculation import ResearchSpeculator
+
+
+def sections(count: int) -> list[Section]:
+    return [Section(section_title=f"Section {index}", content=f"about {index}") for index in range(count)]
+
+
+class FakeResearchChain:
+    # Исследование секции, считающее, сколько исследований идёт одновременно
+    def __init__(self, delay: float = 0.01) -> None:
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+        self.calls: list[tuple[str, dict | None]] = []
+
+    async def ainvoke(self, values: dict, config: dict | None = None) -> dict:
+        self.calls.append((values["title"], config))
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.active -= 1
+        if values["title"].startswith("Broken"):
+            raise RuntimeError("search is down")
+        return {"messages": [ToolMessage(content=f"research {values['title']}", tool_call_id="search")]}
+
+
+class SpeculatorTest(unittest.TestCase):
+    def test_update_take_and_discard(self):
+        chain = FakeResearchChain()
+
+        async def research(topic, section, semaphore, config=None):
+            async with semaphore:
+                return await chain.ainvoke({"title": section.section_title}, config)
+
+        async def run():
+            speculator = ResearchSpeculator()
+            first, second, third = sections(3)
+            broken = Section(section_title="Broken", content="fails")
+
+            speculator.update("article", "Asyncio", [first, second], research)
+            await asyncio.sleep(0)
+            # Раунд правок убрал первую секцию и добавил третью: её исследование отменяется
+            speculator.update("article", "Asyncio", [second, third, broken], research)
+
+            self.assertIsNone(await speculator.take("article", first))
+            self.assertEqual(
+                (await speculator.take("article", third))["messages"][0].content, "research Section 2"
+            )
+            self.assertIsNone(await speculator.take("other", second))
+            self.assertIsNone(await speculator.take("article", broken))
+            speculator.discard("article")
+            self.assertIsNone(await speculator.take("article", second))
+            return speculator.metrics()
+
+        self.assertEqual(asyncio.run(run()), {"started": 4, "cancelled": 2, "reused": 1, "failed": 1})
+        self.assertTrue(all(config == {"configurable": {"priority": PRIORITY_BATCH}} for _, config in chain.calls))
+
+
+class SharedResearchLimitTest(unittest.TestCase):
+    # content_generator импортируется в тесте, а не при сборе: test_server подменяет
+    # модели фейками до первого импорта графов
+    def test_speculation_and_research_phase_share_the_article_limit(self):
+        import content_generator
+
+        chain = FakeResearchChain(delay=0.02)
+        speculator = ResearchSpeculator()
+        outline = sections(6)
+        state = {"topic": "Asyncio", "sections": [section.model_dump() for section in outline]}
+
+        async def run() -> list:
+            # Оглавление ещё правится: три секции исследуются в фоне
+            speculator.update("shared", "Asyncio", outline[:3], content_generator.research_section)
+            await asyncio.sleep(0)
+            results = await content_generator.research_phase(state, {"configurable": {"thread_id": "shared"}})
+            return results["research_results"]
+
+        with (
+            mock.patch.object(limits, "RESEARCH_CONCURRENCY", 2),
+            mock.patch.object(content_generator, "research_chain", chain),
+            mock.patch.object(content_generator, "research_speculator", speculator),
+            mock.patch.object(content_generator, "section_cache", None),
+        ):
+            results = asyncio.run(run())
+
+        self.assertEqual([record.research_data for record in results], [f"research Section {i}" for i in range(6)])
+        # Каждая секция исследована один раз, и не больше двух одновременно на статью
+        self.assertEqual(sorted(title for title, _ in chain.calls), [f"Section {i}" for i in range(6)])
+        self.assertEqual(chain.max_active, 2)
+        self.assertEqual(speculator.metrics(), {"started": 3, "reused": 3})
+
+    def test_articles_have_separate_limits(self):
+        self.assertIs(limits.research_slots("first"), limits.research_slots("first"))
+        self.assertIsNot(limits.research_slots("first"), limits.research_slots("second"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+from unittest import mock
+
+from sqlite_store import SQLiteStore
+
+
+class SQLiteStoreTest(unittest.TestCase):
+    def test_values_are_scoped(self):
+        store = SQLiteStore(":memory:", "entries")
+        store.put("plan", "key", "plan text")
+        store.put("write", "key", "section text")
+
+        self.assertEqual(store.get("plan", "key"), "plan text")
+        self.assertEqual(store.get("write", "key"), "section text")
+        self.assertIsNone(store.get("research", "key"))
+
+    def test_expired_entries_are_dropped(self):
+        store = SQLiteStore(":memory:", "entries", ttl_seconds=10)
+        with mock.patch("sqlite_store.time.time", return_value=1000):
+            store.put("scope", "key", "value")
+        with mock.patch("sqlite_store.time.time", return_value=1005):
+            self.assertEqual(store.get("scope", "key"), "value")
+        with mock.patch("sqlite_store.time.time", return_value=1011):
+            self.assertIsNone(store.get("scope", "key"))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        store = SQLiteStore(":memory:", "entries", max_entries=2)
+        for moment, key in enumerate(("a", "b")):
+            with mock.patch("sqlite_store.time.time", return_value=moment):
+                store.put("scope", key, key)
+        with mock.patch("sqlite_store.time.time", return_value=2):
+            store.get("scope", "a")
+        with mock.patch("sqlite_store.time.time", return_value=3):
+            store.put("scope", "c", "c")
+
+        self.assertEqual([store.get("scope", key) for key in "abc"], ["a", None, "c"])
+
+    def test_size_limit(self):
+        store = SQLiteStore(":memory:", "entries", max_bytes=10)
+        for moment, key in enumerate("abc"):
+            with mock.patch("sqlite_store.time.time", return_value=moment):
+                store.put("", key, "x" * 4)
+
+        self.assertEqual([store.get("", key) for key in "abc"], [None, "xxxx", "xxxx"])
+
+    def test_database_is_opened_on_first_use(self):
+        with mock.patch("sqlite_store.sqlite3.connect") as connect:
+            SQLiteStore("unused/cache.sqlite3", "entries")
+        connect.assert_not_called()
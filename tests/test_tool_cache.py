@@ -0,0 +1,66 @@
+import asyncio
+import unittest
+
+from tool_cache import ToolCache
+
+
+class SingleFlightTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.cache = ToolCache(":memory:", ttl_seconds=60, max_entries=100)
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def fetch(self) -> str:
+        self.calls += 1
+        await self.release.wait()
+        return "result"
+
+    async def test_concurrent_queries_share_one_fetch(self):
+        first = asyncio.create_task(self.cache.get_or_fetch("search", "Python", self.fetch))
+        await asyncio.sleep(0.05)
+        second = asyncio.create_task(self.cache.get_or_fetch("search", " python? ", self.fetch))
+        await asyncio.sleep(0.05)
+        self.release.set()
+
+        self.assertEqual(await asyncio.gather(first, second), ["result", "result"])
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.cache.metrics()["search"], {"hits": 0, "misses": 1, "coalesced": 1})
+        self.assertEqual(await self.cache.get_or_fetch("search", "python", self.fetch), "result")
+        self.assertEqual(self.calls, 1)
+
+    async def test_cancelled_leader_does_not_cancel_followers(self):
+        leader = asyncio.create_task(self.cache.get_or_fetch("search", "query", self.fetch))
+        await asyncio.sleep(0.05)
+        follower = asyncio.create_task(self.cache.get_or_fetch("search", "query", self.fetch))
+        await asyncio.sleep(0.05)
+
+        leader.cancel()
+        await asyncio.sleep(0.05)
+        self.release.set()
+
+        self.assertEqual(await follower, "result")
+        self.assertFalse(follower.cancelled())
+        self.assertTrue(leader.cancelled())
+        self.assertEqual(self.calls, 1)
+
+    async def test_fetch_finishes_into_cache_when_every_caller_is_cancelled(self):
+        leader = asyncio.create_task(self.cache.get_or_fetch("search", "query", self.fetch))
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        self.release.set()
+        await asyncio.sleep(0.1)
+
+        self.assertEqual(await asyncio.to_thread(self.cache.get, "search", "query"), "result")
+
+    async def test_error_reaches_every_waiter(self):
+        async def failing() -> str:
+            await self.release.wait()
+            raise RuntimeError("search is down")
+
+        waiters = [asyncio.create_task(self.cache.get_or_fetch("search", "query", failing)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        self.release.set()
+
+        for result in await asyncio.gather(*waiters, return_exceptions=True):
+            self.assertIsInstance(result, RuntimeError)
+        self.assertIsNone(await asyncio.to_thread(self.cache.get, "search", "query"))
@@ -0,0 +1,71 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.types import Command
+
+from models import OutlineEdits, Section, SectionEdit, SectionsList
+
+
+def outline(*titles: str) -> SectionsList:
+    return SectionsList(sections=[Section(section_title=title, content=f"about {title}") for title in titles])
+
+
+class FakeChain:
+    def __init__(self, *results) -> None:
+        self.results = list(results)
+        self.inputs: list[dict] = []
+
+    async def ainvoke(self, values: dict):
+        self.inputs.append(values)
+        return self.results.pop(0)
+
+
+class OutlineReviewTest(unittest.TestCase):
+    # topic_structure импортируется в тесте, а не при сборе: test_server подменяет
+    # модели фейками до первого импорта графов
+    def test_patch_rounds_and_fallback_to_full_generation(self):
+        import topic_structure
+
+        outline_chain = FakeChain(outline("Basics", "Loop"), outline("Intro", "Loop", "Tasks"))
+        patch_chain = FakeChain(
+            OutlineEdits(edits=[SectionEdit(action="rename", index=1, section_title="Intro")]),
+            OutlineEdits(edits=[]),
+            OutlineEdits(edits=[SectionEdit(action="remove", index=9)]),
+        )
+        graph = topic_structure.get_graph(checkpointer=MemorySaver())
+        config = {"configurable": {"thread_id": "outline"}}
+
+        async def review(*feedback: str) -> dict:
+            await graph.ainvoke({"topic": "Asyncio", "wishes": "для новичков"}, config)
+            for item in feedback:
+                await graph.ainvoke(Command(resume=item), config)
+            return (await graph.aget_state(config)).values
+
+        with (
+            mock.patch.object(topic_structure, "OUTLINE_EDIT_MODE", "patch"),
+            mock.patch.object(topic_structure, "outline_chain", outline_chain),
+            mock.patch.object(topic_structure, "outline_patch_chain", patch_chain),
+            mock.patch("builtins.print"),
+        ):
+            # Повтор пожелания не добавляет его в список, но оно уже учтено в оглавлении
+            state = asyncio.run(review("Переименуй первую", "Переименуй первую", "Убери девятую", "done"))
+
+        self.assertEqual(
+            [(item["wishes"], item["feedback"]) for item in patch_chain.inputs],
+            [
+                ("для новичков", "Переименуй первую"),
+                ("для новичков\nПереименуй первую", "Переименуй первую"),
+                ("для новичков\nПереименуй первую", "Убери девятую"),
+            ],
+        )
+        self.assertIn("[1] Intro: about Basics", patch_chain.inputs[1]["sections"])
+        # Правка с несуществующим номером не применилась - оглавление составлено заново
+        self.assertEqual(len(outline_chain.inputs), 2)
+        self.assertIn("Убери девятую", outline_chain.inputs[1]["wishes"])
+        self.assertEqual(state["sections"], outline("Intro", "Loop", "Tasks"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import asyncio
+import time
+import unittest
+
+import httpx
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from wikipedia_client import AsyncWikipedia
+
+PAGES = {
+    "Alpha": "alpha " * 1000,
+    "Beta": "beta " * 10,
+    "Gamma": "gamma " * 10,
+    "Broken": None,
+}
+
+
+def mediawiki_stub(delay: float) -> tuple[web.Application, dict]:
+    # Заглушка MediaWiki API: поиск возвращает заголовки из PAGES, страница "Broken" отвечает 500
+    stats = {"searches": [], "in_flight": 0, "max_in_flight": 0}
+
+    async def api(request: web.Request) -> web.Response:
+        params = request.query
+        if params.get("list") == "search":
+            stats["searches"].append(dict(params))
+            titles = [title for title in PAGES if params["srsearch"] in ("all", title)]
+            limit = int(params["srlimit"])
+            return web.json_response({"query": {"search": [{"title": title} for title in titles[:limit]]}})
+
+        title = params["titles"]
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            stats["in_flight"] -= 1
+        if PAGES.get(title) is None:
+            raise web.HTTPInternalServerError()
+        return web.json_response({"query": {"pages": {"1": {"title": title, "extract": PAGES[title]}}}})
+
+    app = web.Application()
+    app.router.add_get("/w/api.php", api)
+    return app, stats
+
+
+class AsyncWikipediaTest(unittest.IsolatedAsyncioTestCase):
+    delay = 0.2
+
+    async def asyncSetUp(self) -> None:
+        app, self.stats = mediawiki_stub(self.delay)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        self.wikipedia = AsyncWikipedia(
+            api_url=str(self.server.make_url("/w/api.php")), top_k=4, page_chars=100, timeout=5
+        )
+
+    async def asyncTearDown(self) -> None:
+        await self.wikipedia.aclose()
+        await self.server.close()
+
+    async def test_top_k_pages_are_fetched_concurrently(self):
+        started = time.perf_counter()
+        result = await self.wikipedia.run("all")
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(self.stats["searches"][0]["srlimit"], "4")
+        self.assertGreaterEqual(self.stats["max_in_flight"], 3)
+        self.assertLess(elapsed, self.delay * 3)
+        self.assertIn("Page: Alpha", result)
+        self.assertIn("Page: Gamma", result)
+
+    async def test_page_text_is_trimmed(self):
+        result = await self.wikipedia.run("Alpha")
+
+        self.assertEqual(result, f"Page: Alpha\nSummary: {PAGES['Alpha'][:100]}")
+
+    async def test_failed_page_is_dropped_and_the_rest_are_kept(self):
+        with self.assertLogs("wikipedia_client", level="WARNING"):
+            result = await self.wikipedia.run("all")
+
+        self.assertNotIn("Broken", result)
+        self.assertEqual(result.count("Page: "), 3)
+
+    async def test_nothing_found(self):
+        self.assertEqual(await self.wikipedia.run("Delta"), "No good Wikipedia Search Result was found")
+
+    async def test_client_from_another_event_loop_is_closed(self):
+        stale = httpx.AsyncClient()
+        self.wikipedia._client, self.wikipedia._loop = stale, object()
+
+        await self.wikipedia.run("Beta")
+
+        self.assertTrue(stale.is_closed)
+        self.assertIsNot(self.wikipedia._client, stale)